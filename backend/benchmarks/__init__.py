@@ -0,0 +1,20 @@
+"""
+Micro-benchmarks run against in-memory fakes; see each module for usage.
+
+Settings are read once, so placeholder values for the required ones are
+set here, before any benchmark imports the app.
+"""
+import os
+
+from cryptography.fernet import Fernet
+
+for _name, _value in {
+    "MONGODB_URI": "mongodb://localhost/altheia_benchmark",
+    "JWT_SECRET": "benchmark",
+    "ENCRYPTION_KEY": Fernet.generate_key().decode(),
+    "GEMINI_API_KEY": "benchmark",
+    "GOOGLE_CLIENT_ID": "benchmark",
+    "GOOGLE_CLIENT_SECRET": "benchmark",
+    "GOOGLE_REDIRECT_URI": "http://localhost/callback",
+}.items():
+    os.environ.setdefault(_name, _value)
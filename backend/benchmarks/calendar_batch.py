@@ -0,0 +1,91 @@
+"""
+Compare syncing symptom logs to Google Calendar one event call at a time
+with batch_sync_logs, against the fake Calendar endpoint used by the tests.
+Each HTTP round trip to the fake takes --latency seconds, standing in for
+the network; the limiter's rate limits are lifted so only round trips are
+measured.
+
+Usage (from the backend directory):
+    python -m benchmarks.calendar_batch
+    python -m benchmarks.calendar_batch --logs 500 --latency 0.05
+"""
+import argparse
+import os
+import time
+from datetime import date, timedelta
+
+# Lift the rate limits before the limiter reads its settings
+os.environ["GOOGLE_API_GLOBAL_QPS"] = "1000000"
+os.environ["GOOGLE_API_USER_QPS"] = "1000000"
+
+from google.oauth2.credentials import Credentials
+from googleapiclient.discovery import build
+
+import services.google_calendar_service as google_calendar_service
+from services.google_calendar_service import GoogleCalendarService
+from tests.fake_calendar import FakeCalendarHttp
+
+
+def _logs(count: int):
+    start = date(2024, 1, 1)
+    return [
+        {
+            "_id": f"log{i}",
+            "date": (start + timedelta(days=i)).isoformat(),
+            "symptoms": [{"name": "Hot flashes", "severity": 3}, {"name": "Insomnia", "severity": 2}],
+            "overall_notes": "Benchmark log",
+        }
+        for i in range(count)
+    ]
+
+
+def _service(fake: FakeCalendarHttp) -> GoogleCalendarService:
+    google_calendar_service.build = lambda *args, **kwargs: build(
+        "calendar", "v3", http=fake, static_discovery=True
+    )
+    google_calendar_service._thread_local.services = None
+    return GoogleCalendarService()
+
+
+def sequential(logs, latency: float):
+    """Sync logs with one insert call each; returns (seconds, round trips)."""
+    fake = FakeCalendarHttp(latency=latency)
+    service = _service(fake)
+    credentials = Credentials(token="benchmark")
+    started = time.perf_counter()
+    for log in logs:
+        service.sync_symptom_log(credentials, "calendar", log)
+    return time.perf_counter() - started, fake.requests
+
+
+def batched(logs, latency: float, batch_size: int):
+    """Sync logs with batch_sync_logs; returns (seconds, round trips)."""
+    fake = FakeCalendarHttp(latency=latency)
+    service = _service(fake)
+    credentials = Credentials(token="benchmark")
+    started = time.perf_counter()
+    event_map = service.batch_sync_logs(credentials, "calendar", logs, batch_size=batch_size)
+    assert len(event_map) == len(logs)
+    return time.perf_counter() - started, fake.requests
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--logs", type=int, default=200, help="symptom logs to sync")
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds per HTTP round trip")
+    parser.add_argument("--batch-size", type=int, default=100, help="calls per batch request")
+    args = parser.parse_args()
+
+    logs = _logs(args.logs)
+    results = [
+        ("sequential", *sequential(logs, args.latency)),
+        (f"batched ({args.batch_size})", *batched(logs, args.latency, args.batch_size)),
+    ]
+    print(f"{args.logs} logs, {args.latency * 1000:.0f} ms per round trip")
+    for name, seconds, requests in results:
+        print(f"{name:>16}: {seconds:7.3f}s  {requests:5d} round trips  {seconds / args.logs * 1000:7.2f} ms/log")
+    print(f"speedup: {results[0][1] / results[1][1]:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
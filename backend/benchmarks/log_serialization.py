@@ -0,0 +1,90 @@
+"""
+Compare encoding a symptom log listing through the SymptomLogResponse
+response model, as FastAPI does for response_model routes, with the
+log_to_json + ORJSONResponse path GET /api/symptom-logs uses. Both
+outputs are checked to decode to the same JSON first.
+
+Usage (from the backend directory):
+    python -m benchmarks.log_serialization
+    python -m benchmarks.log_serialization --rows 10 1000 10000
+"""
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime
+from typing import Any, Dict, List
+
+from bson import ObjectId
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+from models.symptom_log import SymptomLogResponse
+from services.symptom_log_service import log_to_json
+
+RESPONSE_FIELD = create_model_field(name="response", type_=List[SymptomLogResponse], mode="serialization")
+
+
+def _docs(count: int) -> List[Dict[str, Any]]:
+    user_id = ObjectId()
+    return [
+        {
+            "_id": ObjectId(),
+            "user_id": user_id,
+            "date": f"2024-{i // 28 % 12 + 1:02d}-{i % 28 + 1:02d}",
+            "symptoms": [
+                {"name": "Hot flashes", "severity": 3, "notes": None, "id": "hot_flashes"},
+                {"name": "Insomnia", "severity": 2, "notes": "Woke at 3am", "id": "insomnia"},
+            ],
+            "overall_notes": "Tired",
+            "severity_mean": 2.5,
+            "severity_max": 3,
+            "symptom_count": 2,
+            "severity_level": "moderate",
+            "created_at": datetime(2024, 1, 1, 8, 0, 0, 123000),
+            "updated_at": datetime(2024, 1, 2, 9, 0, 0, 456000),
+        }
+        for i in range(count)
+    ]
+
+
+def response_model(docs: List[Dict[str, Any]]) -> bytes:
+    """Validate logs into models and serialize them as response_model does."""
+    logs = [
+        SymptomLogResponse(**{**doc, "id": str(doc["_id"]), "user_id": str(doc["user_id"])})
+        for doc in docs
+    ]
+    content = asyncio.run(serialize_response(field=RESPONSE_FIELD, response_content=logs, is_coroutine=True))
+    return JSONResponse(content).body
+
+
+def orjson_fast_path(docs: List[Dict[str, Any]]) -> bytes:
+    """Encode stored logs directly, as the listing endpoint does."""
+    return ORJSONResponse([log_to_json(doc) for doc in docs]).body
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10, 1000, 10000], help="logs per response")
+    args = parser.parse_args()
+
+    sample = _docs(3)
+    assert json.loads(response_model(sample)) == json.loads(orjson_fast_path(sample)), "outputs differ"
+
+    for rows in args.rows:
+        docs = _docs(rows)
+        repeats = max(1, 20000 // rows)
+        timings = {}
+        for name, encode in (("response model", response_model), ("orjson fast path", orjson_fast_path)):
+            started = time.perf_counter()
+            for _ in range(repeats):
+                encode(docs)
+            timings[name] = (time.perf_counter() - started) / repeats
+        for name, seconds in timings.items():
+            print(f"{rows:6d} rows {name:>16}: {seconds * 1000:9.3f} ms  {seconds / rows * 1e6:6.2f} us/row")
+        print(f"{rows:6d} rows speedup: {timings['response model'] / timings['orjson fast path']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -14,6 +14,10 @@ class Settings(BaseSettings):
     # Application
     app_env: str = Field(default="development", alias="APP_ENV")
     port: int = Field(default=8000, alias="PORT")
+    # Server worker processes; uvicorn and gunicorn read the same variable
+    web_concurrency: int = Field(default=1, alias="WEB_CONCURRENCY")
+    # Bearer token for GET /metrics; the endpoint is disabled when unset
+    metrics_token: Optional[str] = Field(default=None, alias="METRICS_TOKEN")
     
     # Database
     mongodb_uri: str = Field(..., alias="MONGODB_URI")
@@ -21,7 +25,33 @@ class Settings(BaseSettings):
     # JWT Authentication
     jwt_secret: str = Field(..., alias="JWT_SECRET")
     jwt_expire_minutes: int = Field(default=10080, alias="JWT_EXPIRE_MINUTES")
-    
+
+    # Authenticated user cache
+    user_cache_ttl_seconds: float = Field(default=60.0, alias="USER_CACHE_TTL_SECONDS")
+    user_cache_max_size: int = Field(default=10000, alias="USER_CACHE_MAX_SIZE")
+
+    # Symptom heatmap cache
+    heatmap_cache_ttl_seconds: float = Field(default=300.0, alias="HEATMAP_CACHE_TTL_SECONDS")
+    heatmap_cache_max_size: int = Field(default=10000, alias="HEATMAP_CACHE_MAX_SIZE")
+
+    # Symptom insights cache
+    insights_cache_ttl_seconds: float = Field(default=600.0, alias="INSIGHTS_CACHE_TTL_SECONDS")
+    insights_cache_max_size: int = Field(default=2000, alias="INSIGHTS_CACHE_MAX_SIZE")
+
+    # Password hashing admission control
+    password_hash_workers: int = Field(default=2, alias="PASSWORD_HASH_WORKERS")
+    password_hash_queue_limit: int = Field(default=32, alias="PASSWORD_HASH_QUEUE_LIMIT")
+
+    # Deleted symptom logs are reported to delta sync clients for this long
+    log_tombstone_ttl_days: int = Field(default=30, alias="LOG_TOMBSTONE_TTL_DAYS")
+
+    # Upserts to one log within this window are coalesced into one write; 0 disables.
+    # Held writes are per process, so coalescing is off with WEB_CONCURRENCY > 1
+    log_write_coalesce_seconds: float = Field(default=0.0, alias="LOG_WRITE_COALESCE_SECONDS")
+
+    # Symptom logs older than this are compacted into monthly archive documents
+    log_archive_after_days: int = Field(default=365, alias="LOG_ARCHIVE_AFTER_DAYS")
+
     # CORS
     cors_origins: str = Field(default="http://localhost:3000", alias="CORS_ORIGINS")
     frontend_url: str = Field(default="http://localhost:3000", alias="FRONTEND_URL")
@@ -30,6 +60,33 @@ class Settings(BaseSettings):
     google_client_id: Optional[str] = Field(None, alias="GOOGLE_CLIENT_ID")
     google_client_secret: Optional[str] = Field(None, alias="GOOGLE_CLIENT_SECRET")
     google_redirect_uri: Optional[str] = Field(None, alias="GOOGLE_REDIRECT_URI")
+
+    # Calendar sync outbox workers
+    calendar_sync_workers: int = Field(default=2, alias="CALENDAR_SYNC_WORKERS")
+    calendar_sync_max_attempts: int = Field(default=8, alias="CALENDAR_SYNC_MAX_ATTEMPTS")
+    calendar_sync_lease_seconds: int = Field(default=120, alias="CALENDAR_SYNC_LEASE_SECONDS")
+    calendar_sync_poll_seconds: float = Field(default=2.0, alias="CALENDAR_SYNC_POLL_SECONDS")
+    calendar_sync_backoff_seconds: float = Field(default=5.0, alias="CALENDAR_SYNC_BACKOFF_SECONDS")
+    calendar_reconcile_interval_minutes: int = Field(default=360, alias="CALENDAR_RECONCILE_INTERVAL_MINUTES")
+
+    # Google API rate limiting and retries
+    google_api_global_qps: float = Field(default=20.0, alias="GOOGLE_API_GLOBAL_QPS")
+    google_api_user_qps: float = Field(default=5.0, alias="GOOGLE_API_USER_QPS")
+    google_api_max_retries: int = Field(default=5, alias="GOOGLE_API_MAX_RETRIES")
+    google_api_backoff_base_seconds: float = Field(default=1.0, alias="GOOGLE_API_BACKOFF_BASE_SECONDS")
+    google_api_backoff_max_seconds: float = Field(default=32.0, alias="GOOGLE_API_BACKOFF_MAX_SECONDS")
+
+    # Thread pools for blocking outbound calls
+    google_api_workers: int = Field(default=8, alias="GOOGLE_API_WORKERS")
+    google_api_queue_limit: int = Field(default=64, alias="GOOGLE_API_QUEUE_LIMIT")
+    google_api_timeout_seconds: float = Field(default=30.0, alias="GOOGLE_API_TIMEOUT_SECONDS")
+    google_api_job_timeout_seconds: float = Field(default=300.0, alias="GOOGLE_API_JOB_TIMEOUT_SECONDS")
+    gemini_workers: int = Field(default=4, alias="GEMINI_WORKERS")
+    gemini_queue_limit: int = Field(default=32, alias="GEMINI_QUEUE_LIMIT")
+    gemini_timeout_seconds: float = Field(default=30.0, alias="GEMINI_TIMEOUT_SECONDS")
+    article_fetch_workers: int = Field(default=4, alias="ARTICLE_FETCH_WORKERS")
+    article_fetch_queue_limit: int = Field(default=64, alias="ARTICLE_FETCH_QUEUE_LIMIT")
+    article_fetch_timeout_seconds: float = Field(default=15.0, alias="ARTICLE_FETCH_TIMEOUT_SECONDS")
     
     # Encryption
     encryption_key: str = Field(..., alias="ENCRYPTION_KEY")
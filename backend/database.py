@@ -74,4 +74,42 @@ async def init_indexes(client: AsyncIOMotorClient):
     logger.info("Created unique compound index on symptom_logs (user_id + date)")
     
     # User ID index for fast lookups in logs
-    await db.symptom_logs.create_index("user_id")
\ No newline at end of file
+    await db.symptom_logs.create_index("user_id")
+    
+    # Symptom-level queries match catalog IDs within a user's logs
+    await db.symptom_logs.create_index([("user_id", 1), ("symptoms.id", 1), ("date", 1)])
+    logger.info("Created multikey index on symptom_logs (user_id + symptoms.id + date)")
+    
+    # Day severity filters, e.g. a user's severe days by date
+    await db.symptom_logs.create_index([("user_id", 1), ("severity_level", 1), ("date", 1)])
+    logger.info("Created compound index on symptom_logs (user_id + severity_level + date)")
+    
+    # Delta sync reads a user's logs changed since a watermark
+    await db.symptom_logs.create_index([("user_id", 1), ("updated_at", 1)])
+    logger.info("Created compound index on symptom_logs (user_id + updated_at)")
+    
+    # One tombstone per deleted log date, expired after the sync window
+    await db.symptom_log_tombstones.create_index(
+        [("user_id", 1), ("date", 1)],
+        unique=True
+    )
+    await db.symptom_log_tombstones.create_index([("user_id", 1), ("deleted_at", 1)])
+    await db.symptom_log_tombstones.create_index(
+        "deleted_at",
+        expireAfterSeconds=settings.log_tombstone_ttl_days * 86400
+    )
+    logger.info("Created indexes on symptom_log_tombstones (user_id + date, user_id + deleted_at, TTL)")
+    
+    # One archive bucket per user and month of old symptom logs
+    await db.symptom_log_archive.create_index(
+        [("user_id", 1), ("month", 1)],
+        unique=True
+    )
+    logger.info("Created unique compound index on symptom_log_archive (user_id + month)")
+    
+    # One symptom rollup per user, granularity and period
+    await db.symptom_rollups.create_index(
+        [("user_id", 1), ("granularity", 1), ("period", 1)],
+        unique=True
+    )
+    logger.info("Created unique compound index on symptom_rollups (user_id + granularity + period)")
\ No newline at end of file
@@ -1,12 +1,17 @@
 """
 Main FastAPI application for Altheia backend with Google Calendar integration.
 """
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 from config import get_settings
 from routers import google_calendar_auth, google_calendar_sync, auth, symptom_log, articles, chat
 from database import connect_to_mongo, close_mongo_connection
+from utils.metrics import collect_metrics
+from utils.executors import shutdown_executors
+from utils.security import verify_metrics_token
+from services.calendar_sync_outbox import get_calendar_sync_workers
+from services.symptom_log_service import flush_pending
 
 # Load environment variables from .env file
 load_dotenv()
@@ -67,10 +72,15 @@ app = FastAPI(
 @app.on_event("startup")
 async def startup_db_client():
     await connect_to_mongo()
+    await get_calendar_sync_workers().start()
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await get_calendar_sync_workers().stop()
+    # Held symptom log writes are written before the connection closes
+    await flush_pending()
     await close_mongo_connection()
+    shutdown_executors()
 
 # Configure CORS
 app.add_middleware(
@@ -107,6 +117,14 @@ async def health_check():
         "environment": settings.app_env
     }
 
+@app.get("/metrics", include_in_schema=False, dependencies=[Depends(verify_metrics_token)])
+async def metrics():
+    """
+    In-process counters for caches and other components of this worker.
+    Requires METRICS_TOKEN as a bearer token; disabled when it is unset.
+    """
+    return collect_metrics()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
@@ -2,20 +2,35 @@
 Symptom Log models for daily tracking.
 """
 from datetime import datetime
-from typing import List, Optional
-from pydantic import BaseModel, Field
+from typing import Annotated, Dict, List, Optional
+from pydantic import AfterValidator, BaseModel, Field
 from bson import ObjectId
 from models.user import PyObjectId
 
+# Maximum upserts, and separately deletes, in one bulk request
+MAX_BULK_ITEMS = 1000
+
+
+def _check_date(value: str) -> str:
+    # The pattern alone lets impossible dates such as 2024-02-30 through
+    try:
+        datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise ValueError(f"{value} is not a valid date")
+    return value
+
+LogDate = Annotated[str, Field(pattern=r"^\d{4}-\d{2}-\d{2}$"), AfterValidator(_check_date)]
+
 class SymptomItem(BaseModel):
     """Individual symptom entry with severity."""
     name: str = Field(..., description="Name of the symptom")
     severity: int = Field(..., ge=1, le=5, description="Severity rating (1-5)")
     notes: Optional[str] = Field(None, description="Optional notes for this specific symptom")
+    id: Optional[str] = Field(None, description="Symptom catalog ID, set by the server from the name")
 
 class SymptomLogBase(BaseModel):
     """Base model for daily symptom log."""
-    date: str = Field(..., pattern=r"^\d{4}-\d{2}-\d{2}$", description="Date in YYYY-MM-DD format")
+    date: LogDate = Field(..., description="Date in YYYY-MM-DD format")
     symptoms: List[SymptomItem] = Field(default_factory=list, description="List of symptoms logged for the day")
     overall_notes: Optional[str] = Field(None, description="General notes for the day")
 
@@ -23,12 +38,20 @@ class SymptomLogCreate(SymptomLogBase):
     """Model for creating/updating a log."""
     pass
 
+class CalendarEventLink(BaseModel):
+    """Google Calendar event that a symptom log was synced to."""
+    event_id: str = Field(..., description="Google Calendar event ID")
+    calendar_id: str = Field(..., description="Calendar the event belongs to")
+    synced_at: datetime = Field(default_factory=datetime.utcnow, description="When the event was last written")
+    content_hash: Optional[str] = Field(None, description="Hash of the event body last written")
+
 class SymptomLogInDB(SymptomLogBase):
     """Symptom log as stored in the database."""
     id: PyObjectId = Field(default_factory=PyObjectId, alias="_id")
     user_id: PyObjectId = Field(..., description="User ID who owns this log")
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
+    calendar_event: Optional[CalendarEventLink] = Field(None, description="Linked Google Calendar event, if synced")
 
     class Config:
         populate_by_name = True
@@ -39,8 +62,123 @@ class SymptomLogResponse(SymptomLogBase):
     """API response model for symptom log."""
     id: str = Field(..., description="Log ID")
     user_id: str = Field(..., description="User ID")
+    severity_mean: Optional[float] = Field(None, description="Mean symptom severity, 0 if no symptoms")
+    severity_max: Optional[int] = Field(None, description="Highest symptom severity, 0 if no symptoms")
+    symptom_count: Optional[int] = Field(None, description="Number of symptoms logged")
+    severity_level: Optional[str] = Field(None, description="mild, moderate or severe")
     created_at: datetime
     updated_at: datetime
 
     class Config:
-        json_encoders = {datetime: lambda v: v.isoformat()}
\ No newline at end of file
+        json_encoders = {datetime: lambda v: v.isoformat()}
+
+class SymptomLogBulkRequest(BaseModel):
+    """Many log upserts and deletions applied in one request."""
+    upserts: List[SymptomLogCreate] = Field(default_factory=list, max_length=MAX_BULK_ITEMS, description="Logs to create or update")
+    deletes: List[LogDate] = Field(default_factory=list, max_length=MAX_BULK_ITEMS, description="Dates (YYYY-MM-DD) whose logs should be deleted")
+
+class SymptomLogBulkItemResult(BaseModel):
+    """Outcome of one item of a bulk request."""
+    op: str = Field(..., description="upsert or delete")
+    date: str = Field(..., description="Date of the log")
+    status: str = Field(..., description="created, updated, deleted, not_found or failed")
+    id: Optional[str] = Field(None, description="Log ID, if the log exists after the write")
+    error: Optional[str] = Field(None, description="Error message for failed items")
+
+class SymptomLogBulkResponse(BaseModel):
+    """API response for a bulk request, with one result per item."""
+    created: int = 0
+    updated: int = 0
+    deleted: int = 0
+    not_found: int = 0
+    failed: int = 0
+    results: List[SymptomLogBulkItemResult]
+
+class TrendBucket(BaseModel):
+    """Severity statistics of one symptom over one period."""
+    period: str = Field(..., description="Day (YYYY-MM-DD), ISO week (YYYY-Www) or month (YYYY-MM)")
+    symptom: str = Field(..., description="Name of the symptom")
+    count: int = Field(..., description="Number of days the symptom was logged in the period")
+    mean_severity: float = Field(..., description="Average severity over those days")
+    max_severity: int = Field(..., description="Highest severity logged in the period")
+
+class TrendsResponse(BaseModel):
+    """API response for symptom trends over a date range."""
+    granularity: str
+    start_date: str
+    end_date: str
+    buckets: List[TrendBucket]
+
+class RollupSymptom(BaseModel):
+    """Summary of one symptom within a rollup period."""
+    name: str
+    count: int = Field(..., description="Number of days the symptom was logged")
+    sum: int = Field(..., description="Sum of the logged severities")
+    max: int = Field(..., description="Highest logged severity")
+    mean: float = Field(..., description="Average logged severity")
+    days: Dict[str, int] = Field(..., description="Severity by date (YYYY-MM-DD)")
+
+class SymptomRollupResponse(BaseModel):
+    """API response for one week or month of symptom statistics."""
+    granularity: str
+    period: str = Field(..., description="ISO week (YYYY-Www) or month (YYYY-MM)")
+    symptoms: List[RollupSymptom]
+
+class SymptomLogPage(BaseModel):
+    """One page of symptom logs with the cursor of the next page."""
+    items: List[SymptomLogResponse]
+    limit: int
+    next_cursor: Optional[str] = Field(None, description="Pass as cursor to get the next page; null on the last page")
+
+class SymptomLogTombstone(BaseModel):
+    """A deleted symptom log, as reported to delta sync clients."""
+    date: str = Field(..., description="Date of the deleted log")
+    id: str = Field(..., description="ID the log had")
+    deleted_at: datetime
+
+class SymptomLogChanges(BaseModel):
+    """Logs written and deleted since a sync watermark."""
+    changed: List[SymptomLogResponse] = Field(..., description="Logs created or updated, oldest change first")
+    deleted: List[SymptomLogTombstone] = Field(..., description="Logs deleted and not logged again")
+    watermark: datetime = Field(..., description="Pass as since on the next sync")
+
+class SymptomHeatmapResponse(BaseModel):
+    """One year of daily symptom severity, one byte per day."""
+    year: int
+    days: int = Field(..., description="Number of days in the year; data decodes to this many bytes")
+    data: str = Field(..., description=(
+        "Base64 bytes, January 1st first. Bit 7 is set if the day was logged, "
+        "bits 3-5 hold the rounded mean severity and bits 0-2 the max severity"
+    ))
+
+class InsightSymptom(BaseModel):
+    """A symptom in the insights matrices, in matrix order."""
+    id: str = Field(..., description="Symptom catalog ID")
+    name: str
+    days_logged: int = Field(..., description="Number of days the symptom was logged")
+    mean_severity: Optional[float] = Field(None, description="Average severity on those days")
+
+class LaggedCorrelation(BaseModel):
+    """Correlations between symptoms on one day and symptoms lag days later."""
+    lag: int
+    correlations: List[List[Optional[float]]] = Field(..., description="Row symptom on a day vs. column symptom lag days later")
+
+class RollingMeans(BaseModel):
+    """Trailing mean severity per symptom over the logged days of each window."""
+    window: int
+    start_date: str = Field(..., description="Date the first value ends on; one value per day after it")
+    values: Dict[str, List[Optional[float]]] = Field(..., description="Values by symptom ID")
+
+class SymptomInsightsResponse(BaseModel):
+    """Symptom co-occurrence and correlation analytics over a user's history.
+    Matrices are indexed in the order of symptoms; correlations are null
+    where a symptom never varies or there are too few days."""
+    start_date: str
+    end_date: str
+    logged_days: int
+    symptoms: List[InsightSymptom]
+    co_occurrence: List[List[int]] = Field(..., description="Days each pair of symptoms was logged together")
+    pearson: List[List[Optional[float]]]
+    spearman: List[List[Optional[float]]]
+    lagged: List[LaggedCorrelation]
+    rolling: RollingMeans
\ No newline at end of file
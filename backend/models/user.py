@@ -45,6 +45,8 @@ class GoogleCalendarSettings(BaseModel):
     is_enabled: bool = Field(default=False, description="Whether Google Calendar sync is enabled")
     calendar_id: Optional[str] = Field(default=None, description="ID of the Altheia Health calendar")
     last_sync: Optional[datetime] = Field(default=None, description="Timestamp of last successful sync")
+    sync_token: Optional[str] = Field(default=None, description="Calendar API sync token for incremental reconciliation")
+    last_reconciled: Optional[datetime] = Field(default=None, description="Timestamp of last reconciliation with Google")
     
     class Config:
         json_schema_extra = {
@@ -2,10 +2,11 @@
 Router for article operations.
 """
 from typing import List, Optional
-from fastapi import APIRouter, Depends, Query, status
+from fastapi import APIRouter, Depends, Query, Request, Response, status
 from database import get_database
 from models.article import ArticleResponse
 from services.article_service import fetch_external_articles
+from utils.etag import compute_etag, etag_headers, is_not_modified, not_modified
 
 router = APIRouter(
     prefix="/api/articles",
@@ -15,6 +16,8 @@ router = APIRouter(
 
 @router.get("/", response_model=List[ArticleResponse])
 async def get_articles(
+    request: Request,
+    response: Response,
     category: Optional[str] = None,
     limit: int = Query(10, ge=1, le=100),
     skip: int = Query(0, ge=0),
@@ -23,11 +26,25 @@ async def get_articles(
     """
     Retrieve articles from the database.
     Optionally filter by category.
+    Supports If-None-Match; an unchanged page gets an empty 304.
     """
     query = {}
     if category:
         query["category"] = category
 
+    # Identify the page by its article IDs and latest update without reading the articles
+    summary = await db.articles.aggregate([
+        {"$match": query},
+        {"$sort": {"published_at": -1}},
+        {"$skip": skip},
+        {"$limit": limit},
+        {"$group": {"_id": None, "ids": {"$push": "$_id"}, "last_updated": {"$max": "$updated_at"}}},
+    ]).to_list(length=1)
+    etag = compute_etag("articles", category, skip, limit, summary)
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+    response.headers.update(etag_headers(etag))
+
     cursor = db.articles.find(query).sort("published_at", -1).skip(skip).limit(limit)
     
     articles = []
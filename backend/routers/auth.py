@@ -3,17 +3,20 @@ Authentication router implementing Signup, Login, and User Profile endpoints.
 """
 from datetime import datetime, timedelta
 import logging
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from fastapi.security import OAuth2PasswordRequestForm
 
 from database import get_database
 from models.user import UserCreate, UserInDB, UserResponse, UserUpdate
 from utils.security import (
-    get_password_hash, 
-    verify_password, 
+    get_password_hash_async,
+    verify_password_async,
     create_access_token, 
-    get_current_user
+    get_current_user,
+    invalidate_cached_user
 )
+from services.symptom_catalog import normalize_names
+from utils.etag import compute_etag, etag_headers, is_not_modified, not_modified
 from config import get_settings
 
 router = APIRouter(
@@ -39,11 +42,11 @@ async def signup(user_in: UserCreate, db = Depends(get_database)):
         )
     
     # Hash password
-    hashed_password = get_password_hash(user_in.password)
+    hashed_password = await get_password_hash_async(user_in.password)
     
     # Create user document
     user_doc = UserInDB(
-        **user_in.dict(),
+        **{**user_in.dict(), "primary_symptoms": normalize_names(user_in.primary_symptoms)},
         password_hash=hashed_password
     )
     
@@ -78,7 +81,7 @@ async def login(
     # Find user by email
     user = await db.users.find_one({"email": form_data.username})
     
-    if not user or not verify_password(form_data.password, user["password_hash"]):
+    if not user or not await verify_password_async(form_data.password, user["password_hash"]):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -98,9 +101,14 @@ async def login(
     }
 
 @router.get("/me", response_model=UserResponse)
-async def read_users_me(current_user: UserInDB = Depends(get_current_user)):
+async def read_users_me(
+    request: Request,
+    response: Response,
+    current_user: UserInDB = Depends(get_current_user)
+):
     """
     Get current authenticated user profile.
+    Supports If-None-Match; an unchanged profile gets an empty 304.
     """
     # Convert UserInDB to UserResponse
     # UserResponse handles the exclusion of sensitive fields and flattening
@@ -128,7 +136,15 @@ async def read_users_me(current_user: UserInDB = Depends(get_current_user)):
         "last_calendar_sync": current_user.calendar_settings.last_sync if calendar_connected else None
     })
     
-    return UserResponse(**user_dict)
+    user_response = UserResponse(**user_dict)
+    
+    # The user is already loaded for authentication, so hash the profile itself
+    etag = compute_etag("me", user_response.dict())
+    if is_not_modified(request, etag):
+        return not_modified(etag)
+    response.headers.update(etag_headers(etag))
+    
+    return user_response
 
 @router.put("/me", response_model=UserResponse)
 async def update_user_me(
@@ -152,6 +168,8 @@ async def update_user_me(
             detail="No data provided for update"
         )
         
+    if "primary_symptoms" in update_data:
+        update_data["primary_symptoms"] = normalize_names(update_data["primary_symptoms"])
     update_data["updated_at"] = datetime.utcnow()
     
     # Update user in database
@@ -159,6 +177,7 @@ async def update_user_me(
         {"_id": user_id},
         {"$set": update_data}
     )
+    invalidate_cached_user(user_id)
     
     # Fetch updated user
     updated_user = await db.users.find_one({"_id": user_id})
@@ -13,10 +13,14 @@ from google.auth.transport.requests import Request as GoogleRequest
 from google.oauth2.credentials import Credentials
 
 from models.user import UserInDB, GoogleAuthData
-from services.google_calendar_service import GoogleCalendarService
+from services.google_calendar_service import (
+    GoogleCalendarService,
+    google_api_executor,
+    invalidate_credentials
+)
 from utils.encryption import encrypt_token
 from database import get_database
-from utils.security import get_current_user
+from utils.security import get_current_user, invalidate_cached_user
 
 logger = logging.getLogger(__name__)
 
@@ -161,7 +165,7 @@ async def google_auth_callback(
         )
         
         # Exchange code for tokens
-        flow.fetch_token(code=code)
+        await google_api_executor.run(flow.fetch_token, code=code)
         credentials = flow.credentials
         
         if not credentials.refresh_token:
@@ -181,7 +185,9 @@ async def google_auth_callback(
         
         # Create Altheia Health calendar
         calendar_service = GoogleCalendarService()
-        calendar_id = calendar_service.create_altheia_calendar(credentials)
+        calendar_id = await google_api_executor.run(
+            calendar_service.create_altheia_calendar, credentials
+        )
         
         # Update user in database
         await db.users.update_one(
@@ -191,10 +197,16 @@ async def google_auth_callback(
                     "google_auth": google_auth.dict(),
                     "calendar_settings.calendar_id": calendar_id,
                     "calendar_settings.is_enabled": True,
+                    "calendar_settings.sync_token": None,
                     "updated_at": datetime.utcnow()
                 }
             }
         )
+        invalidate_cached_user(current_user.id)
+        
+        # Credentials cached for a replaced refresh token are never used again
+        if current_user.google_auth and current_user.google_auth.encrypted_refresh_token:
+            invalidate_credentials(current_user.google_auth.encrypted_refresh_token)
         
         logger.info(f"Successfully connected Google Calendar for user {current_user.id}")
         
@@ -246,17 +258,20 @@ async def disconnect_google_calendar(
         # Get credentials and revoke access
         try:
             calendar_service = GoogleCalendarService()
-            credentials = calendar_service.get_credentials(
+            credentials = await google_api_executor.run(
+                calendar_service.get_credentials,
                 current_user.google_auth.encrypted_refresh_token
             )
             
             # Revoke token
-            credentials.revoke(GoogleRequest())
+            await google_api_executor.run(credentials.revoke, GoogleRequest())
             logger.info(f"Revoked Google Calendar access for user {current_user.id}")
             
         except Exception as e:
             logger.warning(f"Failed to revoke token (may already be revoked): {e}")
         
+        invalidate_credentials(current_user.google_auth.encrypted_refresh_token)
+        
         # Clear stored credentials in database
         await db.users.update_one(
             {"_id": ObjectId(current_user.id)},
@@ -266,10 +281,12 @@ async def disconnect_google_calendar(
                     "calendar_settings.is_enabled": False,
                     "calendar_settings.calendar_id": None,
                     "calendar_settings.last_sync": None,
+                    "calendar_settings.sync_token": None,
                     "updated_at": datetime.utcnow()
                 }
             }
         )
+        invalidate_cached_user(current_user.id)
         
         logger.info(f"Disconnected Google Calendar for user {current_user.id}")
         
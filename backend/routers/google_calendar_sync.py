@@ -5,11 +5,18 @@ Handles synchronization of symptom logs with Google Calendar.
 import logging
 from datetime import datetime
 from typing import List, Optional
+from bson import ObjectId
 from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Query
 from pydantic import BaseModel, Field
 
+from database import get_database
 from models.user import UserInDB
-from services.google_calendar_service import GoogleCalendarService
+from services import calendar_sync_service
+from services.calendar_reconcile_service import reconcile_calendar
+from services.symptom_archive_service import find_logs_by_id
+from services.calendar_sync_outbox import DONE, enqueue_sync_all, get_calendar_sync_workers, get_sync_all_job
+from utils.executors import ExecutorOverloadedError
+from utils.security import get_current_user, invalidate_cached_user
 
 logger = logging.getLogger(__name__)
 
@@ -57,43 +64,62 @@ class SyncResponse(BaseModel):
         }
 
 
-class BatchSyncResponse(BaseModel):
-    """Response model for batch sync operations."""
+class SyncJobResponse(BaseModel):
+    """Response model for a background sync-all job."""
     
-    success: bool = Field(..., description="Whether the batch sync was successful")
-    message: str = Field(..., description="Status message")
-    synced_count: int = Field(..., description="Number of logs successfully synced")
-    failed_count: int = Field(default=0, description="Number of logs that failed to sync")
+    job_id: str = Field(..., description="ID of the sync-all job")
+    status: str = Field(..., description="Job status: pending, running, done or dead")
+    total: Optional[int] = Field(None, description="Number of logs to sync, known once the job starts")
+    processed: int = Field(default=0, description="Number of logs synced so far")
+    failed: int = Field(default=0, description="Number of logs that failed to sync")
+    failed_log_ids: List[str] = Field(default_factory=list, description="IDs of the logs that failed, retried before the job ends")
+    remaining: Optional[int] = Field(None, description="Number of logs not yet attempted")
+    checkpoint_date: Optional[str] = Field(None, description="Date of the last log the job got through")
+    last_error: Optional[str] = Field(None, description="Error of the last failed attempt, if any")
+    created_at: datetime = Field(..., description="When the job was queued")
+    updated_at: Optional[datetime] = Field(None, description="When the job last made progress")
+    completed_at: Optional[datetime] = Field(None, description="When the job finished")
     
     class Config:
         json_schema_extra = {
             "example": {
-                "success": True,
-                "message": "Batch sync completed",
-                "synced_count": 15,
-                "failed_count": 0
+                "job_id": "65a1f0c2e4b0a1b2c3d4e5f6",
+                "status": "running",
+                "total": 365,
+                "processed": 200,
+                "failed": 0,
+                "remaining": 165,
+                "checkpoint_date": "2024-07-18",
+                "created_at": "2024-01-15T10:30:00Z",
+                "updated_at": "2024-01-15T10:30:42Z"
             }
         }
 
 
-# Dependency to get current user (placeholder - implement based on your auth system)
-async def get_current_user() -> UserInDB:
-    """
-    Get the currently authenticated user.
-    This should be replaced with your actual authentication logic.
-    """
-    # TODO: Implement actual user authentication
-    raise HTTPException(status_code=401, detail="Not authenticated")
+class ReconcileResponse(BaseModel):
+    """Response model for calendar reconciliation."""
+    
+    success: bool = Field(..., description="Whether reconciliation completed")
+    full_resync: bool = Field(..., description="Whether a full listing was needed instead of an incremental one")
+    changed_events: int = Field(..., description="Number of changed events fetched from Google")
+    repaired: int = Field(..., description="Number of logs re-pushed to repair drift")
+    orphans_deleted: int = Field(..., description="Number of events without a matching log that were removed")
+    adopted: int = Field(..., description="Number of existing events linked to logs that had no stored event")
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "success": True,
+                "full_resync": False,
+                "changed_events": 3,
+                "repaired": 1,
+                "orphans_deleted": 0,
+                "adopted": 0
+            }
+        }
 
 
-# Dependency to get database (placeholder - implement based on your DB setup)
-async def get_database():
-    """
-    Get database connection.
-    This should be replaced with your actual database logic.
-    """
-    # TODO: Implement actual database connection
-    raise NotImplementedError("Database connection not implemented")
+# Dependencies imported from utils.security and database
 
 
 def verify_calendar_connected(user: UserInDB) -> None:
@@ -119,6 +145,20 @@ def verify_calendar_connected(user: UserInDB) -> None:
         )
 
 
+def calendar_busy() -> HTTPException:
+    """
+    Build the error returned when the Google API executor is saturated.
+    
+    Returns:
+        HTTPException: 503 response asking the client to retry
+    """
+    return HTTPException(
+        status_code=503,
+        detail="Google Calendar sync is busy, please retry shortly",
+        headers={"Retry-After": "5"}
+    )
+
+
 @router.post(
     "/sync",
     response_model=SyncResponse,
@@ -157,55 +197,20 @@ async def sync_symptom_log(
         # Verify calendar is connected
         verify_calendar_connected(current_user)
         
-        # Get the symptom log from database
-        # TODO: Implement actual database query
-        # log = await db.symptom_logs.find_one({
-        #     "_id": ObjectId(request.log_id),
-        #     "user_id": current_user.id
-        # })
+        # Get the symptom log from database, daily or archived
+        log = None
+        if ObjectId.is_valid(request.log_id):
+            logs = await find_logs_by_id(db, ObjectId(current_user.id), [ObjectId(request.log_id)])
+            log = logs.get(request.log_id)
         
-        # if not log:
-        #     raise HTTPException(status_code=404, detail="Symptom log not found")
+        if not log:
+            raise HTTPException(status_code=404, detail="Symptom log not found")
         
-        # For now, create a mock log for demonstration
-        log = {
-            "_id": request.log_id,
-            "user_id": str(current_user.id),
-            "date": "2024-01-15",
-            "symptoms": [
-                {"name": "Hot Flushes", "severity": 4},
-                {"name": "Brain Fog", "severity": 2}
-            ],
-            "notes": "Feeling stressed today"
-        }
-        
-        # Initialize calendar service
-        calendar_service = GoogleCalendarService()
-        credentials = calendar_service.get_credentials(
-            current_user.google_auth.encrypted_refresh_token
-        )
-        
-        # Check if event already exists
-        existing_event_id = calendar_service.get_event_by_log_id(
-            credentials,
-            current_user.calendar_settings.calendar_id,
-            request.log_id
-        )
-        
-        # Sync the log
-        event_id = calendar_service.sync_symptom_log(
-            credentials,
-            current_user.calendar_settings.calendar_id,
-            log,
-            existing_event_id
-        )
+        # Create or update the event, reusing the event ID stored on the log
+        event_id = await calendar_sync_service.sync_log(db, current_user, log)
         
         # Update last sync time in database
-        # TODO: Implement actual database update
-        # await db.users.update_one(
-        #     {"_id": current_user.id},
-        #     {"$set": {"calendar_settings.last_sync": datetime.utcnow()}}
-        # )
+        await calendar_sync_service.mark_synced(db, current_user)
         
         logger.info(f"Synced log {request.log_id} for user {current_user.id}")
         
@@ -217,120 +222,170 @@ async def sync_symptom_log(
         
     except HTTPException:
         raise
+    except ExecutorOverloadedError:
+        raise calendar_busy()
     except Exception as e:
         logger.error(f"Failed to sync log {request.log_id}: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to sync log: {str(e)}")
 
 
+def job_response(job: dict) -> SyncJobResponse:
+    """
+    Build the API response for a sync-all job document.
+    
+    Args:
+        job: Job document from calendar_sync_jobs
+        
+    Returns:
+        SyncJobResponse: Job status and progress counts
+    """
+    total = job.get("total")
+    processed = job.get("processed", 0)
+    failed = job.get("failed", 0)
+    remaining = None
+    if total is not None:
+        # Logs added while the job runs are synced too, so don't go negative
+        remaining = max(total - processed - failed, 0)
+        if job["status"] == DONE:
+            remaining = 0
+    
+    return SyncJobResponse(
+        job_id=str(job["_id"]),
+        status=job["status"],
+        total=total,
+        processed=processed,
+        failed=failed,
+        failed_log_ids=job.get("failed_log_ids", []),
+        remaining=remaining,
+        checkpoint_date=job.get("checkpoint_date"),
+        last_error=job.get("last_error"),
+        created_at=job["created_at"],
+        updated_at=job.get("updated_at"),
+        completed_at=job.get("completed_at")
+    )
+
+
 @router.post(
     "/sync-all",
-    response_model=BatchSyncResponse,
+    response_model=SyncJobResponse,
+    status_code=202,
     summary="Batch Sync All Logs",
-    description="Sync all symptom logs to Google Calendar. Useful for initial setup or full re-sync.",
-    response_description="Batch sync results with counts"
+    description="Start a background job that syncs all symptom logs to Google Calendar. Useful for initial setup or full re-sync.",
+    response_description="The queued sync-all job"
 )
 async def sync_all_logs(
-    background_tasks: BackgroundTasks,
     current_user: UserInDB = Depends(get_current_user),
     db = Depends(get_database)
 ):
     """
-    Sync all user's symptom logs to Google Calendar.
+    Start syncing all user's symptom logs to Google Calendar.
     
-    This endpoint performs a batch sync of all symptom logs:
-    - Retrieves all logs from the database
-    - Creates or updates calendar events for each log
-    - Returns counts of successful and failed syncs
+    The sync runs in the background calendar sync workers and the job is
+    returned immediately; poll `GET /sync-all/{job_id}` for progress.
+    Logs are synced in date order and the job checkpoints the last synced
+    date, so a job interrupted by a crash or restart resumes from there.
+    If the user already has an unfinished sync-all job, that job is returned.
+    Returns 503 when this server runs no calendar sync workers, since the
+    job would never start.
     
     **Use Cases:**
     - Initial setup after connecting Google Calendar
     - Full re-sync after data changes
     - Recovery from sync failures
     
-    **Note:** This operation may take time for users with many logs.
-    
-    Args:
-        background_tasks: FastAPI background tasks
-        
     Returns:
-        BatchSyncResponse: Batch sync operation result with counts
+        SyncJobResponse: The queued or already running job
     """
     try:
         # Verify calendar is connected
         verify_calendar_connected(current_user)
         
-        # Get all user's symptom logs
-        # TODO: Implement actual database query
-        # logs = await db.symptom_logs.find({
-        #     "user_id": current_user.id
-        # }).to_list(length=None)
-        
-        # For now, create mock logs for demonstration
-        logs = [
-            {
-                "_id": "log1",
-                "user_id": str(current_user.id),
-                "date": "2024-01-15",
-                "symptoms": [{"name": "Hot Flushes", "severity": 4}],
-                "notes": "Test log 1"
-            },
-            {
-                "_id": "log2",
-                "user_id": str(current_user.id),
-                "date": "2024-01-16",
-                "symptoms": [{"name": "Brain Fog", "severity": 3}],
-                "notes": "Test log 2"
-            }
-        ]
-        
-        if not logs:
-            return BatchSyncResponse(
-                success=True,
-                message="No logs to sync",
-                synced_count=0,
-                failed_count=0
+        if get_calendar_sync_workers().worker_count <= 0:
+            raise HTTPException(
+                status_code=503,
+                detail="Background calendar sync is disabled on this server (CALENDAR_SYNC_WORKERS=0)"
             )
         
-        # Initialize calendar service
-        calendar_service = GoogleCalendarService()
-        credentials = calendar_service.get_credentials(
-            current_user.google_auth.encrypted_refresh_token
-        )
+        job = await enqueue_sync_all(db, ObjectId(current_user.id))
         
-        # Batch sync logs
-        event_map = calendar_service.batch_sync_logs(
-            credentials,
-            current_user.calendar_settings.calendar_id,
-            logs
-        )
+        logger.info(f"Queued sync-all job {job['_id']} for user {current_user.id}")
         
-        synced_count = len(event_map)
-        failed_count = len(logs) - synced_count
+        return job_response(job)
         
-        # Update last sync time in database
-        # TODO: Implement actual database update
-        # await db.users.update_one(
-        #     {"_id": current_user.id},
-        #     {"$set": {"calendar_settings.last_sync": datetime.utcnow()}}
-        # )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to start batch sync: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to sync logs: {str(e)}")
+
+
+@router.get(
+    "/sync-all/{job_id}",
+    response_model=SyncJobResponse,
+    summary="Get Sync-All Job Status",
+    description="Get the progress of a background sync-all job.",
+    response_description="Job status with processed, failed and remaining counts"
+)
+async def get_sync_all_status(
+    job_id: str,
+    current_user: UserInDB = Depends(get_current_user),
+    db = Depends(get_database)
+):
+    """
+    Get the status of a sync-all job.
+    
+    Args:
+        job_id: ID returned by `POST /sync-all`
         
-        logger.info(
-            f"Batch synced {synced_count} logs for user {current_user.id} "
-            f"({failed_count} failed)"
-        )
+    Returns:
+        SyncJobResponse: Job status and progress counts
+    """
+    job = await get_sync_all_job(db, ObjectId(current_user.id), job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Sync job not found")
+    
+    return job_response(job)
+
+
+@router.post(
+    "/reconcile",
+    response_model=ReconcileResponse,
+    summary="Reconcile Calendar",
+    description="Incrementally reconcile Google Calendar with the stored symptom logs.",
+    response_description="Counts of fetched changes and repairs"
+)
+async def reconcile_calendar_events(
+    current_user: UserInDB = Depends(get_current_user),
+    db = Depends(get_database)
+):
+    """
+    Reconcile the user's Altheia calendar with their symptom logs.
+    
+    Fetches only events changed since the last reconciliation (using the
+    Calendar API sync token) and repairs drift:
+    - Events deleted or edited in Google are re-pushed from the stored log
+    - Events whose symptom log no longer exists are removed
+    
+    Falls back to a full listing on the first run or when Google expires
+    the sync token. Reconciliation also runs periodically in the background.
+    
+    Returns:
+        ReconcileResponse: Counts of fetched changes and repairs
+    """
+    try:
+        verify_calendar_connected(current_user)
         
-        return BatchSyncResponse(
-            success=True,
-            message=f"Synced {synced_count} of {len(logs)} logs",
-            synced_count=synced_count,
-            failed_count=failed_count
-        )
+        result = await reconcile_calendar(db, current_user)
+        
+        return ReconcileResponse(success=True, **result)
         
     except HTTPException:
         raise
+    except ExecutorOverloadedError:
+        raise calendar_busy()
     except Exception as e:
-        logger.error(f"Failed to batch sync logs: {e}")
-        raise HTTPException(status_code=500, detail=f"Failed to sync logs: {str(e)}")
+        logger.error(f"Failed to reconcile calendar for user {current_user.id}: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to reconcile calendar: {str(e)}")
 
 
 @router.delete(
@@ -365,18 +420,13 @@ async def delete_synced_log(
         # Verify calendar is connected
         verify_calendar_connected(current_user)
         
-        # Initialize calendar service
-        calendar_service = GoogleCalendarService()
-        credentials = calendar_service.get_credentials(
-            current_user.google_auth.encrypted_refresh_token
-        )
+        log = None
+        if ObjectId.is_valid(log_id):
+            logs = await find_logs_by_id(db, ObjectId(current_user.id), [ObjectId(log_id)])
+            log = logs.get(log_id)
         
-        # Find the event
-        event_id = calendar_service.get_event_by_log_id(
-            credentials,
-            current_user.calendar_settings.calendar_id,
-            log_id
-        )
+        # Delete the event stored on the log (or found by search for older logs)
+        event_id = await calendar_sync_service.unsync_log(db, current_user, log_id, log)
         
         if not event_id:
             raise HTTPException(
@@ -384,13 +434,6 @@ async def delete_synced_log(
                 detail="Calendar event not found for this log"
             )
         
-        # Delete the event
-        calendar_service.delete_symptom_log(
-            credentials,
-            current_user.calendar_settings.calendar_id,
-            event_id
-        )
-        
         logger.info(f"Deleted calendar event for log {log_id}")
         
         return SyncResponse(
@@ -401,6 +444,8 @@ async def delete_synced_log(
         
     except HTTPException:
         raise
+    except ExecutorOverloadedError:
+        raise calendar_busy()
     except Exception as e:
         logger.error(f"Failed to delete calendar event for log {log_id}: {e}")
         raise HTTPException(
@@ -444,11 +489,11 @@ async def toggle_calendar_sync(
             )
         
         # Update sync setting in database
-        # TODO: Implement actual database update
-        # await db.users.update_one(
-        #     {"_id": current_user.id},
-        #     {"$set": {"calendar_settings.is_enabled": enabled}}
-        # )
+        await db.users.update_one(
+            {"_id": ObjectId(current_user.id)},
+            {"$set": {"calendar_settings.is_enabled": enabled}}
+        )
+        invalidate_cached_user(current_user.id)
         
         logger.info(f"Calendar sync {'enabled' if enabled else 'disabled'} for user {current_user.id}")
         
@@ -1,15 +1,39 @@
 """
 Router for daily symptom logging operations.
 """
-from datetime import datetime
+import base64
+from datetime import date as date_type, datetime, timedelta, timezone
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from bson import ObjectId
-from pymongo import ReturnDocument
 
+from config import get_settings
 from database import get_database
 from models.user import UserInDB
-from models.symptom_log import SymptomLogCreate, SymptomLogResponse, SymptomLogInDB
+from models.symptom_log import (
+    SymptomLogCreate,
+    SymptomLogResponse,
+    SymptomLogInDB,
+    SymptomLogBulkRequest,
+    SymptomLogBulkResponse,
+    TrendsResponse,
+    SymptomRollupResponse,
+    SymptomLogPage,
+    SymptomLogChanges,
+    SymptomHeatmapResponse,
+    SymptomInsightsResponse,
+)
+from services import (
+    symptom_heatmap_service,
+    symptom_insights_service,
+    symptom_log_service,
+    symptom_rollup_service,
+    symptom_trends_service,
+)
+from services.symptom_catalog import symptom_id
+from utils.etag import compute_etag, etag_headers, is_not_modified, not_modified
+from utils.pagination import decode_cursor, encode_cursor
 from utils.security import get_current_user
 
 router = APIRouter(
@@ -18,78 +42,340 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
+settings = get_settings()
+
+# Daily trends are limited to this many days so responses stay small
+MAX_DAILY_TREND_DAYS = 366
+
+# Range used for trends when no start_date is given
+DEFAULT_TREND_DAYS = 90
+
+# Logs listed when no date range is given
+DEFAULT_LOG_LIMIT = 30
+
 @router.post("/", response_model=SymptomLogResponse)
 async def upsert_symptom_log(
     log_in: SymptomLogCreate,
+    sync: bool = Query(False, description="Write before responding instead of coalescing with following saves"),
     current_user: UserInDB = Depends(get_current_user),
     db = Depends(get_database)
 ):
     """
     Create or update a symptom log for a specific date.
     If a log exists for the given date, it will be updated.
+    When write coalescing is enabled, rapid saves of the same date (e.g.
+    autosave) may be held briefly and only the latest written; the
+    response shows the log as it will be written. Pass sync=true for a
+    save that must be written before the response, e.g. on leaving the page.
     """
-    user_id = ObjectId(current_user.id)
-    current_time = datetime.utcnow()
-    
-    # Use find_one_and_update with upsert=True to atomically create or update
-    updated_doc = await db.symptom_logs.find_one_and_update(
-        {
-            "user_id": user_id,
-            "date": log_in.date
-        },
-        {
-            "$set": {
-                "symptoms": [s.dict() for s in log_in.symptoms],
-                "overall_notes": log_in.overall_notes,
-                "updated_at": current_time
-            },
-            "$setOnInsert": {
-                "created_at": current_time
-            }
-        },
-        upsert=True,
-        return_document=ReturnDocument.AFTER
-    )
+    updated_doc = await symptom_log_service.upsert_log(db, current_user, log_in, durable=sync)
     
     updated_doc["id"] = str(updated_doc["_id"])
     updated_doc["user_id"] = str(updated_doc["user_id"])
     return SymptomLogResponse(**updated_doc)
 
+@router.post("/bulk", response_model=SymptomLogBulkResponse)
+async def bulk_write_symptom_logs(
+    bulk_in: SymptomLogBulkRequest,
+    current_user: UserInDB = Depends(get_current_user),
+    db = Depends(get_database)
+):
+    """
+    Create, update and delete many symptom logs in one request.
+    All writes are applied in a single unordered bulk write; each item
+    succeeds or fails on its own and gets its own result, upserts first.
+    """
+    upsert_dates = [log_in.date for log_in in bulk_in.upserts]
+    if len(set(upsert_dates)) != len(upsert_dates) or len(set(bulk_in.deletes)) != len(bulk_in.deletes):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Each date may appear only once in upserts and once in deletes"
+        )
+    if set(upsert_dates) & set(bulk_in.deletes):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="A date cannot be both upserted and deleted in one request"
+        )
+    
+    results = await symptom_log_service.bulk_write_logs(
+        db, current_user, bulk_in.upserts, bulk_in.deletes
+    )
+    
+    counts = {"created": 0, "updated": 0, "deleted": 0, "not_found": 0, "failed": 0}
+    for item in results:
+        counts[item["status"]] += 1
+    return SymptomLogBulkResponse(results=results, **counts)
+
 @router.get("/", response_model=List[SymptomLogResponse])
 async def get_symptom_logs(
+    request: Request,
     start_date: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$"),
     end_date: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$"),
+    symptom: Optional[str] = Query(None, description="Only logs with this symptom (name or catalog ID)"),
+    min_severity: Optional[int] = Query(None, ge=1, le=5, description="Only logs with a symptom at least this severe"),
+    severity_level: Optional[str] = Query(None, pattern="^(mild|moderate|severe)$", description="Only days of this overall severity"),
     current_user: UserInDB = Depends(get_current_user),
     db = Depends(get_database)
 ):
     """
     Retrieve symptom logs for the current user.
-    Optionally filter by start_date and end_date (inclusive).
+    Optionally filter by start_date and end_date (inclusive), and by a
+    symptom and minimum severity, e.g. days with hot flushes at 4 or more,
+    or by the day's overall severity_level.
+    Supports If-None-Match; unchanged listings get an empty 304.
     """
-    query = {"user_id": ObjectId(current_user.id)}
+    # Held autosave writes are written first so users read their own writes
+    await symptom_log_service.flush_pending(current_user.id)
+    filters = dict(
+        start_date=start_date,
+        end_date=end_date,
+        symptom_id=symptom_id(symptom) if symptom else None,
+        min_severity=min_severity,
+        severity_level=severity_level,
+        # If no range specified, limit to last 30 entries by default to prevent over-fetching
+        limit=None if (start_date or end_date) else DEFAULT_LOG_LIMIT,
+    )
+    user_id = ObjectId(current_user.id)
     
-    # Add date range filter if provided
-    if start_date or end_date:
-        date_query = {}
-        if start_date:
-            date_query["$gte"] = start_date
-        if end_date:
-            date_query["$lte"] = end_date
-        query["date"] = date_query
+    # Answer unchanged listings with 304 before reading the logs themselves
+    summary = await symptom_log_service.get_logs_summary(db, user_id, **filters)
+    etag = compute_etag("logs", current_user.id, filters, summary)
+    if is_not_modified(request, etag):
+        return not_modified(etag)
         
-    cursor = db.symptom_logs.find(query).sort("date", -1) # Sort by date descending
+    # Stored logs are already valid, so they are encoded straight to JSON
+    # instead of being validated into models and again by response_model
+    logs = await symptom_log_service.get_logs(db, user_id, **filters)
+    return ORJSONResponse(
+        [symptom_log_service.log_to_json(doc) for doc in logs],
+        headers=etag_headers(etag)
+    )
+
+@router.get("/page", response_model=SymptomLogPage)
+async def get_symptom_logs_page(
+    limit: int = Query(30, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    current_user: UserInDB = Depends(get_current_user),
+    db = Depends(get_database)
+):
+    """
+    Retrieve symptom logs one page at a time, newest first by default.
+    Pass the returned next_cursor to get the following page; it is null
+    on the last page. Deep pages cost the same as the first one.
+    """
+    await symptom_log_service.flush_pending(current_user.id)
+    after_date = None
+    if cursor:
+        try:
+            after_date = decode_cursor(cursor).get("date")
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+        if not isinstance(after_date, str):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
     
-    # If no range specified, limit to last 30 entries by default to prevent over-fetching
-    if not (start_date or end_date):
-        cursor = cursor.limit(30)
-        
-    logs = []
-    async for doc in cursor:
+    docs, next_date = await symptom_log_service.get_logs_page(
+        db, ObjectId(current_user.id), limit, after_date, ascending=order == "asc"
+    )
+    
+    items = []
+    for doc in docs:
         doc["id"] = str(doc["_id"])
         doc["user_id"] = str(doc["user_id"])
-        logs.append(SymptomLogResponse(**doc))
-        
-    return logs
+        items.append(SymptomLogResponse(**doc))
+    
+    return SymptomLogPage(
+        items=items,
+        limit=limit,
+        next_cursor=encode_cursor({"date": next_date}) if next_date else None
+    )
+
+@router.get("/changes", response_model=SymptomLogChanges)
+async def get_symptom_log_changes(
+    since: Optional[datetime] = Query(None, description="watermark of the previous sync"),
+    current_user: UserInDB = Depends(get_current_user),
+    db = Depends(get_database)
+):
+    """
+    Retrieve the logs created, updated or deleted since the previous sync.
+    Omit since on the first sync to get every log. Store the returned
+    watermark and pass it as since next time; a log may be returned again
+    near the watermark, so apply changes by date. Deletions are kept for
+    LOG_TOMBSTONE_TTL_DAYS; older watermarks get 410 and need a full sync.
+    """
+    await symptom_log_service.flush_pending(current_user.id)
+    if since is not None and since.tzinfo is not None:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    if since is not None and since < datetime.utcnow() - timedelta(days=settings.log_tombstone_ttl_days):
+        raise HTTPException(
+            status_code=status.HTTP_410_GONE,
+            detail="Watermark is older than the deletion history; sync again without since"
+        )
+    
+    logs, tombstones, watermark = await symptom_log_service.get_changes(
+        db, ObjectId(current_user.id), since
+    )
+    
+    changed = []
+    for doc in logs:
+        doc["id"] = str(doc["_id"])
+        doc["user_id"] = str(doc["user_id"])
+        changed.append(SymptomLogResponse(**doc))
+    
+    return SymptomLogChanges(
+        changed=changed,
+        deleted=[
+            {"date": tombstone["date"], "id": str(tombstone["log_id"]), "deleted_at": tombstone["deleted_at"]}
+            for tombstone in tombstones
+        ],
+        watermark=watermark
+    )
+
+@router.get("/trends", response_model=TrendsResponse)
+async def get_symptom_trends(
+    granularity: str = Query("week", pattern="^(day|week|month)$"),
+    start_date: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$"),
+    end_date: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$"),
+    symptom: Optional[str] = Query(None, description="Only include this symptom"),
+    current_user: UserInDB = Depends(get_current_user),
+    db = Depends(get_database)
+):
+    """
+    Get symptom statistics per day, ISO week or month for a date range.
+    Each bucket holds the number of days a symptom was logged in the period
+    and its mean and max severity. Defaults to the last 90 days.
+    """
+    await symptom_log_service.flush_pending(current_user.id)
+    try:
+        end = datetime.strptime(end_date, "%Y-%m-%d").date() if end_date else datetime.utcnow().date()
+        start = (
+            datetime.strptime(start_date, "%Y-%m-%d").date() if start_date
+            else end - timedelta(days=DEFAULT_TREND_DAYS - 1)
+        )
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid date")
+    
+    if start > end:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="start_date must not be after end_date"
+        )
+    if granularity == "day" and (end - start).days >= MAX_DAILY_TREND_DAYS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Daily trends are limited to {MAX_DAILY_TREND_DAYS} days; use week or month"
+        )
+    
+    buckets = await symptom_trends_service.get_trends(
+        db,
+        ObjectId(current_user.id),
+        granularity,
+        start.isoformat(),
+        end.isoformat(),
+        symptom
+    )
+    return TrendsResponse(
+        granularity=granularity,
+        start_date=start.isoformat(),
+        end_date=end.isoformat(),
+        buckets=buckets
+    )
+
+@router.get("/rollups", response_model=List[SymptomRollupResponse])
+async def get_symptom_rollups(
+    granularity: str = Query("month", pattern="^(week|month)$"),
+    start_period: Optional[str] = Query(None, pattern=r"^\d{4}-(W\d{2}|\d{2})$"),
+    end_period: Optional[str] = Query(None, pattern=r"^\d{4}-(W\d{2}|\d{2})$"),
+    current_user: UserInDB = Depends(get_current_user),
+    db = Depends(get_database)
+):
+    """
+    Get precomputed weekly or monthly symptom summaries.
+    Summaries are kept up to date as logs are written, so this reads a few
+    small documents instead of scanning the history. Periods are ISO weeks
+    (YYYY-Www) or months (YYYY-MM); the range bounds are inclusive.
+    """
+    await symptom_log_service.flush_pending(current_user.id)
+    rollups = await symptom_rollup_service.get_rollups(
+        db, ObjectId(current_user.id), granularity, start_period, end_period
+    )
+    return [
+        SymptomRollupResponse(
+            granularity=rollup["granularity"],
+            period=rollup["period"],
+            symptoms=sorted(
+                (
+                    {**symptom, "mean": round(symptom["sum"] / symptom["count"], 2)}
+                    for symptom in rollup.get("symptoms", {}).values()
+                    if symptom.get("count", 0) > 0
+                ),
+                key=lambda symptom: symptom["name"]
+            )
+        )
+        for rollup in rollups
+    ]
+
+@router.get("/heatmap", response_model=SymptomHeatmapResponse)
+async def get_symptom_heatmap(
+    year: Optional[int] = Query(None, ge=1900, le=2100, description="Defaults to the current year"),
+    current_user: UserInDB = Depends(get_current_user),
+    db = Depends(get_database)
+):
+    """
+    Get one byte of symptom severity per day of a year, for the calendar view.
+    A whole year is about 500 bytes; see the response schema for the encoding.
+    """
+    await symptom_log_service.flush_pending(current_user.id)
+    year = year or datetime.utcnow().year
+    heatmap = await symptom_heatmap_service.get_heatmap(db, ObjectId(current_user.id), year)
+    return SymptomHeatmapResponse(
+        year=year,
+        days=len(heatmap),
+        data=base64.b64encode(heatmap).decode("ascii")
+    )
+
+@router.get("/insights", response_model=SymptomInsightsResponse)
+async def get_symptom_insights(
+    max_lag: int = Query(1, ge=1, le=7, description="Largest lag in days for lagged correlations"),
+    window: int = Query(7, ge=2, le=90, description="Rolling mean window in days"),
+    current_user: UserInDB = Depends(get_current_user),
+    db = Depends(get_database)
+):
+    """
+    Get symptom co-occurrence counts, Pearson and Spearman correlations,
+    lagged correlations (e.g. poor sleep one day vs. brain fog the next)
+    and rolling mean severities over the user's whole history.
+    """
+    await symptom_log_service.flush_pending(current_user.id)
+    insights = await symptom_insights_service.get_insights(
+        db, ObjectId(current_user.id), max_lag, window
+    )
+    if insights is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No symptom logs yet")
+    return SymptomInsightsResponse(**insights)
+
+@router.get("/export")
+async def export_symptom_logs(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    start_date: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$"),
+    end_date: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$"),
+    current_user: UserInDB = Depends(get_current_user),
+    db = Depends(get_database)
+):
+    """
+    Export the current user's full symptom history, oldest first.
+    The file is streamed as it is read from the database, so histories of
+    any length can be exported. CSV has one row per symptom.
+    Optionally limit the export with start_date and end_date (inclusive).
+    """
+    await symptom_log_service.flush_pending(current_user.id)
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    filename = f"symptom-logs-{date_type.today().isoformat()}.{format}"
+    return StreamingResponse(
+        symptom_log_service.export_logs(db, current_user, format, start_date, end_date),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
 
 @router.delete("/{date}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_symptom_log(
@@ -100,12 +386,9 @@ async def delete_symptom_log(
     """
     Delete a symptom log for a specific date.
     """
-    result = await db.symptom_logs.delete_one({
-        "user_id": ObjectId(current_user.id),
-        "date": date
-    })
+    deleted_doc = await symptom_log_service.delete_log(db, current_user, date)
     
-    if result.deleted_count == 0:
+    if deleted_doc is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"No symptom log found for date {date}"
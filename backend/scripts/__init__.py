@@ -0,0 +1 @@
+"""Maintenance commands run against the application database."""
\ No newline at end of file
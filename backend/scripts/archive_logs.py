@@ -0,0 +1,41 @@
+"""
+Compact symptom logs older than LOG_ARCHIVE_AFTER_DAYS into one archive
+document per user and month. Meant to run periodically (e.g. nightly);
+safe to run again after an interruption.
+
+Usage (from the backend directory):
+    python -m scripts.archive_logs              # every user
+    python -m scripts.archive_logs <user_id>    # one user
+"""
+import asyncio
+import logging
+import sys
+
+from bson import ObjectId
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from database import connect_to_mongo, close_mongo_connection, get_database
+from services.symptom_archive_service import archive_logs, archive_user_logs
+
+logger = logging.getLogger(__name__)
+
+
+async def main(user_id: str = None) -> None:
+    await connect_to_mongo()
+    try:
+        db = await get_database()
+        if user_id:
+            count = await archive_user_logs(db, ObjectId(user_id))
+            logger.info(f"Archived {count} symptom logs for user {user_id}")
+        else:
+            result = await archive_logs(db)
+            logger.info(f"Archived {result['logs']} symptom logs of {result['users']} users")
+    finally:
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main(sys.argv[1] if len(sys.argv) > 1 else None))
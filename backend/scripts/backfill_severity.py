@@ -0,0 +1,34 @@
+"""
+Store derived severity fields (mean, max, symptom count and level) on
+symptom logs written before they were computed on write. Safe to run
+again; logs that already have the fields are skipped.
+
+Usage (from the backend directory):
+    python -m scripts.backfill_severity
+"""
+import asyncio
+import logging
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from database import connect_to_mongo, close_mongo_connection, get_database
+from services.symptom_severity import backfill_severity_fields
+
+logger = logging.getLogger(__name__)
+
+
+async def main() -> None:
+    await connect_to_mongo()
+    try:
+        db = await get_database()
+        count = await backfill_severity_fields(db)
+        logger.info(f"Backfilled severity fields on {count} symptom logs")
+    finally:
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -0,0 +1,42 @@
+"""
+Rewrite stored symptom logs and primary symptoms to symptom catalog IDs
+and display names, then rebuild the rollups of users whose symptom names
+changed. Safe to run again; unchanged logs are not written.
+
+Usage (from the backend directory):
+    python -m scripts.migrate_symptom_ids
+"""
+import asyncio
+import logging
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from database import connect_to_mongo, close_mongo_connection, get_database
+from services.symptom_catalog import migrate_symptom_ids
+from services.symptom_rollup_service import rebuild_rollups
+
+logger = logging.getLogger(__name__)
+
+
+async def main() -> None:
+    await connect_to_mongo()
+    try:
+        db = await get_database()
+        result = await migrate_symptom_ids(db)
+        logger.info(
+            f"Updated {result['logs_updated']} symptom logs and "
+            f"{result['users_updated']} users' primary symptoms"
+        )
+        # Rollups are keyed by symptom name, so renamed symptoms are recounted
+        for user_id in result["renamed_users"]:
+            count = await rebuild_rollups(db, user_id)
+            logger.info(f"Rebuilt {count} symptom rollups for user {user_id}")
+    finally:
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -0,0 +1,39 @@
+"""
+Rebuild symptom rollups from the symptom logs.
+
+Usage (from the backend directory):
+    python -m scripts.rebuild_rollups              # every user
+    python -m scripts.rebuild_rollups <user_id>    # one user
+"""
+import asyncio
+import logging
+import sys
+
+from bson import ObjectId
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from database import connect_to_mongo, close_mongo_connection, get_database
+from services.symptom_rollup_service import rebuild_all_rollups, rebuild_rollups
+
+logger = logging.getLogger(__name__)
+
+
+async def main(user_id: str = None) -> None:
+    await connect_to_mongo()
+    try:
+        db = await get_database()
+        if user_id:
+            count = await rebuild_rollups(db, ObjectId(user_id))
+            logger.info(f"Rebuilt {count} symptom rollups for user {user_id}")
+        else:
+            users = await rebuild_all_rollups(db)
+            logger.info(f"Rebuilt symptom rollups for {users} users")
+    finally:
+        await close_mongo_connection()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main(sys.argv[1] if len(sys.argv) > 1 else None))
@@ -8,10 +8,24 @@ from bs4 import BeautifulSoup
 from typing import Optional
 from datetime import datetime
 from time import mktime
+from config import get_settings
 from database import get_database
+from utils.executors import BoundedExecutor
 
 logger = logging.getLogger(__name__)
 
+settings = get_settings()
+
+# feedparser and requests are blocking, so feed and page fetches run here
+article_fetch_executor = BoundedExecutor(
+    "article_fetch",
+    max_workers=settings.article_fetch_workers,
+    max_queue=settings.article_fetch_queue_limit,
+    timeout=settings.article_fetch_timeout_seconds
+)
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
 # Target RSS Feed
 RSS_FEED_URL = "https://www.sciencedaily.com/rss/health_medicine/menopause.xml"
 
@@ -36,9 +50,7 @@ def extract_og_image(url: str) -> Optional[str]:
     Fetches the URL and extracts the Open Graph image URL.
     """
     try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
+        headers = {'User-Agent': USER_AGENT}
         # Short timeout to avoid blocking for too long
         response = requests.get(url, headers=headers, timeout=5)
         
@@ -52,6 +64,20 @@ def extract_og_image(url: str) -> Optional[str]:
     
     return None
 
+def fetch_feed(url: str):
+    """
+    Downloads and parses an RSS feed.
+    The download goes through requests so it is bounded by a timeout;
+    feedparser.parse(url) would wait on a stalled server indefinitely.
+    """
+    response = requests.get(
+        url,
+        headers={'User-Agent': USER_AGENT},
+        timeout=settings.article_fetch_timeout_seconds
+    )
+    response.raise_for_status()
+    return feedparser.parse(response.content)
+
 async def fetch_external_articles():
     """
     Fetches articles from the configured RSS feed and upserts them into the database.
@@ -59,9 +85,11 @@ async def fetch_external_articles():
     """
     logger.info(f"Starting article fetch from {RSS_FEED_URL}")
     
-    # Note: feedparser.parse is synchronous/blocking. 
-    # In a heavy-load scenario, run this in a thread executor.
-    feed = feedparser.parse(RSS_FEED_URL)
+    try:
+        feed = await article_fetch_executor.run(fetch_feed, RSS_FEED_URL)
+    except Exception as e:
+        logger.error(f"Error fetching RSS feed: {e}")
+        return 0
     
     if feed.bozo:
         logger.error(f"Error parsing RSS feed: {feed.bozo_exception}")
@@ -116,7 +144,10 @@ async def fetch_external_articles():
             
             # If still no image, try fetching from OG tags
             if not image_url:
-                image_url = extract_og_image(link)
+                try:
+                    image_url = await article_fetch_executor.run(extract_og_image, link)
+                except Exception as e:
+                    logger.warning(f"Skipped OG image lookup for {link}: {e}")
 
             # Prepare document
             category = determine_category(title, summary)
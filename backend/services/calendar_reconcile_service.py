@@ -0,0 +1,159 @@
+"""
+Two-way reconciliation between symptom logs and their Google Calendar events.
+
+Uses the Calendar API sync token stored in the user's calendar_settings to
+fetch only events changed since the previous run, then repairs drift:
+- events deleted or edited in Google are re-pushed from the stored log
+- events whose log no longer exists (or that duplicate a linked event) are removed
+- events found for unlinked logs are adopted as the log's event
+
+The app's symptom logs, daily and archived, are the source of truth. When
+Google expires the sync token (HTTP 410) a full listing is done instead.
+"""
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Set, Tuple
+
+from bson import ObjectId
+
+from models.user import UserInDB
+from services import calendar_sync_service
+from services.symptom_archive_service import find_logs_by_id, iter_archived_logs, set_log_fields
+from services.google_calendar_service import GoogleCalendarService, google_api_executor
+from utils.exceptions import SyncTokenExpiredError
+from utils.security import invalidate_cached_user
+
+logger = logging.getLogger(__name__)
+
+
+def _event_log_id(event: Dict[str, Any]) -> str:
+    private = (event.get("extendedProperties") or {}).get("private") or {}
+    return private.get("altheia_log_id")
+
+
+def _repush_if_missing(log: Dict[str, Any], seen: Set[str], to_repush: Dict[str, Dict[str, Any]]) -> None:
+    if log["calendar_event"]["event_id"] not in seen and str(log["_id"]) not in to_repush:
+        log.pop("calendar_event", None)
+        to_repush[str(log["_id"])] = log
+
+
+async def reconcile_calendar(db, user: UserInDB) -> Dict[str, Any]:
+    """
+    Reconcile a user's Altheia calendar with their symptom logs.
+
+    Args:
+        db: Database instance
+        user: User with Google Calendar connected
+
+    Returns:
+        Dictionary of counts describing what was checked and repaired
+    """
+    calendar_service = GoogleCalendarService()
+    credentials = await google_api_executor.run(
+        calendar_service.get_credentials,
+        user.google_auth.encrypted_refresh_token
+    )
+    calendar_id = user.calendar_settings.calendar_id
+    sync_token = user.calendar_settings.sync_token
+
+    full_resync = sync_token is None
+    try:
+        events, next_sync_token = await google_api_executor.run(
+            calendar_service.list_event_changes, credentials, calendar_id, sync_token
+        )
+    except SyncTokenExpiredError:
+        logger.info(f"Sync token expired for user {user.id}, doing a full resync")
+        full_resync = True
+        events, next_sync_token = await google_api_executor.run(
+            calendar_service.list_event_changes, credentials, calendar_id, None
+        )
+
+    user_id = ObjectId(user.id)
+    ours = [event for event in events if _event_log_id(event)]
+    log_ids = [ObjectId(_event_log_id(e)) for e in ours if ObjectId.is_valid(_event_log_id(e))]
+    # Events of archived logs are not orphans
+    logs = await find_logs_by_id(db, user_id, log_ids)
+
+    to_repush: Dict[str, Dict[str, Any]] = {}
+    orphans: List[str] = []
+    adopt_links: List[Tuple[ObjectId, Dict[str, Any]]] = []
+    adopted = 0
+
+    for event in ours:
+        log = logs.get(_event_log_id(event))
+        cancelled = event.get("status") == "cancelled"
+        linked_event_id = (
+            calendar_sync_service.get_linked_event_id(log, calendar_id) if log else None
+        )
+
+        if log is None:
+            # Log deleted in the app (or never ours): remove the stray event
+            if not cancelled:
+                orphans.append(event["id"])
+        elif linked_event_id and linked_event_id != event["id"]:
+            # A second event for an already linked log
+            if not cancelled:
+                orphans.append(event["id"])
+        elif cancelled:
+            if linked_event_id:
+                # Deleted in Google: drop the link so the log is inserted again
+                log.pop("calendar_event", None)
+                to_repush[str(log["_id"])] = log
+        else:
+            event_hash = calendar_service.event_hash(event)
+            if not linked_event_id:
+                # Synced before links were stored: adopt the event
+                adopted += 1
+                log["calendar_event"] = {"event_id": event["id"], "calendar_id": calendar_id}
+                if event_hash == calendar_service.log_content_hash(log):
+                    adopt_links.append((log["_id"], {"calendar_event": calendar_sync_service.event_link(
+                        event["id"], calendar_id, event_hash
+                    )}))
+                else:
+                    to_repush[str(log["_id"])] = log
+            elif event_hash != log["calendar_event"].get("content_hash"):
+                # Edited in Google: overwrite it with the log's content
+                log["calendar_event"] = {"event_id": event["id"], "calendar_id": calendar_id}
+                to_repush[str(log["_id"])] = log
+
+    if full_resync:
+        # Linked events missing from a full listing were removed entirely
+        seen = {event["id"] for event in events if event.get("status") != "cancelled"}
+        linked = db.symptom_logs.find({
+            "user_id": user_id,
+            "calendar_event.calendar_id": calendar_id
+        })
+        async for log in linked:
+            _repush_if_missing(log, seen, to_repush)
+        async for log in iter_archived_logs(db, user_id):
+            if calendar_sync_service.get_linked_event_id(log, calendar_id):
+                _repush_if_missing(log, seen, to_repush)
+
+    for event_id in orphans:
+        await google_api_executor.run(
+            calendar_service.delete_symptom_log, credentials, calendar_id, event_id
+        )
+
+    await set_log_fields(db, user_id, adopt_links)
+
+    repaired = await calendar_sync_service.sync_logs(db, user, list(to_repush.values()))
+
+    now = datetime.utcnow()
+    await db.users.update_one(
+        {"_id": user_id},
+        {"$set": {
+            "calendar_settings.sync_token": next_sync_token,
+            "calendar_settings.last_reconciled": now
+        }}
+    )
+    invalidate_cached_user(user.id)
+
+    result = {
+        "full_resync": full_resync,
+        "changed_events": len(events),
+        "repaired": len(repaired),
+        "orphans_deleted": len(orphans),
+        "adopted": adopted,
+    }
+    logger.info(f"Reconciled calendar for user {user.id}: {result}")
+    return result
@@ -0,0 +1,633 @@
+"""
+Durable outbox for automatic Google Calendar sync.
+
+Symptom log writes enqueue a job into the calendar_sync_jobs collection
+instead of calling Google inline. A pool of asyncio workers started with
+the application claims jobs with a lease, retries failures with
+exponential backoff and dead-letters jobs that keep failing. Jobs are
+stored in Mongo, so pending work survives process restarts; a job whose
+worker died is picked up again once its lease expires.
+
+Each log, and each user-level operation, has at most one active job.
+Edits made while the job runs are merged into it and mark it to run
+again when it finishes, so two workers never sync the same log at once
+and a delete always runs after the upsert it follows. Each claim gets
+a new lease token, and a worker only records progress or the outcome of
+a job while its token is current, so a worker that overran its lease
+cannot overwrite the work of the one that took the job over.
+
+The pool also schedules periodic reconciliation jobs for users with
+calendar sync enabled, and runs full-history sync jobs in chunks,
+checkpointing the last synced date so an interrupted job resumes where
+it stopped. Logs that fail to sync are recorded on the job, which is
+retried with backoff for just those logs once the rest are done. A user
+has at most one unfinished sync-all job.
+"""
+import asyncio
+import logging
+import random
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from config import get_settings
+from database import get_database
+from models.user import UserInDB
+from services import calendar_sync_service
+from services.calendar_reconcile_service import reconcile_calendar
+from services.symptom_archive_service import count_archived_logs, find_logs_by_id, iter_logs
+from utils.metrics import register_metrics
+from utils.security import invalidate_cached_user
+
+logger = logging.getLogger(__name__)
+
+# Job statuses
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+DEAD = "dead"
+
+# Job operations
+OP_UPSERT = "upsert"
+OP_DELETE = "delete"
+OP_RECONCILE = "reconcile"
+OP_SYNC_ALL = "sync_all"
+
+# Users whose reconciliation is due are scheduled in batches of this size
+RECONCILE_SCHEDULE_BATCH = 100
+
+# Longest delay between retries of a failing job
+MAX_BACKOFF_SECONDS = 3600
+
+# MongoDB error code of a unique index violation
+DUPLICATE_KEY = 11000
+
+# Logs synced per step of a sync-all job; progress is checkpointed after each
+SYNC_ALL_CHUNK_SIZE = 100
+
+
+class LeaseLostError(Exception):
+    """Raised when a job was claimed by another worker after its lease expired."""
+
+
+class SyncAllIncompleteError(Exception):
+    """Raised when a sync-all job got through every log but some failed to sync."""
+
+
+def _sync_enabled(user: UserInDB) -> bool:
+    return bool(
+        user.google_auth
+        and user.google_auth.encrypted_refresh_token
+        and user.calendar_settings.is_enabled
+        and user.calendar_settings.calendar_id
+    )
+
+
+def _job_key(log_id: Optional[ObjectId], op: str) -> str:
+    # Log jobs are keyed by log whatever their operation; user-level jobs
+    # only collapse with jobs of the same kind
+    return str(log_id) if log_id is not None else op
+
+
+def _job_query(user_id: ObjectId, log_id: Optional[ObjectId], op: str) -> Dict[str, Any]:
+    # Pending and running jobs are active; a unique partial index allows
+    # one active job per key
+    return {"user_id": user_id, "key": _job_key(log_id, op), "active": True}
+
+
+def _job_update(log_id: Optional[ObjectId], date: Optional[str], fields: Dict[str, Any], now: datetime) -> Dict[str, Any]:
+    # A running job is left running and marked to run again when it ends
+    return {
+        "$set": {**fields, "date": date, "next_attempt_at": now, "updated_at": now, "requeue": True},
+        "$setOnInsert": {"log_id": log_id, "status": PENDING, "attempts": 0, "created_at": now}
+    }
+
+
+async def _enqueue(db, user_id: ObjectId, log_id: Optional[ObjectId], date: Optional[str], fields: Dict[str, Any]) -> None:
+    now = datetime.utcnow()
+    # Collapse into the log's active job, if any, so bursts of edits sync once
+    try:
+        await db.calendar_sync_jobs.update_one(
+            _job_query(user_id, log_id, fields["op"]),
+            _job_update(log_id, date, fields, now),
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # A concurrent request inserted the job first; merge into it
+        await db.calendar_sync_jobs.update_one(
+            _job_query(user_id, log_id, fields["op"]),
+            _job_update(log_id, date, fields, now)
+        )
+
+
+async def enqueue_log_sync(db, user: UserInDB, log: Dict[str, Any]) -> None:
+    """
+    Queue a calendar create/update for a symptom log.
+    Does nothing when the user has not enabled calendar sync.
+
+    Args:
+        db: Database instance
+        user: Owner of the log
+        log: Symptom log document as written
+    """
+    if not _sync_enabled(user):
+        return
+    await _enqueue(db, ObjectId(user.id), log["_id"], log["date"], {"op": OP_UPSERT})
+
+
+async def enqueue_log_delete(db, user: UserInDB, log: Dict[str, Any]) -> None:
+    """
+    Queue removal of the calendar event of a deleted symptom log.
+    The event link is copied into the job because the log is gone.
+
+    Args:
+        db: Database instance
+        user: Owner of the log
+        log: Symptom log document as it was before deletion
+    """
+    if not _sync_enabled(user):
+        return
+    await _enqueue(db, ObjectId(user.id), log["_id"], log["date"], {
+        "op": OP_DELETE,
+        "calendar_event": log.get("calendar_event")
+    })
+
+
+async def enqueue_log_changes(
+    db,
+    user: UserInDB,
+    written: List[Dict[str, Any]],
+    deleted: List[Dict[str, Any]]
+) -> None:
+    """
+    Queue calendar jobs for many written and deleted symptom logs in one
+    bulk write. Does nothing when the user has not enabled calendar sync.
+
+    Args:
+        db: Database instance
+        user: Owner of the logs
+        written: Symptom log documents as written
+        deleted: Symptom log documents as they were before deletion
+    """
+    if not _sync_enabled(user) or not (written or deleted):
+        return
+
+    user_id = ObjectId(user.id)
+    now = datetime.utcnow()
+    jobs = [
+        (_job_query(user_id, log["_id"], OP_UPSERT), _job_update(log["_id"], log["date"], {"op": OP_UPSERT}, now))
+        for log in written
+    ]
+    jobs += [
+        (
+            _job_query(user_id, log["_id"], OP_DELETE),
+            _job_update(log["_id"], log["date"], {"op": OP_DELETE, "calendar_event": log.get("calendar_event")}, now)
+        )
+        for log in deleted
+    ]
+    try:
+        await db.calendar_sync_jobs.bulk_write(
+            [UpdateOne(query, update, upsert=True) for query, update in jobs], ordered=False
+        )
+    except BulkWriteError as e:
+        # Jobs inserted concurrently by another request are merged into
+        duplicates = [error["index"] for error in e.details["writeErrors"] if error.get("code") == DUPLICATE_KEY]
+        if len(duplicates) < len(e.details["writeErrors"]):
+            raise
+        await db.calendar_sync_jobs.bulk_write(
+            [UpdateOne(*jobs[index]) for index in duplicates], ordered=False
+        )
+
+
+async def enqueue_reconcile(db, user_id: ObjectId) -> None:
+    """
+    Queue a calendar reconciliation for a user.
+
+    Args:
+        db: Database instance
+        user_id: User to reconcile
+    """
+    await _enqueue(db, user_id, None, None, {"op": OP_RECONCILE})
+
+
+async def enqueue_sync_all(db, user_id: ObjectId) -> Dict[str, Any]:
+    """
+    Queue a sync of all of a user's symptom logs.
+    Returns the user's unfinished sync-all job instead if there is one.
+
+    Args:
+        db: Database instance
+        user_id: User whose logs are synced
+
+    Returns:
+        The sync-all job document
+    """
+    now = datetime.utcnow()
+    # One active sync-all job per user, so concurrent requests share a job
+    query = _job_query(user_id, None, OP_SYNC_ALL)
+    try:
+        job = await db.calendar_sync_jobs.find_one_and_update(
+            query,
+            {
+                "$setOnInsert": {
+                    "op": OP_SYNC_ALL,
+                    "log_id": None,
+                    "date": None,
+                    "status": PENDING,
+                    "attempts": 0,
+                    "next_attempt_at": now,
+                    "total": None,
+                    "processed": 0,
+                    "failed": 0,
+                    "checkpoint_date": None,
+                    "created_at": now,
+                    "updated_at": now
+                }
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # Another request inserted the job first
+        job = await db.calendar_sync_jobs.find_one(query)
+    return job
+
+
+async def get_sync_all_job(db, user_id: ObjectId, job_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Get a user's sync-all job.
+
+    Args:
+        db: Database instance
+        user_id: Owner of the job
+        job_id: ID of the job
+
+    Returns:
+        Job document, or None if the user has no such job
+    """
+    if not ObjectId.is_valid(job_id):
+        return None
+    return await db.calendar_sync_jobs.find_one({
+        "_id": ObjectId(job_id),
+        "user_id": user_id,
+        "op": OP_SYNC_ALL
+    })
+
+
+async def init_outbox_indexes(db) -> None:
+    """
+    Create indexes used to claim and deduplicate jobs.
+
+    Args:
+        db: Database instance
+    """
+    await db.calendar_sync_jobs.create_index([("status", 1), ("next_attempt_at", 1)])
+    await db.calendar_sync_jobs.create_index(
+        [("user_id", 1), ("key", 1)],
+        unique=True,
+        partialFilterExpression={"active": True}
+    )
+    # Finished jobs are kept for a week for troubleshooting
+    await db.calendar_sync_jobs.create_index("completed_at", expireAfterSeconds=7 * 24 * 3600)
+    logger.info("Created indexes on calendar_sync_jobs")
+
+
+class CalendarSyncWorkerPool:
+    """Pool of asyncio tasks draining the calendar sync outbox."""
+
+    def __init__(self):
+        """Initialize the pool from application settings."""
+        settings = get_settings()
+        self.worker_count = settings.calendar_sync_workers
+        self.max_attempts = settings.calendar_sync_max_attempts
+        self.lease_seconds = settings.calendar_sync_lease_seconds
+        self.poll_seconds = settings.calendar_sync_poll_seconds
+        self.backoff_seconds = settings.calendar_sync_backoff_seconds
+        self.reconcile_interval = timedelta(minutes=settings.calendar_reconcile_interval_minutes)
+        self._tasks: List[asyncio.Task] = []
+        self._stopping = asyncio.Event()
+        self.stats = {
+            "claimed": 0, "succeeded": 0, "retried": 0, "dead_lettered": 0,
+            "skipped": 0, "reconciles_scheduled": 0, "lease_lost": 0, "requeued": 0
+        }
+
+    async def start(self) -> None:
+        """Create indexes and start the worker tasks."""
+        if self.worker_count <= 0:
+            logger.info("Calendar sync workers disabled")
+            return
+
+        db = await get_database()
+        await init_outbox_indexes(db)
+
+        self._stopping.clear()
+        self._tasks = [
+            asyncio.create_task(self._run(db, i), name=f"calendar-sync-{i}")
+            for i in range(self.worker_count)
+        ]
+        if self.reconcile_interval:
+            self._tasks.append(
+                asyncio.create_task(self._schedule_reconciles(db), name="calendar-reconcile-scheduler")
+            )
+        logger.info(f"Started {self.worker_count} calendar sync workers")
+
+    async def stop(self) -> None:
+        """Stop the workers. Jobs in flight are left leased and retried later."""
+        self._stopping.set()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        logger.info("Stopped calendar sync workers")
+
+    async def _run(self, db, worker_id: int) -> None:
+        while not self._stopping.is_set():
+            try:
+                job = await self._claim(db)
+            except Exception as e:
+                logger.error(f"Calendar sync worker {worker_id} failed to claim a job: {e}")
+                job = None
+
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await self._process(db, job)
+
+    async def _schedule_reconciles(self, db) -> None:
+        # Checks for due users a few times per interval
+        tick = max(self.reconcile_interval.total_seconds() / 6, 30)
+        while not self._stopping.is_set():
+            try:
+                await self._enqueue_due_reconciles(db)
+            except Exception as e:
+                logger.error(f"Failed to schedule calendar reconciliation: {e}")
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=tick)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _enqueue_due_reconciles(self, db) -> None:
+        now = datetime.utcnow()
+        cutoff = now - self.reconcile_interval
+        for _ in range(RECONCILE_SCHEDULE_BATCH):
+            # Claiming the user atomically keeps several processes from double-scheduling
+            user = await db.users.find_one_and_update(
+                {
+                    "calendar_settings.is_enabled": True,
+                    "$or": [
+                        {"calendar_settings.reconcile_scheduled_at": {"$lt": cutoff}},
+                        {"calendar_settings.reconcile_scheduled_at": None}
+                    ]
+                },
+                {"$set": {"calendar_settings.reconcile_scheduled_at": now}},
+                projection={"_id": 1}
+            )
+            if user is None:
+                return
+            invalidate_cached_user(user["_id"])
+            await enqueue_reconcile(db, user["_id"])
+            self.stats["reconciles_scheduled"] += 1
+
+    async def _claim(self, db) -> Optional[Dict[str, Any]]:
+        now = datetime.utcnow()
+        job = await db.calendar_sync_jobs.find_one_and_update(
+            {
+                "$or": [
+                    {"status": PENDING, "next_attempt_at": {"$lte": now}},
+                    # Jobs whose worker crashed or was stopped mid-flight
+                    {"status": RUNNING, "lease_expires_at": {"$lte": now}}
+                ]
+            },
+            {
+                "$set": {
+                    "status": RUNNING,
+                    "requeue": False,
+                    "lease_token": ObjectId(),
+                    "lease_expires_at": now + timedelta(seconds=self.lease_seconds),
+                    "updated_at": now
+                },
+                "$inc": {"attempts": 1}
+            },
+            sort=[("next_attempt_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+        if job is not None:
+            self.stats["claimed"] += 1
+        return job
+
+    async def _process(self, db, job: Dict[str, Any]) -> None:
+        try:
+            user_doc = await db.users.find_one({"_id": job["user_id"]})
+            user = UserInDB(**user_doc) if user_doc else None
+
+            if user is None or not _sync_enabled(user):
+                await self._finish(db, job, note="calendar sync not enabled")
+                self.stats["skipped"] += 1
+                return
+
+            if job["op"] == OP_RECONCILE:
+                await reconcile_calendar(db, user)
+                await self._finish(db, job)
+                self.stats["succeeded"] += 1
+                return
+
+            if job["op"] == OP_SYNC_ALL:
+                await self._sync_all(db, job, user)
+                await calendar_sync_service.mark_synced(db, user)
+                await self._finish(db, job)
+                self.stats["succeeded"] += 1
+                return
+
+            if job["op"] == OP_DELETE:
+                log = {"_id": job["log_id"], "calendar_event": job.get("calendar_event")}
+                await calendar_sync_service.unsync_log(db, user, str(job["log_id"]), log)
+            else:
+                log = (await find_logs_by_id(db, job["user_id"], [job["log_id"]])).get(str(job["log_id"]))
+                if log is None:
+                    # Deleted since it was queued; the delete job handles the event
+                    await self._finish(db, job, note="log no longer exists")
+                    self.stats["skipped"] += 1
+                    return
+                await calendar_sync_service.sync_log(db, user, log)
+
+            await calendar_sync_service.mark_synced(db, user)
+            await self._finish(db, job)
+            self.stats["succeeded"] += 1
+
+        except asyncio.CancelledError:
+            raise
+        except LeaseLostError as e:
+            logger.warning(str(e))
+            self.stats["lease_lost"] += 1
+        except Exception as e:
+            await self._fail(db, job, e)
+
+    def _leased(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        # Matches the job only while this worker's claim is current
+        return {"_id": job["_id"], "lease_token": job.get("lease_token")}
+
+    def _lease_lost(self, job: Dict[str, Any]) -> LeaseLostError:
+        return LeaseLostError(f"Calendar sync job {job['_id']} was claimed by another worker")
+
+    async def _sync_all(self, db, job: Dict[str, Any], user: UserInDB) -> None:
+        user_id = ObjectId(user.id)
+        if job.get("total") is None:
+            job["total"] = (
+                await db.symptom_logs.count_documents({"user_id": user_id})
+                + await count_archived_logs(db, user_id)
+            )
+            result = await db.calendar_sync_jobs.update_one(
+                self._leased(job), {"$set": {"total": job["total"]}}
+            )
+            if not result.matched_count:
+                raise self._lease_lost(job)
+
+        # One log per user and date, so the last synced date is a complete checkpoint
+        checkpoint = job.get("checkpoint_date")
+        processed = job.get("processed", 0)
+        failed_ids: List[str] = job.get("failed_log_ids", [])
+
+        if failed_ids:
+            # Retry the logs a previous attempt failed on; deleted ones are dropped
+            found = await find_logs_by_id(db, user_id, [ObjectId(log_id) for log_id in failed_ids])
+            event_map = await calendar_sync_service.sync_logs(db, user, list(found.values()))
+            processed += len(event_map)
+            retried_ids = failed_ids
+            failed_ids = [log_id for log_id in failed_ids if log_id in found and log_id not in event_map]
+            now = datetime.utcnow()
+            result = await db.calendar_sync_jobs.update_one(
+                {**self._leased(job), "failed_log_ids": retried_ids},
+                {"$set": {
+                    "processed": processed,
+                    "failed": len(failed_ids),
+                    "failed_log_ids": failed_ids,
+                    "lease_expires_at": now + timedelta(seconds=self.lease_seconds),
+                    "updated_at": now
+                }}
+            )
+            if not result.matched_count:
+                raise self._lease_lost(job)
+
+        while True:
+            # Archived months are synced too, merged with the daily logs
+            logs = []
+            async for log in iter_logs(db, user_id, start_date=checkpoint):
+                if log["date"] == checkpoint:
+                    continue
+                logs.append(log)
+                if len(logs) >= SYNC_ALL_CHUNK_SIZE:
+                    break
+            if not logs:
+                break
+
+            # Event links are stored before the checkpoint moves, so a chunk
+            # redone after a crash updates its events instead of duplicating them
+            event_map = await calendar_sync_service.sync_logs(db, user, logs)
+            processed += len(event_map)
+            failed_ids = failed_ids + [str(log["_id"]) for log in logs if str(log["_id"]) not in event_map]
+            # Counts are set with the checkpoint they belong to, and only if
+            # the stored checkpoint is the one this chunk started from, so a
+            # chunk synced twice is never counted twice
+            now = datetime.utcnow()
+            result = await db.calendar_sync_jobs.update_one(
+                {**self._leased(job), "checkpoint_date": checkpoint},
+                {"$set": {
+                    "checkpoint_date": logs[-1]["date"],
+                    "processed": processed,
+                    "failed": len(failed_ids),
+                    "failed_log_ids": failed_ids,
+                    "lease_expires_at": now + timedelta(seconds=self.lease_seconds),
+                    "updated_at": now
+                }}
+            )
+            if not result.matched_count:
+                raise self._lease_lost(job)
+            checkpoint = logs[-1]["date"]
+
+        if failed_ids:
+            # Retried with backoff like any failed job; the checkpoint is
+            # past the end, so the next attempt only retries these logs
+            raise SyncAllIncompleteError(f"{len(failed_ids)} logs failed to sync")
+
+    async def _finish(self, db, job: Dict[str, Any], note: Optional[str] = None) -> None:
+        now = datetime.utcnow()
+        result = await db.calendar_sync_jobs.update_one(
+            {**self._leased(job), "requeue": {"$ne": True}},
+            {
+                "$set": {"status": DONE, "completed_at": now, "updated_at": now, "note": note},
+                "$unset": {"active": ""}
+            }
+        )
+        if result.matched_count:
+            return
+
+        # Changed while it ran; run it again for the latest change
+        result = await db.calendar_sync_jobs.update_one(
+            self._leased(job),
+            {
+                "$set": {"status": PENDING, "attempts": 0, "updated_at": now},
+                "$unset": {"lease_token": "", "lease_expires_at": ""}
+            }
+        )
+        if not result.matched_count:
+            raise self._lease_lost(job)
+        self.stats["requeued"] += 1
+
+    async def _fail(self, db, job: Dict[str, Any], error: Exception) -> None:
+        now = datetime.utcnow()
+        attempts = job.get("attempts", 1)
+
+        if attempts >= self.max_attempts:
+            logger.error(
+                f"Dead-lettering calendar sync job {job['_id']} after {attempts} attempts: {error}"
+            )
+            update = {
+                "$set": {"status": DEAD, "last_error": str(error), "updated_at": now},
+                "$unset": {"active": ""}
+            }
+            self.stats["dead_lettered"] += 1
+        else:
+            delay = min(self.backoff_seconds * 2 ** (attempts - 1), MAX_BACKOFF_SECONDS)
+            delay += random.uniform(0, delay / 2)
+            logger.warning(
+                f"Calendar sync job {job['_id']} failed (attempt {attempts}), "
+                f"retrying in {delay:.0f}s: {error}"
+            )
+            update = {"$set": {
+                "status": PENDING,
+                "next_attempt_at": now + timedelta(seconds=delay),
+                "last_error": str(error),
+                "updated_at": now
+            }}
+            self.stats["retried"] += 1
+
+        result = await db.calendar_sync_jobs.update_one(self._leased(job), update)
+        if not result.matched_count:
+            # The worker that took the job over decides its outcome
+            logger.warning(str(self._lease_lost(job)))
+            self.stats["lease_lost"] += 1
+
+
+# Global instance
+_worker_pool: Optional[CalendarSyncWorkerPool] = None
+
+
+def get_calendar_sync_workers() -> CalendarSyncWorkerPool:
+    """
+    Get or create the global calendar sync worker pool.
+
+    Returns:
+        CalendarSyncWorkerPool instance
+    """
+    global _worker_pool
+    if _worker_pool is None:
+        _worker_pool = CalendarSyncWorkerPool()
+        register_metrics("calendar_sync_outbox", lambda: dict(_worker_pool.stats))
+    return _worker_pool
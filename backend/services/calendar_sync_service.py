@@ -0,0 +1,244 @@
+"""
+Service for syncing stored symptom logs to Google Calendar.
+Keeps the ID of the event each log was synced to on the log (daily or
+archived), so later updates and deletes address the event directly.
+
+The Google client is blocking, so every Calendar call runs in the bounded
+google_api executor to keep the event loop free.
+"""
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from bson import ObjectId
+from googleapiclient.errors import HttpError
+from models.symptom_log import CalendarEventLink
+from models.user import UserInDB
+from services.symptom_archive_service import set_log_fields
+from services.google_calendar_service import GoogleCalendarService, google_api_executor
+from utils.security import invalidate_cached_user
+
+logger = logging.getLogger(__name__)
+
+
+def get_linked_event_id(log: Dict[str, Any], calendar_id: str) -> Optional[str]:
+    """
+    Get the stored event ID of a log, if it was synced to this calendar.
+
+    Args:
+        log: Symptom log document
+        calendar_id: Calendar the user currently syncs to
+
+    Returns:
+        Event ID or None
+    """
+    link = log.get("calendar_event")
+    if link and link.get("calendar_id") == calendar_id:
+        return link.get("event_id")
+    return None
+
+
+def _resolve_event_id(
+    calendar_service: GoogleCalendarService,
+    credentials,
+    calendar_id: str,
+    log_id: str,
+    log: Optional[Dict[str, Any]]
+) -> Optional[str]:
+    if log is not None:
+        event_id = get_linked_event_id(log, calendar_id)
+        if event_id:
+            return event_id
+
+    # Recovery path for logs synced before event IDs were stored
+    return calendar_service.get_event_by_log_id(credentials, calendar_id, log_id)
+
+
+async def sync_log(db, user: UserInDB, log: Dict[str, Any]) -> str:
+    """
+    Create or update the calendar event for a stored symptom log.
+    No request is made when the event content is unchanged since the last sync.
+
+    Args:
+        db: Database instance
+        user: Owner of the log, with Google Calendar connected
+        log: Symptom log document
+
+    Returns:
+        Event ID of the created or updated event
+
+    Raises:
+        HttpError: If the Calendar API request fails
+        ValueError: If the user's Google credentials are invalid
+    """
+    calendar_service = GoogleCalendarService()
+    calendar_id = user.calendar_settings.calendar_id
+    content_hash = calendar_service.log_content_hash(log)
+
+    linked_event_id = get_linked_event_id(log, calendar_id)
+    if linked_event_id and log["calendar_event"].get("content_hash") == content_hash:
+        logger.debug(f"Event for log {log['_id']} is up to date, skipping update")
+        return linked_event_id
+
+    credentials = await google_api_executor.run(
+        calendar_service.get_credentials,
+        user.google_auth.encrypted_refresh_token
+    )
+
+    event_id = await google_api_executor.run(
+        _resolve_event_id,
+        calendar_service, credentials, calendar_id, str(log["_id"]), log
+    )
+
+    try:
+        new_event_id = await google_api_executor.run(
+            calendar_service.sync_symptom_log,
+            credentials, calendar_id, log, event_id
+        )
+    except HttpError as e:
+        if not (event_id and calendar_service.is_missing_event(e)):
+            raise
+        # The event was removed in Google Calendar; create it again
+        logger.info(f"Event {event_id} for log {log['_id']} is gone, recreating")
+        new_event_id = await google_api_executor.run(
+            calendar_service.sync_symptom_log,
+            credentials, calendar_id, log, None
+        )
+
+    await set_log_fields(db, ObjectId(user.id), [
+        (log["_id"], {"calendar_event": event_link(new_event_id, calendar_id, content_hash)})
+    ])
+    return new_event_id
+
+
+async def sync_logs(db, user: UserInDB, logs: List[Dict[str, Any]]) -> Dict[str, str]:
+    """
+    Sync many stored symptom logs with batch requests.
+    Logs with a stored event are updated; the rest are inserted. Logs whose
+    event content is unchanged since the last sync are skipped.
+
+    Args:
+        db: Database instance
+        user: Owner of the logs, with Google Calendar connected
+        logs: Symptom log documents
+
+    Returns:
+        Dictionary mapping log IDs to event IDs for synced or up-to-date logs
+    """
+    if not logs:
+        return {}
+
+    calendar_service = GoogleCalendarService()
+    calendar_id = user.calendar_settings.calendar_id
+
+    unchanged = {}
+    changed_logs = []
+    event_ids = {}
+    content_hashes = {}
+    for log in logs:
+        log_id = str(log["_id"])
+        content_hash = calendar_service.log_content_hash(log)
+        event_id = get_linked_event_id(log, calendar_id)
+        if event_id and log["calendar_event"].get("content_hash") == content_hash:
+            unchanged[log_id] = event_id
+            continue
+        if event_id:
+            event_ids[log_id] = event_id
+        content_hashes[log_id] = content_hash
+        changed_logs.append(log)
+
+    if not changed_logs:
+        return unchanged
+
+    credentials = await google_api_executor.run(
+        calendar_service.get_credentials,
+        user.google_auth.encrypted_refresh_token
+    )
+    event_map = await google_api_executor.run(
+        calendar_service.batch_sync_logs,
+        credentials, calendar_id, changed_logs, event_ids=event_ids
+    )
+
+    await set_log_fields(db, ObjectId(user.id), [
+        (ObjectId(log_id), {"calendar_event": event_link(event_id, calendar_id, content_hashes[log_id])})
+        for log_id, event_id in event_map.items()
+    ])
+
+    logger.info(
+        f"Synced {len(event_map)} changed logs, skipped {len(unchanged)} unchanged logs"
+    )
+    return {**unchanged, **event_map}
+
+
+async def unsync_log(
+    db,
+    user: UserInDB,
+    log_id: str,
+    log: Optional[Dict[str, Any]] = None
+) -> Optional[str]:
+    """
+    Delete the calendar event of a symptom log and clear the stored link.
+
+    Args:
+        db: Database instance
+        user: Owner of the log, with Google Calendar connected
+        log_id: ID of the symptom log
+        log: Symptom log document, if it still exists
+
+    Returns:
+        ID of the deleted event, or None if no event was found
+    """
+    calendar_service = GoogleCalendarService()
+    credentials = await google_api_executor.run(
+        calendar_service.get_credentials,
+        user.google_auth.encrypted_refresh_token
+    )
+    calendar_id = user.calendar_settings.calendar_id
+
+    event_id = await google_api_executor.run(
+        _resolve_event_id, calendar_service, credentials, calendar_id, log_id, log
+    )
+    if not event_id:
+        return None
+
+    await google_api_executor.run(
+        calendar_service.delete_symptom_log, credentials, calendar_id, event_id
+    )
+
+    if log is not None:
+        await set_log_fields(db, ObjectId(user.id), [(log["_id"], {"calendar_event": None})])
+    return event_id
+
+
+async def mark_synced(db, user: UserInDB) -> None:
+    """
+    Record a successful sync on the user's calendar settings.
+
+    Args:
+        db: Database instance
+        user: User who was synced
+    """
+    await db.users.update_one(
+        {"_id": ObjectId(user.id)},
+        {"$set": {"calendar_settings.last_sync": datetime.utcnow()}}
+    )
+    invalidate_cached_user(user.id)
+
+
+def event_link(event_id: str, calendar_id: str, content_hash: Optional[str]) -> Dict[str, Any]:
+    """
+    Build the calendar_event field stored on a synced symptom log.
+
+    Args:
+        event_id: Google Calendar event ID
+        calendar_id: Calendar the event belongs to
+        content_hash: Hash of the event body that was written
+
+    Returns:
+        Dictionary suitable for the symptom log's calendar_event field
+    """
+    return CalendarEventLink(
+        event_id=event_id,
+        calendar_id=calendar_id,
+        content_hash=content_hash
+    ).dict()
@@ -3,9 +3,19 @@ Service for interacting with Google's Gemini API.
 """
 import google.generativeai as genai
 from config import get_settings
+from utils.executors import BoundedExecutor
 
 settings = get_settings()
 
+# The Gemini SDK call is blocking, so it runs in its own bounded pool;
+# the timeout frees the caller when the model stalls
+gemini_executor = BoundedExecutor(
+    "gemini",
+    max_workers=settings.gemini_workers,
+    max_queue=settings.gemini_queue_limit,
+    timeout=settings.gemini_timeout_seconds
+)
+
 class ChatService:
     def __init__(self):
         genai.configure(api_key=settings.gemini_api_key)
@@ -39,7 +49,7 @@ class ChatService:
                 {"role": "model", "parts": ["Understood. I will act as a women's health assistant focusing on Menopause, providing concise answers and referring to doctors for severe symptoms. I will decline irrelevant questions."]}
             ])
             
-            response = chat.send_message(message)
+            response = await gemini_executor.run(chat.send_message, message)
             return response.text
         except Exception as e:
             print(f"Error generating response: {e}")
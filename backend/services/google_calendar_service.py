@@ -3,18 +3,109 @@ Google Calendar integration service.
 Handles OAuth authentication and calendar event synchronization.
 """
 import os
+import hashlib
+import json
 import logging
-from datetime import datetime, date
-from typing import Optional, Dict, Any, List
+import threading
+import time
+from datetime import datetime, date, timedelta
+from typing import Optional, Dict, Any, List, Tuple
+import httplib2
 from google.oauth2.credentials import Credentials
 from google.auth.transport.requests import Request
+from google_auth_httplib2 import AuthorizedHttp
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
+from config import get_settings
+from services.symptom_severity import severity_fields
+from utils.cache import TTLCache
 from utils.encryption import decrypt_token, encrypt_token
+from utils.exceptions import SyncTokenExpiredError
+from utils.executors import BoundedExecutor
+from utils.metrics import register_metrics
+from utils.rate_limiter import get_google_api_limiter, is_retryable_error
 
 logger = logging.getLogger(__name__)
 
+settings = get_settings()
+
+# googleapiclient is blocking; async callers run it here so a slow Google
+# response ties up one of these threads instead of the event loop
+google_api_executor = BoundedExecutor(
+    "google_api",
+    max_workers=settings.google_api_workers,
+    max_queue=settings.google_api_queue_limit,
+    timeout=settings.google_api_job_timeout_seconds or None
+)
+
+# Access tokens are refreshed this long before Google's expiry
+TOKEN_EXPIRY_MARGIN = timedelta(minutes=5)
+
+# Google access tokens live for an hour; cached entries never outlive that
+CREDENTIALS_CACHE_TTL_SECONDS = 3600
+
+# Credentials per connected user, shared by all threads of this process
+_credentials_cache = TTLCache(max_size=10000, ttl_seconds=CREDENTIALS_CACHE_TTL_SECONDS)
+_credentials_guard = threading.Lock()
+_credentials_locks: Dict[str, threading.Lock] = {}
+_credentials_stats = {"refreshes": 0}
+_thread_local = threading.local()
+
+
+def _credentials_key(encrypted_refresh_token: str) -> str:
+    return hashlib.sha256(encrypted_refresh_token.encode()).hexdigest()
+
+
+def _get_cached_credentials(key: str) -> Optional[Credentials]:
+    with _credentials_guard:
+        return _credentials_cache.get(key)
+
+
+def _quota_key(credentials: Credentials) -> Optional[str]:
+    refresh_token = getattr(credentials, 'refresh_token', None)
+    if not refresh_token:
+        return None
+    return hashlib.sha256(refresh_token.encode()).hexdigest()[:16]
+
+
+def _credentials_lock(key: str) -> threading.Lock:
+    with _credentials_guard:
+        lock = _credentials_locks.get(key)
+        if lock is None:
+            lock = _credentials_locks[key] = threading.Lock()
+        return lock
+
+
+def _is_fresh(credentials: Credentials) -> bool:
+    if not credentials.token or credentials.expiry is None:
+        return False
+    return credentials.expiry - datetime.utcnow() > TOKEN_EXPIRY_MARGIN
+
+
+def invalidate_credentials(encrypted_refresh_token: str) -> None:
+    """
+    Drop cached credentials for a stored refresh token.
+    Called when a user disconnects or their token stops working.
+    
+    Args:
+        encrypted_refresh_token: Encrypted refresh token from database
+    """
+    key = _credentials_key(encrypted_refresh_token)
+    with _credentials_guard:
+        _credentials_cache.invalidate(key)
+        _credentials_locks.pop(key, None)
+
+
+def _credentials_metrics() -> Dict[str, Any]:
+    with _credentials_guard:
+        stats = _credentials_cache.stats()
+    stats["refreshes"] = _credentials_stats["refreshes"]
+    return stats
+
+
+register_metrics("google_credentials_cache", _credentials_metrics)
+
 
 class GoogleCalendarService:
     """Service for interacting with Google Calendar API."""
@@ -29,6 +120,12 @@ class GoogleCalendarService:
         'severe': '11',   # Red
     }
     
+    # Calendar API accepts at most 1000 calls per batch HTTP request
+    MAX_BATCH_SIZE = 1000
+    
+    # Event fields written by _format_event; the content hash covers exactly these
+    EVENT_HASH_FIELDS = ('summary', 'description', 'start', 'end', 'colorId', 'extendedProperties')
+    
     def __init__(self):
         """Initialize the Google Calendar service."""
         self.client_id = os.getenv('GOOGLE_CLIENT_ID')
@@ -45,6 +142,10 @@ class GoogleCalendarService:
         """
         Build credentials from stored encrypted refresh token.
         
+        Credentials are cached per user (keyed by the stored token) so the
+        access token is reused until shortly before it expires. Refreshes for
+        the same user are serialized so concurrent syncs trigger one refresh.
+        
         Args:
             encrypted_refresh_token: Encrypted refresh token from database
             
@@ -54,30 +155,77 @@ class GoogleCalendarService:
         Raises:
             ValueError: If token is invalid or cannot be decrypted
         """
-        try:
-            refresh_token = decrypt_token(encrypted_refresh_token)
-            
-            credentials = Credentials(
-                token=None,
-                refresh_token=refresh_token,
-                token_uri='https://oauth2.googleapis.com/token',
-                client_id=self.client_id,
-                client_secret=self.client_secret,
-                scopes=self.SCOPES
-            )
-            
-            # Refresh the access token if needed
-            if not credentials.valid:
-                if credentials.expired and credentials.refresh_token:
-                    credentials.refresh(Request())
-                else:
-                    raise ValueError("Invalid credentials")
-            
+        key = _credentials_key(encrypted_refresh_token)
+        credentials = _get_cached_credentials(key)
+        if credentials is not None and _is_fresh(credentials):
             return credentials
+        
+        with _credentials_lock(key):
+            try:
+                credentials = _get_cached_credentials(key)
+                if credentials is None:
+                    refresh_token = decrypt_token(encrypted_refresh_token)
+                    credentials = Credentials(
+                        token=None,
+                        refresh_token=refresh_token,
+                        token_uri='https://oauth2.googleapis.com/token',
+                        client_id=self.client_id,
+                        client_secret=self.client_secret,
+                        scopes=self.SCOPES
+                    )
+                
+                # Refresh the access token if missing or about to expire
+                if not _is_fresh(credentials):
+                    if not credentials.refresh_token:
+                        raise ValueError("Invalid credentials")
+                    credentials.refresh(Request())
+                    _credentials_stats["refreshes"] += 1
+                
+                with _credentials_guard:
+                    _credentials_cache.set(key, credentials)
+                return credentials
+                
+            except Exception as e:
+                invalidate_credentials(encrypted_refresh_token)
+                logger.error(f"Failed to get credentials: {e}")
+                raise ValueError(f"Failed to authenticate with Google Calendar: {e}")
+    
+    def _get_service(self, credentials: Credentials):
+        """
+        Get a Calendar API client for the given credentials.
+        
+        Clients are built from the static discovery document and cached per
+        thread, since the underlying httplib2 connection is not thread-safe.
+        
+        Args:
+            credentials: Valid Google OAuth2 credentials
             
-        except Exception as e:
-            logger.error(f"Failed to get credentials: {e}")
-            raise ValueError(f"Failed to authenticate with Google Calendar: {e}")
+        Returns:
+            Calendar v3 service resource
+        """
+        services = getattr(_thread_local, 'services', None)
+        if services is None:
+            services = TTLCache(max_size=256, ttl_seconds=CREDENTIALS_CACHE_TTL_SECONDS)
+            _thread_local.services = services
+        
+        # The entry holds a reference to the credentials, so the id stays unique
+        entry = services.get(id(credentials))
+        if entry is not None and entry[0] is credentials:
+            return entry[1]
+        
+        # The socket timeout keeps a stalled connection from holding a worker forever
+        http = AuthorizedHttp(
+            credentials,
+            http=httplib2.Http(timeout=settings.google_api_timeout_seconds)
+        )
+        service = build(
+            'calendar', 'v3',
+            http=http,
+            static_discovery=True,
+            cache_discovery=False
+        )
+        services.set(id(credentials), (credentials, service))
+        return service
     
     def create_altheia_calendar(self, credentials: Credentials) -> str:
         """
@@ -93,10 +241,10 @@ class GoogleCalendarService:
             HttpError: If calendar creation fails
         """
         try:
-            service = build('calendar', 'v3', credentials=credentials)
+            service = self._get_service(credentials)
             
             # Check if calendar already exists
-            calendar_list = service.calendarList().list().execute()
+            calendar_list = self._execute(service.calendarList().list(), credentials)
             for calendar in calendar_list.get('items', []):
                 if calendar.get('summary') == 'Altheia Health':
                     logger.info(f"Found existing Altheia Health calendar: {calendar['id']}")
@@ -109,7 +257,7 @@ class GoogleCalendarService:
                 'timeZone': 'UTC'
             }
             
-            created_calendar = service.calendars().insert(body=calendar).execute()
+            created_calendar = self._execute(service.calendars().insert(body=calendar), credentials)
             calendar_id = created_calendar['id']
             
             logger.info(f"Created new Altheia Health calendar: {calendar_id}")
@@ -142,26 +290,26 @@ class GoogleCalendarService:
             HttpError: If event creation/update fails
         """
         try:
-            service = build('calendar', 'v3', credentials=credentials)
+            service = self._get_service(credentials)
             
             # Format event data
             event = self._format_event(log_data)
             
             if event_id:
                 # Update existing event
-                updated_event = service.events().update(
+                updated_event = self._execute(service.events().update(
                     calendarId=calendar_id,
                     eventId=event_id,
                     body=event
-                ).execute()
+                ), credentials)
                 logger.info(f"Updated calendar event: {event_id}")
                 return updated_event['id']
             else:
                 # Create new event
-                created_event = service.events().insert(
+                created_event = self._execute(service.events().insert(
                     calendarId=calendar_id,
                     body=event
-                ).execute()
+                ), credentials)
                 logger.info(f"Created calendar event: {created_event['id']}")
                 return created_event['id']
                 
@@ -187,11 +335,11 @@ class GoogleCalendarService:
             HttpError: If event deletion fails
         """
         try:
-            service = build('calendar', 'v3', credentials=credentials)
-            service.events().delete(
+            service = self._get_service(credentials)
+            self._execute(service.events().delete(
                 calendarId=calendar_id,
                 eventId=event_id
-            ).execute()
+            ), credentials)
             logger.info(f"Deleted calendar event: {event_id}")
             
         except HttpError as e:
@@ -205,53 +353,111 @@ class GoogleCalendarService:
         self,
         credentials: Credentials,
         calendar_id: str,
-        logs: List[Dict[str, Any]]
+        logs: List[Dict[str, Any]],
+        event_ids: Optional[Dict[str, str]] = None,
+        batch_size: int = 100,
+        max_retries: int = 3
     ) -> Dict[str, str]:
         """
-        Sync multiple symptom logs efficiently using batch requests.
+        Sync multiple symptom logs using Calendar API batch requests.
+        
+        Each batch HTTP request carries up to batch_size inserts or updates,
+        and the per-item callbacks are mapped back to log IDs. Items that fail
+        with a retryable error (rate limits, 5xx) are retried in later rounds
+        with exponential backoff; the rest of the batch is not re-sent.
+        Updates whose event no longer exists are retried as inserts.
         
         Args:
             credentials: Valid Google OAuth2 credentials
             calendar_id: ID of the Altheia Health calendar
             logs: List of symptom log data
+            event_ids: Known event IDs by log ID; these logs are updated in place
+            batch_size: Requests per batch HTTP call (capped at the API limit)
+            max_retries: Retry rounds for items that failed with retryable errors
             
         Returns:
-            Dictionary mapping log IDs to event IDs
+            Dictionary mapping log IDs to event IDs for successfully synced logs
             
         Raises:
-            HttpError: If batch sync fails
+            HttpError: If the Calendar service cannot be built
         """
         try:
-            service = build('calendar', 'v3', credentials=credentials)
-            event_map = {}
-            
-            # Google Calendar API batch limit is 1000 requests
-            batch_size = 100
-            
-            for i in range(0, len(logs), batch_size):
-                batch = logs[i:i + batch_size]
-                
-                for log in batch:
-                    try:
-                        event = self._format_event(log)
-                        created_event = service.events().insert(
-                            calendarId=calendar_id,
-                            body=event
-                        ).execute()
-                        
-                        log_id = log.get('_id') or log.get('id')
-                        event_map[str(log_id)] = created_event['id']
-                        
-                    except HttpError as e:
-                        logger.error(f"Failed to sync log {log.get('_id')}: {e}")
-                        continue
-            
-            logger.info(f"Batch synced {len(event_map)} logs")
-            return event_map
-            
+            service = self._get_service(credentials)
         except HttpError as e:
             logger.error(f"Failed to batch sync logs: {e}")
             raise
+
+        limiter = get_google_api_limiter()
+        event_ids = event_ids or {}
+        batch_size = max(1, min(batch_size, self.MAX_BATCH_SIZE))
+        event_map: Dict[str, str] = {}
+        pending = {}
+        for log in logs:
+            log_id = str(log.get('_id') or log.get('id'))
+            pending[log_id] = (log, event_ids.get(log_id))
+        
+        for attempt in range(max_retries + 1):
+            if not pending:
+                break
+            if attempt:
+                delay = limiter.backoff_delay(attempt)
+                limiter.note_retries(len(pending))
+                logger.info(
+                    f"Retrying {len(pending)} failed calendar writes in {delay:.1f}s "
+                    f"(attempt {attempt}/{max_retries})"
+                )
+                time.sleep(delay)
+            
+            retryable: Dict[str, tuple] = {}
+            items = list(pending.items())
+            
+            for i in range(0, len(items), batch_size):
+                chunk = dict(items[i:i + batch_size])
+                
+                def on_response(request_id, response, exception, chunk=chunk):
+                    log, event_id = chunk[request_id]
+                    if exception is None:
+                        event_map[request_id] = response['id']
+                    elif event_id and self.is_missing_event(exception):
+                        retryable[request_id] = (log, None)
+                    elif self._is_retryable(exception):
+                        retryable[request_id] = (log, event_id)
+                    else:
+                        logger.error(f"Failed to sync log {request_id}: {exception}")
+                
+                batch = service.new_batch_http_request(callback=on_response)
+                for log_id, (log, event_id) in chunk.items():
+                    event = self._format_event(log)
+                    if event_id:
+                        request = service.events().update(
+                            calendarId=calendar_id,
+                            eventId=event_id,
+                            body=event
+                        )
+                    else:
+                        request = service.events().insert(
+                            calendarId=calendar_id,
+                            body=event
+                        )
+                    batch.add(request, request_id=log_id)
+                
+                try:
+                    # Failed items are retried individually below, not by the limiter
+                    self._execute(batch, credentials, cost=len(chunk), max_retries=0)
+                except HttpError as e:
+                    # The whole batch call failed; retry all of its items
+                    logger.error(f"Batch request of {len(chunk)} writes failed: {e}")
+                    for log_id, item in chunk.items():
+                        if log_id not in event_map:
+                            retryable[log_id] = item
+            
+            pending = retryable
+        
+        if pending:
+            logger.error(f"Giving up on {len(pending)} logs after {max_retries} retries")
+        
+        logger.info(f"Batch synced {len(event_map)} of {len(logs)} logs")
+        return event_map
     
     def get_event_by_log_id(
         self,
@@ -271,13 +477,13 @@ class GoogleCalendarService:
             Event ID if found, None otherwise
         """
         try:
-            service = build('calendar', 'v3', credentials=credentials)
+            service = self._get_service(credentials)
             
             # Search for event with matching log_id in extended properties
-            events = service.events().list(
+            events = self._execute(service.events().list(
                 calendarId=calendar_id,
                 privateExtendedProperty=f'altheia_log_id={log_id}'
-            ).execute()
+            ), credentials)
             
             items = events.get('items', [])
             if items:
@@ -289,6 +495,127 @@ class GoogleCalendarService:
             logger.error(f"Failed to find event for log {log_id}: {e}")
             return None
     
+    def is_missing_event(self, error: Exception) -> bool:
+        """
+        Check whether a Calendar API error means the event no longer exists.
+        
+        Args:
+            error: Exception raised for a request
+            
+        Returns:
+            True for 404 Not Found and 410 Gone responses
+        """
+        return isinstance(error, HttpError) and error.resp.status in (404, 410)
+    
+    def _is_retryable(self, error: Exception) -> bool:
+        """
+        Check whether a Calendar API error is worth retrying.
+        
+        Args:
+            error: Exception raised for a request
+            
+        Returns:
+            True for rate limit and transient server errors
+        """
+        return is_retryable_error(error)
+    
+    def _execute(
+        self,
+        request,
+        credentials: Credentials,
+        cost: int = 1,
+        max_retries: Optional[int] = None
+    ):
+        """
+        Execute a Calendar API request under the shared rate limiter.
+        
+        Args:
+            request: HttpRequest or BatchHttpRequest to execute
+            credentials: Credentials the request is made with (selects the user budget)
+            cost: Number of API calls the request counts as
+            max_retries: Override of the limiter's retry count
+            
+        Returns:
+            The request's response
+        """
+        user_key = _quota_key(credentials)
+        return get_google_api_limiter().execute(
+            request.execute, user_key, cost=cost, max_retries=max_retries
+        )
+
+    def list_event_changes(
+        self,
+        credentials: Credentials,
+        calendar_id: str,
+        sync_token: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        List events changed since a sync token, or all events without one.
+        
+        Deleted events are included with status 'cancelled'.
+        
+        Args:
+            credentials: Valid Google OAuth2 credentials
+            calendar_id: ID of the Altheia Health calendar
+            sync_token: Token from a previous listing, or None for a full listing
+            
+        Returns:
+            Tuple of (changed events, token for the next incremental listing)
+            
+        Raises:
+            SyncTokenExpiredError: If Google invalidated the sync token (HTTP 410)
+            HttpError: If the listing fails for another reason
+        """
+        service = self._get_service(credentials)
+        events: List[Dict[str, Any]] = []
+        page_token = None
+        
+        while True:
+            params = {'calendarId': calendar_id, 'showDeleted': True, 'maxResults': 2500}
+            if sync_token:
+                params['syncToken'] = sync_token
+            if page_token:
+                params['pageToken'] = page_token
+            
+            try:
+                response = self._execute(service.events().list(**params), credentials)
+            except HttpError as e:
+                if e.resp.status == 410:
+                    raise SyncTokenExpiredError("Calendar sync token expired")
+                logger.error(f"Failed to list calendar changes: {e}")
+                raise
+            
+            events.extend(response.get('items', []))
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                return events, response.get('nextSyncToken')
+    
+    def event_hash(self, event: Dict[str, Any]) -> str:
+        """
+        Compute a stable hash of the synced fields of a calendar event.
+        
+        Args:
+            event: Event body from _format_event or the Calendar API
+            
+        Returns:
+            Hex digest that changes only when the synced content changes
+        """
+        content = {field: event.get(field) for field in self.EVENT_HASH_FIELDS}
+        encoded = json.dumps(content, sort_keys=True, separators=(',', ':'), default=str)
+        return hashlib.sha256(encoded.encode()).hexdigest()
+    
+    def log_content_hash(self, log_data: Dict[str, Any]) -> str:
+        """
+        Compute the content hash of the event a symptom log would produce.
+        
+        Args:
+            log_data: Symptom log data
+            
+        Returns:
+            Hex digest of the formatted event
+        """
+        return self.event_hash(self._format_event(log_data))
+    
     def _format_event(self, log_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Format symptom log data into Google Calendar event format.
@@ -302,11 +629,11 @@ class GoogleCalendarService:
         # Extract data
         log_date = log_data.get('date')
         symptoms = log_data.get('symptoms', [])
-        notes = log_data.get('notes', '')
+        notes = log_data.get('overall_notes') or log_data.get('notes', '')
         log_id = log_data.get('_id') or log_data.get('id')
         
-        # Determine severity level
-        severity = self._calculate_severity(symptoms)
+        # Determine severity level, stored with the log on write
+        severity = log_data.get('severity_level') or self._calculate_severity(symptoms)
         
         # Build description
         description_parts = ['Symptoms:']
@@ -347,7 +674,8 @@ class GoogleCalendarService:
     
     def _calculate_severity(self, symptoms: List[Dict[str, Any]]) -> str:
         """
-        Calculate overall severity level from symptoms.
+        Calculate overall severity level from symptoms, for logs written
+        before severity fields were stored.
         
         Args:
             symptoms: List of symptom dictionaries with severity ratings
@@ -355,16 +683,4 @@ class GoogleCalendarService:
         Returns:
             Severity level: 'mild', 'moderate', or 'severe'
         """
-        if not symptoms:
-            return 'mild'
-        
-        # Calculate average severity
-        total_severity = sum(s.get('severity', 0) for s in symptoms)
-        avg_severity = total_severity / len(symptoms)
-        
-        if avg_severity >= 4:
-            return 'severe'
-        elif avg_severity >= 2.5:
-            return 'moderate'
-        else:
-            return 'mild'
\ No newline at end of file
+        return severity_fields(symptoms)['severity_level']
\ No newline at end of file
@@ -0,0 +1,466 @@
+"""
+Archival of old symptom logs into monthly buckets.
+
+archive_logs() compacts daily symptom_logs documents older than
+LOG_ARCHIVE_AFTER_DAYS into one symptom_log_archive document per user and
+month, holding the month's logs in a date-sorted days array. Cold history
+then costs two index entries per month instead of one per day in every
+symptom_logs index.
+
+Archived months are read-only: a write to an archived date first restores
+its month to symptom_logs, and a later archive run compacts it again.
+Read paths merge buckets with daily documents by date; where both hold a
+date (an interrupted or raced archive run) the daily document wins. Only
+months before the previous one are ever archived, so reads and writes of
+recent dates never touch the archive.
+"""
+import logging
+from datetime import date as date_type, datetime, timedelta
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import DeleteOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Logs are never archived younger than this, whatever the setting, so the
+# current and previous months always stay daily documents
+MIN_ARCHIVE_AGE_DAYS = 62
+
+# Filters a log; archived logs are matched in Python
+LogPredicate = Callable[[Dict[str, Any]], bool]
+
+
+def archive_horizon(today: Optional[date_type] = None) -> str:
+    """
+    Get the first date that is never archived.
+
+    Args:
+        today: Current date, defaults to today (UTC)
+
+    Returns:
+        First day of the previous month (YYYY-MM-DD); only earlier dates
+        can be in the archive
+    """
+    today = today or datetime.utcnow().date()
+    previous_month = today.replace(day=1) - timedelta(days=1)
+    return previous_month.replace(day=1).isoformat()
+
+
+def archive_age_days() -> int:
+    """
+    Get how old logs must be, by date and last update, to be archived.
+    Never less than the tombstone TTL, so delta sync (which only reaches
+    back that far) never needs archived logs.
+
+    Returns:
+        Age in days
+    """
+    return max(settings.log_archive_after_days, settings.log_tombstone_ttl_days, MIN_ARCHIVE_AGE_DAYS)
+
+
+def _archive_projection(projection: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    # Map a symptom_logs projection onto the days array; exclusions are
+    # applied after reading, as nested fields can't be excluded here
+    if projection is None:
+        return None
+    included = {f"days.{field}": 1 for field, value in projection.items() if value and field != "_id"}
+    if not included:
+        return None
+    if projection.get("_id", 1):
+        included["days._id"] = 1
+    return {"month": 1, **included}
+
+
+def _from_entry(user_id: ObjectId, entry: Dict[str, Any], projection: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    log = {**entry, "user_id": user_id}
+    if projection is not None and not projection.get("_id", 1):
+        log.pop("_id", None)
+    return log
+
+
+async def get_archived_logs(
+    db,
+    user_id: ObjectId,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    projection: Optional[Dict[str, Any]] = None,
+    descending: bool = False,
+    limit: Optional[int] = None,
+    predicate: Optional[LogPredicate] = None
+) -> List[Dict[str, Any]]:
+    """
+    Read a user's archived logs in a date range.
+
+    Args:
+        db: Database instance
+        user_id: Owner of the logs
+        start_date: Optional first date to include (YYYY-MM-DD)
+        end_date: Optional last date to include (YYYY-MM-DD)
+        projection: Optional symptom_logs-style projection
+        descending: Newest first instead of oldest first
+        limit: Optional maximum number of logs
+        predicate: Optional filter the logs must pass
+
+    Returns:
+        Log documents in the symptom_logs shape, ordered by date
+    """
+    logs: List[Dict[str, Any]] = []
+    async for log in iter_archived_logs(db, user_id, start_date, end_date, projection, descending):
+        if predicate is None or predicate(log):
+            logs.append(log)
+            if limit and len(logs) >= limit:
+                break
+    return logs
+
+
+async def iter_archived_logs(
+    db,
+    user_id: ObjectId,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    projection: Optional[Dict[str, Any]] = None,
+    descending: bool = False
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Stream a user's archived logs in a date range, a month at a time.
+
+    Args:
+        db: Database instance
+        user_id: Owner of the logs
+        start_date: Optional first date to include (YYYY-MM-DD)
+        end_date: Optional last date to include (YYYY-MM-DD)
+        projection: Optional symptom_logs-style projection
+        descending: Newest first instead of oldest first
+
+    Yields:
+        Log documents in the symptom_logs shape, ordered by date
+    """
+    query: Dict[str, Any] = {"user_id": user_id}
+    if start_date or end_date:
+        query["month"] = {}
+        if start_date:
+            query["month"]["$gte"] = start_date[:7]
+        if end_date:
+            query["month"]["$lte"] = end_date[:7]
+
+    cursor = db.symptom_log_archive.find(query, _archive_projection(projection)).sort(
+        "month", -1 if descending else 1
+    )
+    async for bucket in cursor:
+        days = bucket.get("days") or []
+        for entry in (reversed(days) if descending else days):
+            if start_date and entry["date"] < start_date:
+                continue
+            if end_date and entry["date"] > end_date:
+                continue
+            yield _from_entry(user_id, entry, projection)
+
+
+async def iter_logs(
+    db,
+    user_id: ObjectId,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    projection: Optional[Dict[str, Any]] = None,
+    batch_size: Optional[int] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Stream a user's logs oldest first, merging archived and daily logs.
+
+    Args:
+        db: Database instance
+        user_id: Owner of the logs
+        start_date: Optional first date to include (YYYY-MM-DD)
+        end_date: Optional last date to include (YYYY-MM-DD)
+        projection: Optional projection; must include date
+        batch_size: Optional cursor batch size for daily logs
+
+    Yields:
+        Log documents ordered by date
+    """
+    query: Dict[str, Any] = {"user_id": user_id}
+    if start_date or end_date:
+        query["date"] = {}
+        if start_date:
+            query["date"]["$gte"] = start_date
+        if end_date:
+            query["date"]["$lte"] = end_date
+    cursor = db.symptom_logs.find(query, projection).sort("date", 1)
+    if batch_size:
+        cursor = cursor.batch_size(batch_size)
+
+    if start_date and start_date >= archive_horizon():
+        async for log in cursor:
+            yield log
+        return
+
+    # Both streams are date-ordered; a date in both yields the daily log
+    hot = cursor.__aiter__()
+    next_hot = await anext(hot, None)
+    async for archived in iter_archived_logs(db, user_id, start_date, end_date, projection):
+        while next_hot is not None and next_hot["date"] < archived["date"]:
+            yield next_hot
+            next_hot = await anext(hot, None)
+        if next_hot is not None and next_hot["date"] == archived["date"]:
+            continue
+        yield archived
+    while next_hot is not None:
+        yield next_hot
+        next_hot = await anext(hot, None)
+
+
+def merge_logs(
+    hot: List[Dict[str, Any]],
+    archived: List[Dict[str, Any]],
+    descending: bool = False,
+    limit: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """
+    Merge daily and archived logs by date; the daily log wins a shared date.
+
+    Args:
+        hot: Logs from symptom_logs
+        archived: Logs from the archive
+        descending: Newest first instead of oldest first
+        limit: Optional maximum number of logs
+
+    Returns:
+        Merged logs ordered by date
+    """
+    by_date = {log["date"]: log for log in archived}
+    by_date.update((log["date"], log) for log in hot)
+    merged = sorted(by_date.values(), key=lambda log: log["date"], reverse=descending)
+    return merged[:limit] if limit else merged
+
+
+async def count_archived_logs(db, user_id: ObjectId) -> int:
+    """
+    Count a user's archived logs.
+
+    Args:
+        db: Database instance
+        user_id: Owner of the logs
+
+    Returns:
+        Number of logs in the user's archived months
+    """
+    result = await db.symptom_log_archive.aggregate([
+        {"$match": {"user_id": user_id}},
+        {"$group": {"_id": None, "count": {"$sum": {"$size": "$days"}}}},
+    ]).to_list(length=1)
+    return result[0]["count"] if result else 0
+
+
+async def find_logs_by_id(db, user_id: ObjectId, log_ids: List[ObjectId]) -> Dict[str, Dict[str, Any]]:
+    """
+    Look up a user's logs by ID, daily or archived.
+
+    Args:
+        db: Database instance
+        user_id: Owner of the logs
+        log_ids: IDs of the logs
+
+    Returns:
+        Log documents in the symptom_logs shape keyed by string ID; IDs
+        without a log are left out
+    """
+    logs = {
+        str(log["_id"]): log
+        async for log in db.symptom_logs.find({"_id": {"$in": log_ids}, "user_id": user_id})
+    }
+    missing = {log_id for log_id in log_ids if str(log_id) not in logs}
+    if missing:
+        async for bucket in db.symptom_log_archive.find({"user_id": user_id, "days._id": {"$in": list(missing)}}):
+            for entry in bucket.get("days") or []:
+                if entry.get("_id") in missing and str(entry["_id"]) not in logs:
+                    logs[str(entry["_id"])] = _from_entry(user_id, entry, None)
+    return logs
+
+
+async def set_log_fields(db, user_id: ObjectId, updates: List[Tuple[ObjectId, Dict[str, Any]]]) -> None:
+    """
+    Set fields of logs by ID, whether daily or archived, e.g. calendar
+    event links. Archived months keep their updated_at.
+
+    Args:
+        db: Database instance
+        user_id: Owner of the logs
+        updates: (log ID, fields to set) pairs
+    """
+    if not updates:
+        return
+    result = await db.symptom_logs.bulk_write([
+        UpdateOne({"_id": log_id, "user_id": user_id}, {"$set": fields})
+        for log_id, fields in updates
+    ], ordered=False)
+    if result.matched_count == len(updates):
+        return
+    # The rest are archived; updates of daily logs match no bucket
+    await db.symptom_log_archive.bulk_write([
+        UpdateOne(
+            {"user_id": user_id, "days._id": log_id},
+            {"$set": {f"days.$.{field}": value for field, value in fields.items()}}
+        )
+        for log_id, fields in updates
+    ], ordered=False)
+
+
+async def get_archive_versions(
+    db,
+    user_id: ObjectId,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None
+) -> List[Tuple[str, Any]]:
+    """
+    Get when each archived month in a range last changed, for ETags.
+
+    Args:
+        db: Database instance
+        user_id: Owner of the logs
+        start_date: Optional first date of the range (YYYY-MM-DD)
+        end_date: Optional last date of the range (YYYY-MM-DD)
+
+    Returns:
+        (month, updated_at) pairs ordered by month
+    """
+    query: Dict[str, Any] = {"user_id": user_id}
+    if start_date or end_date:
+        query["month"] = {}
+        if start_date:
+            query["month"]["$gte"] = start_date[:7]
+        if end_date:
+            query["month"]["$lte"] = end_date[:7]
+    cursor = db.symptom_log_archive.find(query, {"month": 1, "updated_at": 1}).sort("month", 1)
+    return [(bucket["month"], bucket.get("updated_at")) async for bucket in cursor]
+
+
+async def restore_months(db, user_id: ObjectId, dates: Iterable[str]) -> int:
+    """
+    Move archived months back to daily logs before dates in them are written.
+    Dates from the previous month on are never archived and cost nothing.
+
+    Args:
+        db: Database instance
+        user_id: Owner of the logs
+        dates: Dates about to be written or deleted (YYYY-MM-DD)
+
+    Returns:
+        Number of logs restored
+    """
+    horizon = archive_horizon()
+    months = sorted({date[:7] for date in dates if date < horizon})
+    if not months:
+        return 0
+
+    restored = 0
+    async for bucket in db.symptom_log_archive.find({"user_id": user_id, "month": {"$in": months}}):
+        logs = [{**entry, "user_id": user_id} for entry in bucket.get("days") or []]
+        if logs:
+            try:
+                result = await db.symptom_logs.insert_many(logs, ordered=False)
+                restored += len(result.inserted_ids)
+            except BulkWriteError as e:
+                # Dates that already have a daily log keep it
+                restored += e.details.get("nInserted", 0)
+        await db.symptom_log_archive.delete_one({"_id": bucket["_id"]})
+        logger.info(f"Restored archived month {bucket['month']} for user {user_id}")
+    return restored
+
+
+async def _archive_month(
+    db,
+    user_id: ObjectId,
+    month: str,
+    logs: List[Dict[str, Any]],
+    now: datetime
+) -> int:
+    bucket = await db.symptom_log_archive.find_one(
+        {"user_id": user_id, "month": month}, {"days.date": 1}
+    )
+    # Dates already archived by an interrupted run are not pushed twice
+    archived_dates = {entry["date"] for entry in (bucket or {}).get("days") or []}
+    entries = [
+        {field: value for field, value in log.items() if field != "user_id"}
+        for log in logs
+        if log["date"] not in archived_dates
+    ]
+    if entries:
+        await db.symptom_log_archive.update_one(
+            {"user_id": user_id, "month": month},
+            {
+                "$push": {"days": {"$each": entries, "$sort": {"date": 1}}},
+                "$set": {"updated_at": now},
+                "$setOnInsert": {"created_at": now},
+            },
+            upsert=True
+        )
+    # A log written since it was read keeps its daily document
+    result = await db.symptom_logs.bulk_write([
+        DeleteOne({"_id": log["_id"], "updated_at": log.get("updated_at")})
+        for log in logs
+    ], ordered=False)
+    return result.deleted_count
+
+
+async def archive_user_logs(db, user_id: ObjectId, now: Optional[datetime] = None) -> int:
+    """
+    Archive a user's logs older than the archive age, a month at a time.
+    Only whole months are archived, and only logs not updated within the
+    archive age. Safe to run again after an interruption.
+
+    Args:
+        db: Database instance
+        user_id: Owner of the logs
+        now: Current time, defaults to now (UTC)
+
+    Returns:
+        Number of daily logs archived
+    """
+    now = now or datetime.utcnow()
+    cutoff_time = now - timedelta(days=archive_age_days())
+    cutoff_date = cutoff_time.date().replace(day=1).isoformat()
+
+    archived = 0
+    month: Optional[str] = None
+    logs: List[Dict[str, Any]] = []
+    async for log in db.symptom_logs.find({
+        "user_id": user_id,
+        "date": {"$lt": cutoff_date},
+        "updated_at": {"$lt": cutoff_time},
+    }).sort("date", 1):
+        if log["date"][:7] != month:
+            if logs:
+                archived += await _archive_month(db, user_id, month, logs, now)
+            month, logs = log["date"][:7], []
+        logs.append(log)
+    if logs:
+        archived += await _archive_month(db, user_id, month, logs, now)
+    return archived
+
+
+async def archive_logs(db) -> Dict[str, int]:
+    """
+    Archive old logs of every user.
+
+    Args:
+        db: Database instance
+
+    Returns:
+        Dictionary with the number of users and logs archived
+    """
+    now = datetime.utcnow()
+    cutoff_date = (now - timedelta(days=archive_age_days())).date().replace(day=1).isoformat()
+    user_ids = await db.symptom_logs.distinct("user_id", {"date": {"$lt": cutoff_date}})
+
+    logs = 0
+    for user_id in user_ids:
+        count = await archive_user_logs(db, user_id, now)
+        if count:
+            logger.info(f"Archived {count} symptom logs for user {user_id}")
+        logs += count
+    return {"users": len(user_ids), "logs": logs}
@@ -0,0 +1,175 @@
+"""
+Canonical symptom catalog.
+
+Symptoms are entered as free text in onboarding (primary_symptoms) and in
+logs. Names are normalized against the catalog on write, so spelling
+variants ("hot flashes", "hot_flushes") are stored under one display name
+and every logged symptom carries a stable ID. Names outside the catalog
+keep their text and get an ID derived from it. Symptom-level queries then
+match symptoms.id on the (user_id, symptoms.id, date) index instead of
+comparing names.
+"""
+import hashlib
+import logging
+import re
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Tuple
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+# Symptoms offered by the app, with the other spellings they are known by
+SYMPTOM_CATALOG: List[Dict[str, Any]] = [
+    {"id": "hot_flushes", "name": "Hot Flushes", "aliases": ["hot flush", "hot flashes", "hot flash"]},
+    {"id": "night_sweats", "name": "Night Sweats", "aliases": ["night sweat", "night sweating"]},
+    {"id": "sleep_quality", "name": "Sleep Quality", "aliases": ["sleep", "sleep issues", "sleep problems"]},
+    {"id": "mood_changes", "name": "Mood Changes", "aliases": ["mood", "mood swings", "mood change"]},
+    {"id": "brain_fog", "name": "Brain Fog", "aliases": ["brainfog"]},
+    {"id": "joint_pain", "name": "Joint Pain", "aliases": ["joint pains", "joint aches", "aching joints"]},
+    {"id": "energy_levels", "name": "Energy Levels", "aliases": ["energy", "energy level"]},
+    {"id": "anxiety", "name": "Anxiety", "aliases": []},
+]
+
+# IDs derived from free text are cut to this length
+MAX_SYMPTOM_ID_LENGTH = 64
+
+# Logs are rewritten this many at a time by the migration
+MIGRATION_BATCH_SIZE = 500
+
+
+def _normalize(name: str) -> str:
+    # Case, separators and repeated whitespace don't distinguish symptoms
+    return " ".join(re.sub(r"[_\-]+", " ", name).lower().split())
+
+
+_LOOKUP: Dict[str, Dict[str, Any]] = {}
+for _entry in SYMPTOM_CATALOG:
+    for _alias in [_entry["id"], _entry["name"], *_entry["aliases"]]:
+        _LOOKUP[_normalize(_alias)] = _entry
+
+
+def resolve(name: str) -> Tuple[str, str]:
+    """
+    Get the ID and display name a symptom name is stored under.
+
+    Args:
+        name: Symptom name as entered
+
+    Returns:
+        Tuple of symptom ID and display name; names outside the catalog
+        keep their text with whitespace collapsed
+    """
+    key = _normalize(name)
+    entry = _LOOKUP.get(key)
+    if entry is not None:
+        return entry["id"], entry["name"]
+
+    symptom_id = re.sub(r"[\W_]+", "_", key).strip("_")[:MAX_SYMPTOM_ID_LENGTH]
+    if not symptom_id:
+        symptom_id = "symptom_" + hashlib.sha1(name.encode("utf-8")).hexdigest()[:12]
+    return symptom_id, " ".join(name.split())
+
+
+def symptom_id(name: str) -> str:
+    """
+    Get the ID of a symptom name, for queries.
+
+    Args:
+        name: Symptom name or ID
+
+    Returns:
+        Symptom ID
+    """
+    return resolve(name)[0]
+
+
+def normalize_symptoms(symptoms: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Set the catalog ID and display name of logged symptoms.
+
+    Args:
+        symptoms: Symptom dictionaries with at least a name
+
+    Returns:
+        New symptom dictionaries with id and canonical name
+    """
+    normalized = []
+    for symptom in symptoms:
+        symptom_id, name = resolve(symptom["name"])
+        normalized.append({**symptom, "id": symptom_id, "name": name})
+    return normalized
+
+
+def normalize_names(names: Iterable[str]) -> List[str]:
+    """
+    Map symptom names, e.g. a user's primary symptoms, to display names.
+
+    Args:
+        names: Symptom names as entered
+
+    Returns:
+        Display names in the given order, without duplicates
+    """
+    seen = set()
+    normalized = []
+    for name in names:
+        symptom_id, display_name = resolve(name)
+        if symptom_id not in seen:
+            seen.add(symptom_id)
+            normalized.append(display_name)
+    return normalized
+
+
+async def migrate_symptom_ids(db, batch_size: int = MIGRATION_BATCH_SIZE) -> Dict[str, Any]:
+    """
+    Rewrite stored logs and primary symptoms to catalog IDs and names.
+    Logs are read in _id order a batch at a time and only changed ones are
+    written, so the migration can be stopped and run again.
+
+    Args:
+        db: Database instance
+        batch_size: Logs read and written per batch
+
+    Returns:
+        Dictionary with logs_updated, users_updated and the user_ids whose
+        symptom names changed (their rollups need rebuilding)
+    """
+    logs_updated = 0
+    renamed_users = set()
+    last_id = None
+    while True:
+        query = {"_id": {"$gt": last_id}} if last_id else {}
+        batch = await db.symptom_logs.find(
+            query, {"user_id": 1, "symptoms": 1}
+        ).sort("_id", 1).limit(batch_size).to_list(length=None)
+        if not batch:
+            break
+        last_id = batch[-1]["_id"]
+
+        updates = []
+        for log in batch:
+            symptoms = log.get("symptoms") or []
+            normalized = normalize_symptoms(symptoms)
+            if normalized == symptoms:
+                continue
+            if [s["name"] for s in normalized] != [s["name"] for s in symptoms]:
+                renamed_users.add(log["user_id"])
+            # updated_at moves so delta sync clients pick up the new names and IDs
+            updates.append(UpdateOne(
+                {"_id": log["_id"]},
+                {"$set": {"symptoms": normalized, "updated_at": datetime.utcnow()}}
+            ))
+        if updates:
+            await db.symptom_logs.bulk_write(updates, ordered=False)
+            logs_updated += len(updates)
+        logger.info(f"Migrated symptom IDs through log {last_id} ({logs_updated} logs updated)")
+
+    users_updated = 0
+    async for user in db.users.find({"primary_symptoms.0": {"$exists": True}}, {"primary_symptoms": 1}):
+        normalized = normalize_names(user["primary_symptoms"])
+        if normalized != user["primary_symptoms"]:
+            await db.users.update_one({"_id": user["_id"]}, {"$set": {"primary_symptoms": normalized}})
+            users_updated += 1
+
+    return {"logs_updated": logs_updated, "users_updated": users_updated, "renamed_users": list(renamed_users)}
@@ -0,0 +1,123 @@
+"""
+Compact per-year symptom heatmaps for the calendar view.
+
+A heatmap holds one byte per day of the year:
+
+    bit 7     set if a log exists for the day
+    bits 3-5  mean symptom severity, rounded (0 if no symptoms)
+    bits 0-2  max symptom severity (0 if no symptoms)
+
+Heatmaps are computed from the severity fields stored with the year's
+logs and kept in a per-process cache until a write to that year
+invalidates them.
+"""
+import itertools
+import logging
+from datetime import date as date_type
+from typing import Iterable
+
+from bson import ObjectId
+
+from config import get_settings
+from services.symptom_archive_service import iter_logs
+from utils.cache import TTLCache
+from utils.metrics import register_metrics
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+LOGGED_FLAG = 0x80
+MEAN_SHIFT = 3
+
+# Only the stored day severities are read; symptoms and notes stay in the database
+HEATMAP_PROJECTION = {"_id": 0, "date": 1, "severity_mean": 1, "severity_max": 1}
+
+# Encoded heatmaps keyed by (user id, year)
+heatmap_cache = TTLCache(
+    max_size=settings.heatmap_cache_max_size,
+    ttl_seconds=settings.heatmap_cache_ttl_seconds
+)
+register_metrics("heatmap_cache", heatmap_cache.stats)
+
+# Version of each (user id, year), replaced on every invalidation;
+# heatmaps are only cached if the version did not change while they were read
+_versions = TTLCache(
+    max_size=settings.heatmap_cache_max_size,
+    ttl_seconds=settings.heatmap_cache_ttl_seconds
+)
+_version_counter = itertools.count(1)
+
+
+def _current_version(key) -> int:
+    version = _versions.get(key)
+    if version is None:
+        version = next(_version_counter)
+        _versions.set(key, version)
+    return version
+
+
+def encode_day(mean: float, max_severity: int) -> int:
+    """
+    Encode one logged day.
+
+    Args:
+        mean: Mean symptom severity, 0 if no symptoms
+        max_severity: Highest symptom severity, 0 if no symptoms
+
+    Returns:
+        Heatmap byte for the day
+    """
+    return LOGGED_FLAG | (int(mean + 0.5) << MEAN_SHIFT) | max_severity
+
+
+async def get_heatmap(db, user_id: ObjectId, year: int) -> bytes:
+    """
+    Get a user's heatmap for a year, from the cache if present.
+
+    Args:
+        db: Database instance
+        user_id: Owner of the logs
+        year: Calendar year
+
+    Returns:
+        One byte per day of the year, January 1st first
+    """
+    key = (str(user_id), year)
+    cached = heatmap_cache.get(key)
+    if cached is not None:
+        return cached
+
+    version = _current_version(key)
+    first_day = date_type(year, 1, 1)
+    days = bytearray((date_type(year, 12, 31) - first_day).days + 1)
+    async for log in iter_logs(db, user_id, f"{year}-01-01", f"{year}-12-31", HEATMAP_PROJECTION):
+        try:
+            index = (date_type.fromisoformat(log["date"]) - first_day).days
+        except ValueError:
+            logger.warning(f"Skipping log with invalid date {log['date']!r} for user {user_id}")
+            continue
+        # Logs not yet backfilled with severity fields show as logged only
+        days[index] = encode_day(log.get("severity_mean") or 0, log.get("severity_max") or 0)
+
+    heatmap = bytes(days)
+    # A write during the read may be missing from the heatmap, which is
+    # then returned but not cached
+    if _versions.get(key) == version:
+        heatmap_cache.set(key, heatmap)
+    return heatmap
+
+
+def invalidate_heatmaps(user_id, dates: Iterable[str]) -> None:
+    """
+    Drop cached heatmaps for the years of written or deleted logs.
+    Must be called by every code path that writes symptom logs.
+
+    Args:
+        user_id: Owner of the logs
+        dates: Dates of the logs (YYYY-MM-DD)
+    """
+    for year in {date[:4] for date in dates}:
+        if year.isdigit():
+            key = (str(user_id), int(year))
+            heatmap_cache.invalidate(key)
+            _versions.set(key, next(_version_counter))
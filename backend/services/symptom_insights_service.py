@@ -0,0 +1,263 @@
+"""
+Symptom co-occurrence and correlation analytics.
+
+A user's history is read once with a projected cursor into a dense
+day-by-symptom matrix of severities (0 where a symptom was not logged),
+with one row per calendar day from the first to the last log. Everything
+else is vectorized NumPy over that matrix: co-occurrence counts, Pearson
+and Spearman correlations, lagged correlations (symptom A on one day vs.
+symptom B some days later) and rolling mean severities. Days without a
+log are left out of the statistics rather than counted as symptom-free.
+
+Results are cached per user until a log write invalidates them.
+"""
+import itertools
+import logging
+from datetime import date as date_type, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from bson import ObjectId
+
+from config import get_settings
+from services.symptom_archive_service import iter_logs
+from services.symptom_catalog import symptom_id
+from utils.cache import TTLCache
+from utils.metrics import register_metrics
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+INSIGHTS_PROJECTION = {"_id": 0, "date": 1, "symptoms.id": 1, "symptoms.name": 1, "symptoms.severity": 1}
+
+# Correlations over fewer paired days than this are reported as null
+MIN_OBSERVATIONS = 5
+
+# Rolling means are returned for this many trailing days
+ROLLING_DAYS = 90
+
+# Results keyed by user id, each a dictionary of results by parameters
+insights_cache = TTLCache(
+    max_size=settings.insights_cache_max_size,
+    ttl_seconds=settings.insights_cache_ttl_seconds
+)
+register_metrics("insights_cache", insights_cache.stats)
+
+# Version of each user's logs, replaced on every invalidation; results
+# are only cached if the version did not change while they were computed
+_versions = TTLCache(
+    max_size=settings.insights_cache_max_size,
+    ttl_seconds=settings.insights_cache_ttl_seconds
+)
+_version_counter = itertools.count(1)
+
+
+def _current_version(key: str) -> int:
+    version = _versions.get(key)
+    if version is None:
+        version = next(_version_counter)
+        _versions.set(key, version)
+    return version
+
+
+async def _load_matrix(db, user_id: ObjectId) -> Optional[Dict[str, Any]]:
+    # One pass over the projected logs, oldest first so later names win
+    dates: List[str] = []
+    rows: List[int] = []
+    cols: List[int] = []
+    severities: List[int] = []
+    columns: Dict[str, int] = {}
+    names: List[str] = []
+
+    async for log in iter_logs(db, user_id, projection=INSIGHTS_PROJECTION):
+        row = len(dates)
+        dates.append(log["date"])
+        for symptom in log.get("symptoms") or []:
+            key = symptom.get("id") or symptom_id(symptom["name"])
+            col = columns.get(key)
+            if col is None:
+                col = columns[key] = len(names)
+                names.append(symptom["name"])
+            else:
+                names[col] = symptom["name"]
+            rows.append(row)
+            cols.append(col)
+            severities.append(symptom["severity"])
+
+    if not dates:
+        return None
+
+    try:
+        log_days = np.array(dates, dtype="datetime64[D]")
+    except ValueError:
+        logger.warning(f"Skipping insights for user {user_id}: invalid log date")
+        return None
+    day_index = (log_days - log_days[0]).astype(np.int64)
+    days = int(day_index[-1]) + 1
+
+    matrix = np.zeros((days, len(names)), dtype=np.float64)
+    # A symptom listed twice on one day counts at its highest severity
+    np.maximum.at(
+        matrix,
+        (day_index[np.asarray(rows, dtype=np.int64)], np.asarray(cols, dtype=np.int64)),
+        severities
+    )
+    logged = np.zeros(days, dtype=bool)
+    logged[day_index] = True
+
+    return {
+        "start": date_type.fromisoformat(dates[0]),
+        "matrix": matrix,
+        "logged": logged,
+        "ids": list(columns),
+        "names": names,
+    }
+
+
+def _correlate(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    # Pearson correlation of every column of a with every column of b;
+    # columns without variance give NaN
+    n = a.shape[0]
+    if n < MIN_OBSERVATIONS:
+        return np.full((a.shape[1], b.shape[1]), np.nan)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        az = (a - a.mean(axis=0)) / a.std(axis=0)
+        bz = (b - b.mean(axis=0)) / b.std(axis=0)
+        return (az.T @ bz) / n
+
+
+def _rank(x: np.ndarray) -> np.ndarray:
+    # Column-wise ranks, 1-based, with ties given their average rank
+    n = x.shape[0]
+    order = np.argsort(x, axis=0, kind="stable")
+    ordered = np.take_along_axis(x, order, axis=0)
+    positions = np.arange(n)[:, None]
+
+    starts = np.ones(x.shape, dtype=bool)
+    starts[1:] = ordered[1:] != ordered[:-1]
+    ends = np.ones(x.shape, dtype=bool)
+    ends[:-1] = ordered[:-1] != ordered[1:]
+    first = np.maximum.accumulate(np.where(starts, positions, 0), axis=0)
+    last = np.minimum.accumulate(np.where(ends, positions, n - 1)[::-1], axis=0)[::-1]
+
+    ranks = np.empty(x.shape, dtype=np.float64)
+    np.put_along_axis(ranks, order, (first + last) / 2 + 1, axis=0)
+    return ranks
+
+
+def _rolling_means(matrix: np.ndarray, logged: np.ndarray, window: int) -> Tuple[int, np.ndarray]:
+    # Mean severity over the logged days of each trailing window
+    sums = np.cumsum(np.vstack([np.zeros((1, matrix.shape[1])), matrix]), axis=0)
+    counts = np.cumsum(np.concatenate([[0], logged.astype(np.int64)]))
+    window = min(window, matrix.shape[0])
+    window_sums = sums[window:] - sums[:-window]
+    window_counts = (counts[window:] - counts[:-window])[:, None]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = np.where(window_counts > 0, window_sums / window_counts, np.nan)
+    # Row i of means ends on day i + window - 1
+    first_row = max(0, means.shape[0] - ROLLING_DAYS)
+    return first_row + window - 1, means[first_row:]
+
+
+def _to_list(values: np.ndarray) -> List[Any]:
+    return np.where(np.isnan(values), None, np.round(values, 3)).tolist()
+
+
+def compute_insights(data: Dict[str, Any], max_lag: int, window: int) -> Dict[str, Any]:
+    """
+    Compute insights from a day-by-symptom matrix.
+
+    Args:
+        data: Matrix and labels from the user's logs
+        max_lag: Largest lag in days for lagged correlations
+        window: Rolling mean window in days
+
+    Returns:
+        Dictionary in the SymptomInsightsResponse shape
+    """
+    matrix, logged = data["matrix"], data["logged"]
+    observed = matrix[logged]
+    present = (observed > 0).astype(np.int64)
+    days_logged = present.sum(axis=0)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_severity = observed.sum(axis=0) / days_logged
+
+    lagged = []
+    for lag in range(1, max_lag + 1):
+        if lag >= matrix.shape[0]:
+            break
+        # Pairs of days lag apart that were both logged
+        valid = logged[:-lag] & logged[lag:]
+        lagged.append({
+            "lag": lag,
+            "correlations": _to_list(_correlate(matrix[:-lag][valid], matrix[lag:][valid])),
+        })
+
+    rolling_start, rolling = _rolling_means(matrix, logged, window)
+    start = data["start"]
+
+    return {
+        "start_date": start.isoformat(),
+        "end_date": (start + timedelta(days=matrix.shape[0] - 1)).isoformat(),
+        "logged_days": int(logged.sum()),
+        "symptoms": [
+            {"id": key, "name": name, "days_logged": int(count), "mean_severity": mean}
+            for key, name, count, mean in zip(
+                data["ids"], data["names"], days_logged, _to_list(mean_severity)
+            )
+        ],
+        "co_occurrence": (present.T @ present).tolist(),
+        "pearson": _to_list(_correlate(observed, observed)),
+        "spearman": _to_list(_correlate(_rank(observed), _rank(observed))),
+        "lagged": lagged,
+        "rolling": {
+            "window": window,
+            "start_date": (start + timedelta(days=rolling_start)).isoformat(),
+            "values": {
+                key: _to_list(rolling[:, col]) for col, key in enumerate(data["ids"])
+            },
+        },
+    }
+
+
+async def get_insights(db, user_id: ObjectId, max_lag: int, window: int) -> Optional[Dict[str, Any]]:
+    """
+    Get a user's symptom insights, from the cache if present.
+
+    Args:
+        db: Database instance
+        user_id: Owner of the logs
+        max_lag: Largest lag in days for lagged correlations
+        window: Rolling mean window in days
+
+    Returns:
+        Insights dictionary, or None if the user has no logs
+    """
+    key = str(user_id)
+    cached = insights_cache.get(key)
+    if cached is not None and (max_lag, window) in cached:
+        return cached[(max_lag, window)]
+
+    version = _current_version(key)
+    data = await _load_matrix(db, user_id)
+    result = compute_insights(data, max_lag, window) if data else None
+
+    # A write during the load may not be in the result, which is then
+    # returned but not cached. Results for other parameters stay valid
+    # until the next write
+    if _versions.get(key) == version:
+        insights_cache.set(key, {**(cached or {}), (max_lag, window): result})
+    return result
+
+
+def invalidate_insights(user_id) -> None:
+    """
+    Drop a user's cached insights.
+    Must be called by every code path that writes symptom logs.
+
+    Args:
+        user_id: Owner of the logs
+    """
+    insights_cache.invalidate(str(user_id))
+    _versions.set(str(user_id), next(_version_counter))
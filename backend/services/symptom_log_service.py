@@ -0,0 +1,729 @@
+"""
+Service for writing symptom logs.
+The single-log and bulk endpoints share these write paths, so the side
+effects of a write (queued calendar sync jobs, rollups, deletion
+tombstones, cached heatmaps and insights) are applied the same way.
+Writes to archived months restore them to daily logs first, and reads
+merge archived months with daily logs.
+
+With LOG_WRITE_COALESCE_SECONDS set, bursts of upserts to one log (e.g.
+autosave) are coalesced in log_write_buffer: the first is written, later
+ones within the window are held and only the latest is written when the
+window ends. Reads flush the user's held writes first (flush_pending), so
+a user always reads their own writes. That only holds within one process:
+with several server workers a read can reach a worker that does not hold
+the write, so coalescing is disabled when WEB_CONCURRENCY is above 1.
+"""
+import csv
+import io
+import json
+import logging
+from datetime import date as date_type, datetime, timedelta
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import DeleteOne, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from config import Settings, get_settings
+from models.symptom_log import SymptomLogCreate
+from models.user import UserInDB
+from services import symptom_rollup_service
+from services.symptom_archive_service import (
+    archive_horizon,
+    get_archive_versions,
+    get_archived_logs,
+    iter_logs,
+    merge_logs,
+    restore_months,
+)
+from services.symptom_catalog import normalize_symptoms
+from services.symptom_heatmap_service import invalidate_heatmaps
+from services.symptom_insights_service import invalidate_insights
+from services.symptom_severity import severity_fields
+from services.calendar_sync_outbox import enqueue_log_changes, enqueue_log_delete, enqueue_log_sync
+from utils.metrics import register_metrics
+from utils.write_buffer import CoalescingWriteBuffer
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Fields kept when reading a log before deleting it
+DELETE_PROJECTION = {"date": 1, "symptoms": 1, "calendar_event": 1}
+
+# Exports read and emit this many logs at a time
+EXPORT_BATCH_SIZE = 500
+
+EXPORT_PROJECTION = {"_id": 0, "date": 1, "symptoms": 1, "overall_notes": 1, "created_at": 1, "updated_at": 1}
+
+# Fields returned by log listings; calendar links and other internals are not read
+LIST_PROJECTION = {
+    "_id": 1, "user_id": 1, "date": 1, "symptoms": 1, "overall_notes": 1, "created_at": 1, "updated_at": 1,
+    "severity_mean": 1, "severity_max": 1, "symptom_count": 1, "severity_level": 1
+}
+
+# Delta sync watermarks trail the read by this much, so writes stamped just
+# before the read but committed after it are picked up by the next sync
+CHANGES_OVERLAP = timedelta(seconds=5)
+
+
+def coalesce_window(app_settings: Settings) -> float:
+    """
+    Get the write coalescing window to use with the given settings.
+
+    Args:
+        app_settings: Application settings
+
+    Returns:
+        LOG_WRITE_COALESCE_SECONDS, or 0 when there are several worker processes
+    """
+    if app_settings.log_write_coalesce_seconds and app_settings.web_concurrency > 1:
+        logger.warning(
+            f"LOG_WRITE_COALESCE_SECONDS is ignored with {app_settings.web_concurrency} workers; "
+            f"held writes are not visible to other worker processes"
+        )
+        return 0.0
+    return app_settings.log_write_coalesce_seconds
+
+
+# Held upserts keyed by (user id, date)
+log_write_buffer = CoalescingWriteBuffer(coalesce_window(settings))
+register_metrics("log_write_buffer", log_write_buffer.stats)
+
+CSV_COLUMNS = ["date", "symptom", "severity", "symptom_notes", "overall_notes", "created_at", "updated_at"]
+
+
+def _log_update(log_in: SymptomLogCreate, now: datetime) -> Dict[str, Any]:
+    symptoms = normalize_symptoms(s.dict() for s in log_in.symptoms)
+    return {
+        "$set": {
+            "symptoms": symptoms,
+            **severity_fields(symptoms),
+            "overall_notes": log_in.overall_notes,
+            "updated_at": now
+        },
+        "$setOnInsert": {
+            "created_at": now
+        }
+    }
+
+
+async def _update_rollups(db, user_id: ObjectId, changes) -> None:
+    # The log write has already happened; a failed rollup update is left
+    # for rebuild_rollups to repair rather than failing the request
+    try:
+        await symptom_rollup_service.apply_log_changes(db, user_id, changes)
+    except Exception as e:
+        logger.error(f"Failed to update symptom rollups for user {user_id}: {e}")
+
+
+async def _record_tombstones(db, user_id: ObjectId, logs: List[Dict[str, Any]], now: datetime) -> None:
+    # Deletions are kept, one per date, so delta sync clients can drop their
+    # copies; the TTL index on deleted_at expires them
+    if not logs:
+        return
+    await db.symptom_log_tombstones.bulk_write([
+        UpdateOne(
+            {"user_id": user_id, "date": log["date"]},
+            {"$set": {"log_id": log["_id"], "deleted_at": now}},
+            upsert=True
+        )
+        for log in logs
+    ], ordered=False)
+
+
+async def _write_log(
+    db,
+    user: UserInDB,
+    log_in: SymptomLogCreate,
+    received_at: datetime,
+    previous: Optional[Dict[str, Any]] = None
+) -> Optional[Dict[str, Any]]:
+    # A held write (previous is the buffer's last write of the log) is only
+    # applied if nothing newer than it was written since, e.g. by another
+    # worker, and never creates a log. updated_at is stamped when the write
+    # is applied, not received, so delta sync clients that polled while it
+    # was held still see it
+    coalesced = previous is not None
+    now = datetime.utcnow() if coalesced else received_at
+    user_id = ObjectId(user.id)
+    query: Dict[str, Any] = {"user_id": user_id, "date": log_in.date}
+    update = _log_update(log_in, now)
+    new_id = ObjectId()
+    if coalesced:
+        query["$or"] = [{"updated_at": {"$lt": received_at}}, {"updated_at": previous["updated_at"]}]
+    else:
+        update["$setOnInsert"]["_id"] = new_id
+
+    # Use find_one_and_update with upsert=True to atomically create or update.
+    # The previous version is returned so rollups can apply the difference
+    before = await db.symptom_logs.find_one_and_update(
+        query,
+        update,
+        upsert=not coalesced,
+        return_document=ReturnDocument.BEFORE
+    )
+    if before is None and coalesced:
+        return None
+    log = {
+        **(before or {"_id": new_id, "user_id": user_id, "date": log_in.date, "created_at": now}),
+        **update["$set"]
+    }
+
+    invalidate_heatmaps(user_id, [log_in.date])
+    invalidate_insights(user_id)
+    await _update_rollups(db, user_id, [(before, log)])
+    # Calendar sync happens in the background outbox workers
+    await enqueue_log_sync(db, user, log)
+    return log
+
+
+async def upsert_log(db, user: UserInDB, log_in: SymptomLogCreate, durable: bool = True) -> Dict[str, Any]:
+    """
+    Create or update the user's log for a date.
+
+    Args:
+        db: Database instance
+        user: Owner of the log
+        log_in: Log content
+        durable: Write before returning; if False and coalescing is
+            enabled, the write may be held in log_write_buffer
+
+    Returns:
+        The log document as written, or as it will be written
+    """
+    user_id = ObjectId(user.id)
+    await restore_months(db, user_id, [log_in.date])
+    key = (str(user.id), log_in.date)
+    now = datetime.utcnow()
+
+    if durable or not log_write_buffer.enabled:
+        # A held write is older than this one and must not land after it
+        await log_write_buffer.discard([key])
+        return await _write_log(db, user, log_in, now)
+
+    return await log_write_buffer.submit(
+        key,
+        lambda previous: _write_log(db, user, log_in, now, previous),
+        lambda log: {**log, **_log_update(log_in, now)["$set"]}
+    )
+
+
+async def flush_pending(user_id: Optional[str] = None) -> None:
+    """
+    Write held upserts now, so reads see them.
+
+    Args:
+        user_id: Only flush this user's upserts, defaults to every user's
+    """
+    if user_id is None:
+        await log_write_buffer.flush()
+    else:
+        await log_write_buffer.flush([key for key in log_write_buffer.keys() if key[0] == str(user_id)])
+
+
+async def delete_log(db, user: UserInDB, date: str) -> Optional[Dict[str, Any]]:
+    """
+    Delete the user's log for a date.
+
+    Args:
+        db: Database instance
+        user: Owner of the log
+        date: Date of the log (YYYY-MM-DD)
+
+    Returns:
+        The deleted log's date, symptoms and calendar link, or None if there was no log
+    """
+    await log_write_buffer.discard([(str(user.id), date)])
+    await restore_months(db, ObjectId(user.id), [date])
+    log = await db.symptom_logs.find_one_and_delete(
+        {"user_id": ObjectId(user.id), "date": date},
+        projection=DELETE_PROJECTION
+    )
+    if log is not None:
+        invalidate_heatmaps(user.id, [date])
+        invalidate_insights(user.id)
+        await _record_tombstones(db, ObjectId(user.id), [log], datetime.utcnow())
+        await _update_rollups(db, ObjectId(user.id), [(log, None)])
+        await enqueue_log_delete(db, user, log)
+    return log
+
+
+async def bulk_write_logs(
+    db,
+    user: UserInDB,
+    upserts: List[SymptomLogCreate],
+    deletes: List[str]
+) -> List[Dict[str, Any]]:
+    """
+    Apply many log upserts and deletions with one unordered bulk write.
+    Items fail independently; one failing write does not stop the others.
+
+    Args:
+        db: Database instance
+        user: Owner of the logs
+        upserts: Logs to create or update, at most one per date
+        deletes: Dates whose logs should be deleted, not overlapping upserts
+
+    Returns:
+        One result per item, upserts first, each with op, date, status,
+        id and error keys
+    """
+    user_id = ObjectId(user.id)
+    await log_write_buffer.discard([(str(user.id), date) for date in [log_in.date for log_in in upserts] + deletes])
+    await restore_months(db, user_id, [log_in.date for log_in in upserts] + deletes)
+    now = datetime.utcnow()
+
+    # Logs are read first: rollups need the previous versions and deletes
+    # need their calendar links
+    to_delete = {}
+    previous = {}
+    delete_dates = set(deletes)
+    async for log in db.symptom_logs.find(
+        {"user_id": user_id, "date": {"$in": [log_in.date for log_in in upserts] + deletes}},
+        DELETE_PROJECTION
+    ):
+        if log["date"] in delete_dates:
+            to_delete[log["date"]] = log
+        else:
+            previous[log["date"]] = log
+
+    results: List[Dict[str, Any]] = []
+    operations = []
+    for log_in in upserts:
+        results.append({"op": "upsert", "date": log_in.date, "status": None, "id": None, "error": None})
+        operations.append(UpdateOne(
+            {"user_id": user_id, "date": log_in.date},
+            _log_update(log_in, now),
+            upsert=True
+        ))
+    for date in deletes:
+        log = to_delete.get(date)
+        results.append({
+            "op": "delete",
+            "date": date,
+            "status": None if log else "not_found",
+            "id": str(log["_id"]) if log else None,
+            "error": None
+        })
+        # Results and operations line up, so missing logs still take a slot
+        operations.append(DeleteOne({"_id": log["_id"]}) if log else None)
+
+    indexed = [(i, op) for i, op in enumerate(operations) if op is not None]
+    details: Dict[str, Any] = {}
+    if indexed:
+        try:
+            result = await db.symptom_logs.bulk_write([op for _, op in indexed], ordered=False)
+            details = result.bulk_api_result
+        except BulkWriteError as e:
+            details = e.details
+
+    errors = {indexed[e["index"]][0]: e.get("errmsg") for e in details.get("writeErrors", [])}
+    created = {indexed[u["index"]][0] for u in details.get("upserted", [])}
+
+    for i, item in enumerate(results):
+        if item["status"] is not None:
+            continue
+        if i in errors:
+            item["status"] = "failed"
+            item["error"] = errors[i]
+        elif item["op"] == "delete":
+            item["status"] = "deleted"
+        else:
+            item["status"] = "created" if i in created else "updated"
+
+    written_dates = [item["date"] for item in results if item["op"] == "upsert" and item["status"] != "failed"]
+    written = []
+    if written_dates:
+        async for log in db.symptom_logs.find(
+            {"user_id": user_id, "date": {"$in": written_dates}},
+            {"date": 1}
+        ):
+            written.append(log)
+        ids = {log["date"]: str(log["_id"]) for log in written}
+        for item in results:
+            if item["op"] == "upsert" and item["status"] != "failed":
+                item["id"] = ids.get(item["date"])
+
+    invalidate_heatmaps(user_id, [item["date"] for item in results if item["status"] != "failed"])
+    invalidate_insights(user_id)
+    deleted = [to_delete[item["date"]] for item in results if item["status"] == "deleted"]
+    await _record_tombstones(db, user_id, deleted, now)
+    new_versions = {log_in.date: log_in for log_in in upserts}
+    await _update_rollups(db, user_id, [
+        (previous.get(log["date"]), {"date": log["date"], "symptoms": normalize_symptoms(
+            s.dict() for s in new_versions[log["date"]].symptoms
+        )})
+        for log in written
+    ] + [(log, None) for log in deleted])
+    await enqueue_log_changes(db, user, written, deleted)
+
+    if errors:
+        logger.warning(f"Bulk write for user {user.id} had {len(errors)} failed items")
+    return results
+
+
+def log_to_json(log: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Convert a stored log to the SymptomLogResponse shape, ready for
+    json serialization without building a pydantic model.
+    Stored logs were validated on write, so only ids are converted and
+    missing optional fields filled in.
+
+    Args:
+        log: Log document read with LIST_PROJECTION
+
+    Returns:
+        JSON-ready dictionary with SymptomLogResponse's fields
+    """
+    return {
+        "date": log["date"],
+        "symptoms": [
+            {
+                "name": symptom["name"],
+                "severity": symptom["severity"],
+                "notes": symptom.get("notes"),
+                "id": symptom.get("id"),
+            }
+            for symptom in log.get("symptoms") or []
+        ],
+        "overall_notes": log.get("overall_notes"),
+        "severity_mean": log.get("severity_mean"),
+        "severity_max": log.get("severity_max"),
+        "symptom_count": log.get("symptom_count"),
+        "severity_level": log.get("severity_level"),
+        "id": str(log["_id"]),
+        "user_id": str(log["user_id"]),
+        "created_at": log["created_at"],
+        "updated_at": log["updated_at"],
+    }
+
+
+def _list_filters(
+    user_id: ObjectId,
+    start_date: Optional[str],
+    end_date: Optional[str],
+    symptom_id: Optional[str],
+    min_severity: Optional[int],
+    severity_level: Optional[str]
+) -> Tuple[Dict[str, Any], Any]:
+    # The same filters as a query for daily logs and a predicate for archived ones
+    query: Dict[str, Any] = {"user_id": user_id}
+    if start_date or end_date:
+        query["date"] = {}
+        if start_date:
+            query["date"]["$gte"] = start_date
+        if end_date:
+            query["date"]["$lte"] = end_date
+    # Symptom filters match catalog IDs on the (user_id, symptoms.id, date) index
+    if symptom_id or min_severity:
+        match: Dict[str, Any] = {}
+        if symptom_id:
+            match["id"] = symptom_id
+        if min_severity:
+            match["severity"] = {"$gte": min_severity}
+        query["symptoms"] = {"$elemMatch": match}
+    # Served by the (user_id, severity_level, date) index
+    if severity_level:
+        query["severity_level"] = severity_level
+
+    def predicate(log: Dict[str, Any]) -> bool:
+        if severity_level and log.get("severity_level") != severity_level:
+            return False
+        if symptom_id or min_severity:
+            return any(
+                (not symptom_id or symptom.get("id") == symptom_id)
+                and (not min_severity or symptom["severity"] >= min_severity)
+                for symptom in log.get("symptoms") or []
+            )
+        return True
+
+    return query, predicate
+
+
+def _needs_archive(start_date: Optional[str], limit: Optional[int], count: int, oldest: Optional[str]) -> bool:
+    # Archived logs are older than the horizon, so they can't be part of a
+    # range starting after it or of a full page of newer daily logs
+    horizon = archive_horizon()
+    if start_date and start_date >= horizon:
+        return False
+    return not (limit and count >= limit and oldest and oldest >= horizon)
+
+
+async def get_logs(
+    db,
+    user_id: ObjectId,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    symptom_id: Optional[str] = None,
+    min_severity: Optional[int] = None,
+    severity_level: Optional[str] = None,
+    limit: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """
+    Get a user's logs newest first, filtered as in the log listing.
+
+    Args:
+        db: Database instance
+        user_id: Owner of the logs
+        start_date: Optional first date to include (YYYY-MM-DD)
+        end_date: Optional last date to include (YYYY-MM-DD)
+        symptom_id: Optional catalog ID of a symptom the logs must have
+        min_severity: Optional minimum severity of that (or any) symptom
+        severity_level: Optional overall severity level of the day
+        limit: Optional maximum number of logs, newest first
+
+    Returns:
+        Log documents read with LIST_PROJECTION
+    """
+    query, predicate = _list_filters(user_id, start_date, end_date, symptom_id, min_severity, severity_level)
+    cursor = db.symptom_logs.find(query, LIST_PROJECTION).sort("date", -1)
+    if limit:
+        cursor = cursor.limit(limit)
+    logs = await cursor.to_list(length=None)
+
+    if not _needs_archive(start_date, limit, len(logs), logs[-1]["date"] if logs else None):
+        return logs
+    archived = await get_archived_logs(
+        db, user_id, start_date, end_date, LIST_PROJECTION,
+        descending=True, limit=limit, predicate=predicate
+    )
+    return merge_logs(logs, archived, descending=True, limit=limit)
+
+
+async def get_logs_summary(
+    db,
+    user_id: ObjectId,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    symptom_id: Optional[str] = None,
+    min_severity: Optional[int] = None,
+    severity_level: Optional[str] = None,
+    limit: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Summarize the logs get_logs() returns, for use in an ETag.
+    Any write to those logs changes the count, the newest updated_at or the
+    date bounds, without the logs themselves being read out. Where archived
+    months may be part of the result, their versions are included.
+
+    Args:
+        db: Database instance
+        user_id: Owner of the logs
+        start_date: Optional first date to include (YYYY-MM-DD)
+        end_date: Optional last date to include (YYYY-MM-DD)
+        symptom_id: Optional catalog ID of a symptom the logs must have
+        min_severity: Optional minimum severity of that (or any) symptom
+        severity_level: Optional overall severity level of the day
+        limit: Optional limit applied to the newest logs, as in the listing
+
+    Returns:
+        Dictionary with count, last_updated, newest, oldest and archive keys
+    """
+    query, _ = _list_filters(user_id, start_date, end_date, symptom_id, min_severity, severity_level)
+    pipeline: List[Dict[str, Any]] = [{"$match": query}, {"$sort": {"date": -1}}]
+    if limit:
+        pipeline.append({"$limit": limit})
+    pipeline += [
+        {"$project": {"_id": 0, "date": 1, "updated_at": 1}},
+        {"$group": {
+            "_id": None,
+            "count": {"$sum": 1},
+            "last_updated": {"$max": "$updated_at"},
+            "newest": {"$max": "$date"},
+            "oldest": {"$min": "$date"},
+        }},
+    ]
+    rows = await db.symptom_logs.aggregate(pipeline).to_list(length=1)
+    summary = {"count": 0, "last_updated": None, "newest": None, "oldest": None}
+    if rows:
+        rows[0].pop("_id")
+        summary.update(rows[0])
+
+    summary["archive"] = []
+    if _needs_archive(start_date, limit, summary["count"], summary["oldest"]):
+        summary["archive"] = await get_archive_versions(db, user_id, start_date, end_date)
+    return summary
+
+
+async def get_logs_page(
+    db,
+    user_id: ObjectId,
+    limit: int,
+    after_date: Optional[str] = None,
+    ascending: bool = False
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Get one page of a user's logs ordered by date.
+    Pages continue from the last date of the previous one (keyset
+    pagination), so every page is a bounded range read on the
+    (user_id, date) index no matter how deep it is. Pages reaching into
+    archived months read the buckets next to the cursor.
+
+    Args:
+        db: Database instance
+        user_id: Owner of the logs
+        limit: Maximum number of logs in the page
+        after_date: Date of the last log of the previous page, if any
+        ascending: Oldest first instead of newest first
+
+    Returns:
+        Tuple of the page's log documents and the date to continue after,
+        or None when there are no more logs
+    """
+    query: Dict[str, Any] = {"user_id": user_id}
+    if after_date:
+        query["date"] = {"$gt" if ascending else "$lt": after_date}
+
+    # One extra log tells whether another page follows
+    cursor = db.symptom_logs.find(query).sort("date", 1 if ascending else -1).limit(limit + 1)
+    logs = await cursor.to_list(length=None)
+
+    if ascending:
+        needs_archive = not after_date or after_date < archive_horizon()
+    else:
+        needs_archive = _needs_archive(None, limit + 1, len(logs), logs[-1]["date"] if logs else None)
+    if needs_archive:
+        start_date, end_date = None, None
+        if after_date and ascending:
+            start_date = (date_type.fromisoformat(after_date) + timedelta(days=1)).isoformat()
+        elif after_date:
+            end_date = (date_type.fromisoformat(after_date) - timedelta(days=1)).isoformat()
+        archived = await get_archived_logs(
+            db, user_id, start_date, end_date, descending=not ascending, limit=limit + 1
+        )
+        logs = merge_logs(logs, archived, descending=not ascending, limit=limit + 1)
+
+    if len(logs) > limit:
+        logs = logs[:limit]
+        return logs, logs[-1]["date"]
+    return logs, None
+
+
+async def get_changes(
+    db,
+    user_id: ObjectId,
+    since: Optional[datetime] = None
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], datetime]:
+    """
+    Get a user's logs written and deleted after a watermark.
+    Both are range reads on (user_id, updated_at) and (user_id, deleted_at)
+    indexes, so a sync costs the number of changes, not the history.
+    Archived logs are only part of a full sync: they were not updated
+    within the archive age, which is at least the tombstone TTL.
+
+    Args:
+        db: Database instance
+        user_id: Owner of the logs
+        since: Watermark of the previous sync (naive UTC); None returns
+            every log and no deletions
+
+    Returns:
+        Tuple of changed log documents oldest change first, tombstones of
+        deleted logs, and the watermark to pass on the next sync
+    """
+    watermark = datetime.utcnow() - CHANGES_OVERLAP
+
+    query: Dict[str, Any] = {"user_id": user_id}
+    if since:
+        query["updated_at"] = {"$gt": since}
+    logs = await db.symptom_logs.find(query).sort("updated_at", 1).to_list(length=None)
+    if not since:
+        logs = sorted(
+            merge_logs(logs, await get_archived_logs(db, user_id)),
+            key=lambda log: log["updated_at"]
+        )
+
+    tombstones: List[Dict[str, Any]] = []
+    if since:
+        # A date deleted and then logged again is reported only as changed
+        changed_dates = {log["date"] for log in logs}
+        async for tombstone in db.symptom_log_tombstones.find(
+            {"user_id": user_id, "deleted_at": {"$gt": since}}
+        ).sort("deleted_at", 1):
+            if tombstone["date"] not in changed_dates:
+                tombstones.append(tombstone)
+
+    return logs, tombstones, watermark
+
+
+def _csv_cell(value: Any) -> Any:
+    # Keep spreadsheet apps from evaluating user-entered text as a formula
+    if isinstance(value, str) and value[:1] in ("=", "+", "-", "@"):
+        return "'" + value
+    return value
+
+
+def _format_ndjson(logs: List[Dict[str, Any]]) -> str:
+    return "".join(
+        json.dumps({
+            "date": log["date"],
+            "symptoms": log.get("symptoms", []),
+            "overall_notes": log.get("overall_notes"),
+            "created_at": log["created_at"].isoformat() if log.get("created_at") else None,
+            "updated_at": log["updated_at"].isoformat() if log.get("updated_at") else None,
+        }) + "\n"
+        for log in logs
+    )
+
+
+def _format_csv(logs: List[Dict[str, Any]]) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for log in logs:
+        created_at = log["created_at"].isoformat() if log.get("created_at") else ""
+        updated_at = log["updated_at"].isoformat() if log.get("updated_at") else ""
+        # One row per symptom; days logged without symptoms still get a row
+        for symptom in log.get("symptoms") or [{}]:
+            writer.writerow([_csv_cell(value) for value in (
+                log["date"],
+                symptom.get("name", ""),
+                symptom.get("severity", ""),
+                symptom.get("notes") or "",
+                log.get("overall_notes") or "",
+                created_at,
+                updated_at,
+            )])
+    return buffer.getvalue()
+
+
+async def export_logs(
+    db,
+    user: UserInDB,
+    export_format: str,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None
+) -> AsyncIterator[str]:
+    """
+    Stream a user's symptom logs, oldest first, as NDJSON or CSV.
+    Logs are read from the cursor and emitted a batch at a time, so memory
+    use does not grow with the length of the history.
+
+    Args:
+        db: Database instance
+        user: Owner of the logs
+        export_format: "ndjson" or "csv"
+        start_date: Optional first date to include (YYYY-MM-DD)
+        end_date: Optional last date to include (YYYY-MM-DD)
+
+    Yields:
+        Chunks of the export document
+    """
+    if export_format == "csv":
+        formatter = _format_csv
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow(CSV_COLUMNS)
+        yield buffer.getvalue()
+    else:
+        formatter = _format_ndjson
+
+    batch: List[Dict[str, Any]] = []
+    async for log in iter_logs(
+        db, ObjectId(user.id), start_date, end_date, EXPORT_PROJECTION, batch_size=EXPORT_BATCH_SIZE
+    ):
+        batch.append(log)
+        if len(batch) >= EXPORT_BATCH_SIZE:
+            yield formatter(batch)
+            batch = []
+    if batch:
+        yield formatter(batch)
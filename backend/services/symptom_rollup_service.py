@@ -0,0 +1,265 @@
+"""
+Per-user weekly and monthly symptom summaries.
+
+The symptom_rollups collection holds one document per user, granularity
+and period (ISO week "2024-W03" or month "2024-01"). Each symptom in the
+period is stored under a key derived from its name, with its count,
+severity sum and max, and a map of the days it was logged to their
+severity. Log writes apply the difference between the previous and the
+new version of a log, so summaries stay current without rescanning the
+history. rebuild_rollups() recomputes them from the logs to repair drift.
+"""
+import hashlib
+import logging
+from collections import defaultdict
+from datetime import date as date_type, datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import ReplaceOne, UpdateOne
+
+from services.symptom_archive_service import iter_logs
+
+logger = logging.getLogger(__name__)
+
+GRANULARITIES = ("week", "month")
+
+# (before, after) versions of one log; None where the log did not exist
+LogChange = Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]
+
+
+def period_of(date: str, granularity: str) -> str:
+    """
+    Get the week or month a log date belongs to.
+
+    Args:
+        date: Log date (YYYY-MM-DD)
+        granularity: "week" (ISO week) or "month"
+
+    Returns:
+        Period key, e.g. "2024-W03" or "2024-01"
+    """
+    if granularity == "month":
+        return date[:7]
+    year, week, _ = date_type.fromisoformat(date).isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def symptom_key(name: str) -> str:
+    """
+    Get the field name a symptom is stored under.
+    Names are user text and may contain '.' or '$', so they are hashed.
+
+    Args:
+        name: Symptom name
+
+    Returns:
+        Field-safe key for the symptom
+    """
+    return hashlib.sha1(name.encode("utf-8")).hexdigest()[:16]
+
+
+def _severities(log: Optional[Dict[str, Any]]) -> Dict[str, int]:
+    # A symptom listed twice on one day counts once, at its highest severity
+    severities: Dict[str, int] = {}
+    for symptom in (log or {}).get("symptoms") or []:
+        name = symptom["name"]
+        severities[name] = max(severities.get(name, 0), symptom["severity"])
+    return severities
+
+
+def _rollup_updates(
+    user_id: ObjectId,
+    changes: Iterable[LogChange],
+    now: datetime
+) -> Tuple[List[UpdateOne], List[Dict[str, Any]]]:
+    # Accumulate per rollup document so each one gets a single update
+    docs: Dict[Tuple[str, str], Dict[str, Any]] = defaultdict(
+        lambda: {"$inc": {}, "$set": {}, "$unset": {}, "$max": {}, "shrunk": False}
+    )
+
+    for before, after in changes:
+        date = (after or before)["date"]
+        old = _severities(before)
+        new = _severities(after)
+        for name in set(old) | set(new):
+            old_severity, new_severity = old.get(name), new.get(name)
+            if old_severity == new_severity:
+                continue
+            key = symptom_key(name)
+            for granularity in GRANULARITIES:
+                doc = docs[(granularity, period_of(date, granularity))]
+                path = f"symptoms.{key}"
+                inc = doc["$inc"]
+                inc[f"{path}.count"] = inc.get(f"{path}.count", 0) + (
+                    (new_severity is not None) - (old_severity is not None)
+                )
+                inc[f"{path}.sum"] = inc.get(f"{path}.sum", 0) + (new_severity or 0) - (old_severity or 0)
+                if new_severity is None:
+                    doc["$unset"][f"{path}.days.{date}"] = ""
+                else:
+                    doc["$set"][f"{path}.name"] = name
+                    doc["$set"][f"{path}.days.{date}"] = new_severity
+                    doc["$max"][f"{path}.max"] = max(new_severity, doc["$max"].get(f"{path}.max", 0))
+                if new_severity is None or (old_severity is not None and new_severity < old_severity):
+                    # The max may have been removed; recomputed in a second pass
+                    doc["shrunk"] = True
+
+    updates = []
+    shrunk = []
+    for (granularity, period), doc in docs.items():
+        query = {"user_id": user_id, "granularity": granularity, "period": period}
+        update = {op: fields for op, fields in doc.items() if op != "shrunk" and fields}
+        update.setdefault("$set", {})["updated_at"] = now
+        updates.append(UpdateOne(query, update, upsert=True))
+        if doc["shrunk"]:
+            shrunk.append(query)
+    return updates, shrunk
+
+
+def _rollup_documents(
+    user_id: ObjectId,
+    logs: Iterable[Dict[str, Any]],
+    now: datetime
+) -> List[Dict[str, Any]]:
+    # Whole rollup documents for a user's logs, as the deltas would build them
+    docs: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    for log in logs:
+        date = log["date"]
+        for name, severity in _severities(log).items():
+            key = symptom_key(name)
+            for granularity in GRANULARITIES:
+                period = period_of(date, granularity)
+                doc = docs.setdefault((granularity, period), {
+                    "user_id": user_id, "granularity": granularity, "period": period,
+                    "symptoms": {}, "updated_at": now,
+                })
+                symptom = doc["symptoms"].setdefault(key, {"name": name, "count": 0, "sum": 0, "max": 0, "days": {}})
+                symptom["count"] += 1
+                symptom["sum"] += severity
+                symptom["max"] = max(symptom["max"], severity)
+                symptom["days"][date] = severity
+    return list(docs.values())
+
+
+async def _settle(db, queries: List[Dict[str, Any]]) -> None:
+    # Recompute max from the days map and drop symptoms no longer logged
+    if not queries:
+        return
+    async for rollup in db.symptom_rollups.find({"$or": queries}):
+        update: Dict[str, Dict[str, Any]] = {"$set": {}, "$unset": {}}
+        remaining = 0
+        for key, symptom in (rollup.get("symptoms") or {}).items():
+            days = symptom.get("days") or {}
+            if symptom.get("count", 0) <= 0 or not days:
+                update["$unset"][f"symptoms.{key}"] = ""
+            else:
+                update["$set"][f"symptoms.{key}.max"] = max(days.values())
+                remaining += 1
+
+        if remaining == 0:
+            await db.symptom_rollups.delete_one({"_id": rollup["_id"]})
+        else:
+            await db.symptom_rollups.update_one(
+                {"_id": rollup["_id"]},
+                {op: fields for op, fields in update.items() if fields}
+            )
+
+
+async def apply_log_changes(db, user_id: ObjectId, changes: List[LogChange]) -> None:
+    """
+    Update a user's rollups for written or deleted logs.
+
+    Args:
+        db: Database instance
+        user_id: Owner of the logs
+        changes: (before, after) pairs of log documents; before is None for
+            new logs and after is None for deleted ones
+    """
+    updates, shrunk = _rollup_updates(user_id, changes, datetime.utcnow())
+    if not updates:
+        return
+    await db.symptom_rollups.bulk_write(updates, ordered=False)
+    await _settle(db, shrunk)
+
+
+async def get_rollups(
+    db,
+    user_id: ObjectId,
+    granularity: str,
+    start_period: Optional[str] = None,
+    end_period: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Get a user's rollups for a range of periods.
+
+    Args:
+        db: Database instance
+        user_id: Owner of the rollups
+        granularity: "week" or "month"
+        start_period: Optional first period to include
+        end_period: Optional last period to include
+
+    Returns:
+        Rollup documents sorted by period
+    """
+    query: Dict[str, Any] = {"user_id": user_id, "granularity": granularity}
+    if start_period or end_period:
+        query["period"] = {}
+        if start_period:
+            query["period"]["$gte"] = start_period
+        if end_period:
+            query["period"]["$lte"] = end_period
+    cursor = db.symptom_rollups.find(query).sort("period", 1)
+    return await cursor.to_list(length=None)
+
+
+async def rebuild_rollups(db, user_id: ObjectId) -> int:
+    """
+    Recompute a user's rollups from their symptom logs.
+    Each period is replaced in place and only periods without logs are
+    deleted afterwards, so readers never see the user's rollups missing.
+
+    Args:
+        db: Database instance
+        user_id: User whose rollups are rebuilt
+
+    Returns:
+        Number of rollup documents written
+    """
+    logs = [log async for log in iter_logs(db, user_id, projection={"date": 1, "symptoms": 1})]
+    docs = _rollup_documents(user_id, logs, datetime.utcnow())
+    if docs:
+        await db.symptom_rollups.bulk_write([
+            ReplaceOne(
+                {"user_id": user_id, "granularity": doc["granularity"], "period": doc["period"]},
+                doc,
+                upsert=True
+            )
+            for doc in docs
+        ], ordered=False)
+
+    for granularity in GRANULARITIES:
+        periods = [doc["period"] for doc in docs if doc["granularity"] == granularity]
+        await db.symptom_rollups.delete_many({
+            "user_id": user_id, "granularity": granularity, "period": {"$nin": periods}
+        })
+    return len(docs)
+
+
+async def rebuild_all_rollups(db) -> int:
+    """
+    Recompute the rollups of every user with symptom logs, daily or archived.
+
+    Args:
+        db: Database instance
+
+    Returns:
+        Number of users rebuilt
+    """
+    user_ids = set(await db.symptom_logs.distinct("user_id"))
+    user_ids.update(await db.symptom_log_archive.distinct("user_id"))
+    for user_id in user_ids:
+        count = await rebuild_rollups(db, user_id)
+        logger.info(f"Rebuilt {count} symptom rollups for user {user_id}")
+    return len(user_ids)
@@ -0,0 +1,104 @@
+"""
+Day-level severity fields derived from a log's symptoms.
+
+Every log write stores the mean and max symptom severity, the number of
+symptoms and a mild/moderate/severe level next to the symptoms, so reads
+(calendar events, heatmaps, severity filters) use the stored values and
+"severe days" is a range on the (user_id, severity_level, date) index.
+"""
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+SEVERITY_LEVELS = ("mild", "moderate", "severe")
+
+# Lowest mean symptom severity of each level above mild
+SEVERE_MEAN = 4.0
+MODERATE_MEAN = 2.5
+
+# Logs are rewritten this many at a time by the backfill
+BACKFILL_BATCH_SIZE = 500
+
+
+def severity_level(mean: float) -> str:
+    """
+    Get the overall severity level of a day.
+
+    Args:
+        mean: Mean symptom severity, 0 if no symptoms
+
+    Returns:
+        'mild', 'moderate' or 'severe'
+    """
+    if mean >= SEVERE_MEAN:
+        return "severe"
+    if mean >= MODERATE_MEAN:
+        return "moderate"
+    return "mild"
+
+
+def severity_fields(symptoms: Optional[Iterable[Dict[str, Any]]]) -> Dict[str, Any]:
+    """
+    Compute the severity fields stored with a log.
+
+    Args:
+        symptoms: The log's symptom dictionaries
+
+    Returns:
+        Dictionary with severity_mean, severity_max, symptom_count and
+        severity_level; means and maxima are 0 for days without symptoms
+    """
+    severities = [symptom.get("severity", 0) for symptom in symptoms or []]
+    mean = sum(severities) / len(severities) if severities else 0.0
+    return {
+        "severity_mean": mean,
+        "severity_max": max(severities, default=0),
+        "symptom_count": len(severities),
+        "severity_level": severity_level(mean),
+    }
+
+
+async def backfill_severity_fields(db, batch_size: int = BACKFILL_BATCH_SIZE) -> int:
+    """
+    Store severity fields on logs written before they existed.
+    Logs are read in _id order a batch at a time; logs that already have
+    the fields are skipped, so the backfill can be stopped and run again.
+    Updated logs get a new updated_at, so caches and delta sync clients
+    pick up the fields.
+
+    Args:
+        db: Database instance
+        batch_size: Logs read and written per batch
+
+    Returns:
+        Number of logs updated
+    """
+    updated = 0
+    last_id = None
+    while True:
+        query: Dict[str, Any] = {"severity_level": {"$exists": False}}
+        if last_id:
+            query["_id"] = {"$gt": last_id}
+        batch = await db.symptom_logs.find(query, {"symptoms": 1}).sort("_id", 1).limit(batch_size).to_list(length=None)
+        if not batch:
+            break
+        last_id = batch[-1]["_id"]
+
+        # updated_at is bumped so listing ETags change and delta sync
+        # clients fetch the new fields. Logs rewritten since they were
+        # read already have the fields and are left alone
+        now = datetime.utcnow()
+        await db.symptom_logs.bulk_write([
+            UpdateOne(
+                {"_id": log["_id"], "severity_level": {"$exists": False}},
+                {"$set": {**severity_fields(log.get("symptoms")), "updated_at": now}}
+            )
+            for log in batch
+        ], ordered=False)
+        updated += len(batch)
+        logger.info(f"Backfilled severity fields through log {last_id} ({updated} logs updated)")
+    return updated
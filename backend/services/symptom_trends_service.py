@@ -0,0 +1,115 @@
+"""
+Service for symptom trend statistics.
+Trends are computed in MongoDB with an aggregation pipeline, so only the
+per-period summaries leave the database instead of every log. Ranges
+reaching into archived months union in the archive's logs.
+"""
+from typing import Any, Dict, List, Optional
+
+from bson import ObjectId
+
+from services.symptom_archive_service import archive_horizon
+from services.symptom_catalog import symptom_id
+
+GRANULARITIES = ("day", "week", "month")
+
+# Priority of a log's source when a date is both daily and archived; lower wins
+SOURCE_DAILY = 0
+SOURCE_ARCHIVE = 1
+
+
+def _period_expression(granularity: str) -> Any:
+    # Log dates are YYYY-MM-DD strings, so days and months are prefixes
+    if granularity == "day":
+        return "$date"
+    if granularity == "month":
+        return {"$substrCP": ["$date", 0, 7]}
+    # A date stored before dates were validated may not parse; its period
+    # is null and the bucket is dropped rather than failing the pipeline
+    return {
+        "$dateToString": {
+            "format": "%G-W%V",
+            "date": {"$dateFromString": {"dateString": "$date", "format": "%Y-%m-%d", "onError": None}}
+        }
+    }
+
+
+def _archive_union(user_id: ObjectId, match: Dict[str, Any], project: Dict[str, Any]) -> List[Dict[str, Any]]:
+    # Add archived months' logs to the daily ones. A date in both keeps the
+    # daily log: each log is tagged with its source, and sorting by it
+    # before grouping makes the daily log the group's $first
+    return [
+        {"$addFields": {"source": SOURCE_DAILY}},
+        {"$unionWith": {"coll": "symptom_log_archive", "pipeline": [
+            {"$match": {
+                "user_id": user_id,
+                "month": {"$gte": match["date"]["$gte"][:7], "$lte": match["date"]["$lte"][:7]},
+            }},
+            {"$unwind": "$days"},
+            {"$replaceRoot": {"newRoot": "$days"}},
+            {"$match": {field: value for field, value in match.items() if field != "user_id"}},
+            project,
+            {"$addFields": {"source": SOURCE_ARCHIVE}},
+        ]}},
+        {"$sort": {"date": 1, "source": 1}},
+        {"$group": {"_id": "$date", "log": {"$first": "$$ROOT"}}},
+        {"$replaceRoot": {"newRoot": "$log"}},
+    ]
+
+
+async def get_trends(
+    db,
+    user_id: ObjectId,
+    granularity: str,
+    start_date: str,
+    end_date: str,
+    symptom: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Get count, mean and max severity per period and symptom.
+
+    Args:
+        db: Database instance
+        user_id: Owner of the logs
+        granularity: "day", "week" (ISO weeks) or "month"
+        start_date: First date to include (YYYY-MM-DD)
+        end_date: Last date to include (YYYY-MM-DD)
+        symptom: Optional symptom name or catalog ID to restrict the result to
+
+    Returns:
+        Buckets sorted by period and symptom, each with period, symptom,
+        count, mean_severity and max_severity keys
+    """
+    # Leading match on user_id and date is served by the (user_id, date)
+    # index, or (user_id, symptoms.id, date) for a single symptom
+    match: Dict[str, Any] = {"user_id": user_id, "date": {"$gte": start_date, "$lte": end_date}}
+    if symptom:
+        match["symptoms.id"] = symptom_id(symptom)
+    project = {"$project": {"_id": 0, "date": 1, "symptoms.id": 1, "symptoms.name": 1, "symptoms.severity": 1}}
+    pipeline: List[Dict[str, Any]] = [{"$match": match}, project]
+    if start_date < archive_horizon():
+        pipeline += _archive_union(user_id, match, project)
+    pipeline.append({"$unwind": "$symptoms"})
+    if symptom:
+        pipeline.append({"$match": {"symptoms.id": match["symptoms.id"]}})
+    pipeline += [
+        {"$group": {
+            "_id": {"period": _period_expression(granularity), "symptom": "$symptoms.name"},
+            "count": {"$sum": 1},
+            "mean_severity": {"$avg": "$symptoms.severity"},
+            "max_severity": {"$max": "$symptoms.severity"},
+        }},
+        {"$match": {"_id.period": {"$ne": None}}},
+        {"$sort": {"_id.period": 1, "_id.symptom": 1}},
+    ]
+
+    buckets = []
+    async for row in db.symptom_logs.aggregate(pipeline):
+        buckets.append({
+            "period": row["_id"]["period"],
+            "symptom": row["_id"]["symptom"],
+            "count": row["count"],
+            "mean_severity": round(row["mean_severity"], 2),
+            "max_severity": row["max_severity"],
+        })
+    return buckets
@@ -0,0 +1,162 @@
+"""
+Shared fixtures for the backend test suite.
+
+Tests run the FastAPI app against an in-memory MongoDB (mongomock-motor),
+so no database or Google account is needed:
+
+    cd backend
+    pip install -r requirements.txt -r requirements-dev.txt
+    python -m pytest -q
+"""
+import asyncio
+import os
+import sys
+
+from cryptography.fernet import Fernet
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Settings are read once, so the environment is set before the app is imported
+os.environ.update(
+    MONGODB_URI="mongodb://localhost/altheia_test",
+    JWT_SECRET="test-secret",
+    ENCRYPTION_KEY=Fernet.generate_key().decode(),
+    GEMINI_API_KEY="test",
+    GOOGLE_CLIENT_ID="test",
+    GOOGLE_CLIENT_SECRET="test",
+    GOOGLE_REDIRECT_URI="http://localhost/callback",
+    CALENDAR_SYNC_WORKERS="0",
+)
+
+import mongomock.collection
+import pytest
+from fastapi.testclient import TestClient
+from mongomock_motor import AsyncMongoMockClient
+
+
+def _ignore_unsupported_options(add):
+    # mongomock's bulk operations don't take the sort and hint options that
+    # pymongo passes for every update
+    def wrapper(self, *args, **kwargs):
+        kwargs.pop("sort", None)
+        if kwargs.get("hint") is None:
+            kwargs.pop("hint", None)
+        return add(self, *args, **kwargs)
+    return wrapper
+
+
+for _name in ("add_update", "add_replace", "add_delete"):
+    if hasattr(mongomock.collection.BulkOperationBuilder, _name):
+        setattr(
+            mongomock.collection.BulkOperationBuilder,
+            _name,
+            _ignore_unsupported_options(getattr(mongomock.collection.BulkOperationBuilder, _name))
+        )
+
+
+def _number_upserts_by_position(execute):
+    # mongomock numbers upserted operations 0, 1, ... instead of reporting
+    # their position in the bulk write as MongoDB does
+    def wrapper(self, *args, **kwargs):
+        positions = []
+
+        def track(position, operation):
+            def tracked():
+                result = operation()
+                if result.get("upserted"):
+                    positions.append(position)
+                return result
+            tracked.__name__ = operation.__name__
+            return tracked
+
+        self.executors = [track(i, operation) for i, operation in enumerate(self.executors)]
+        result = execute(self, *args, **kwargs)
+        for upserted, position in zip(result.get("upserted", []), positions):
+            upserted["index"] = position
+        return result
+    return wrapper
+
+
+mongomock.collection.BulkOperationBuilder.execute = _number_upserts_by_position(
+    mongomock.collection.BulkOperationBuilder.execute
+)
+
+import database
+import main
+from services.symptom_heatmap_service import heatmap_cache
+from services.symptom_insights_service import insights_cache
+from utils.security import user_cache
+
+
+def run(coroutine):
+    """Run a coroutine to completion from a synchronous test."""
+    return asyncio.run(coroutine)
+
+
+@pytest.fixture
+def db():
+    """A fresh in-memory database with the app's indexes."""
+    database.client = AsyncMongoMockClient()
+    run(database.init_indexes(database.client))
+    for cache in (user_cache, heatmap_cache, insights_cache):
+        cache.clear()
+    return run(database.get_database())
+
+
+@pytest.fixture
+def client(db):
+    """Test client for the app, backed by the db fixture."""
+    return TestClient(main.app)
+
+
+@pytest.fixture
+def auth_headers(client):
+    """Authorization headers of a newly signed up user."""
+    response = client.post(
+        "/api/auth/signup",
+        json={"email": "test@example.com", "name": "Test", "password": "password123"}
+    )
+    assert response.status_code == 201, response.text
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+@pytest.fixture
+def user(db, auth_headers):
+    """The signed up user's document."""
+    return run(db.users.find_one({"email": "test@example.com"}))
+
+
+@pytest.fixture
+def fake_calendar(monkeypatch, db, user):
+    """
+    Connect the test user to Google Calendar, served by a FakeCalendarHttp.
+    Token refreshes and retry sleeps are stubbed out.
+    """
+    from datetime import datetime, timedelta
+
+    from googleapiclient.discovery import build
+
+    import services.google_calendar_service as google_calendar_service
+    from utils.encryption import encrypt_token
+    from tests.fake_calendar import FakeCalendarHttp
+
+    fake = FakeCalendarHttp()
+
+    def refresh(credentials, request):
+        credentials.token = "access-token"
+        credentials.expiry = datetime.utcnow() + timedelta(hours=1)
+
+    monkeypatch.setattr(
+        google_calendar_service, "build",
+        lambda *args, **kwargs: build("calendar", "v3", http=fake, static_discovery=True)
+    )
+    monkeypatch.setattr(google_calendar_service.Credentials, "refresh", refresh)
+    monkeypatch.setattr(google_calendar_service.time, "sleep", lambda seconds: None)
+    google_calendar_service._credentials_cache.clear()
+
+    run(db.users.update_one({"_id": user["_id"]}, {"$set": {
+        "google_auth": {"encrypted_refresh_token": encrypt_token("refresh-token")},
+        "calendar_settings": {"is_enabled": True, "calendar_id": "calendar"},
+    }}))
+    user_cache.clear()
+    return fake
@@ -0,0 +1,176 @@
+"""
+In-memory stand-in for the Google Calendar v3 HTTP API.
+
+FakeCalendarHttp replaces the httplib2.Http object the discovery client
+sends requests through, so the real googleapiclient request building,
+batching and error handling run against it. It stores events, answers
+single and batch insert/update/delete/list requests, including incremental
+listings by sync token, and can inject rate-limit responses and latency.
+"""
+import itertools
+import json
+import re
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+
+class FakeResponse(dict):
+    """httplib2-style response: headers as a dictionary plus a status."""
+
+    def __init__(self, status: int, headers: Optional[Dict[str, str]] = None):
+        super().__init__(headers or {})
+        self.status = status
+        self.reason = "OK" if status < 400 else "Error"
+        self["status"] = str(status)
+
+
+def rate_limit_error(reason: str = "rateLimitExceeded") -> Dict[str, Any]:
+    """Body of a Calendar API rate limit error."""
+    return {"error": {"message": "Rate Limit Exceeded", "errors": [{"reason": reason}]}}
+
+
+class FakeCalendarHttp:
+    """Fake httplib2.Http that understands single and batch Calendar requests."""
+
+    def __init__(self, latency: float = 0.0):
+        """
+        Initialize the fake.
+
+        Args:
+            latency: Seconds each HTTP round trip takes
+        """
+        self.latency = latency
+        self.events: Dict[str, Dict[str, Any]] = {}
+        # HTTP round trips, counting a batch as one
+        self.requests = 0
+        # API calls as (method, event ID or None), batch items included
+        self.calls: List[Tuple[str, Optional[str]]] = []
+        # Error responses to return before handling writes, as (status, body, headers)
+        self.failures: List[Tuple[int, Dict[str, Any], Dict[str, str]]] = []
+        self._ids = itertools.count()
+        # Sequence number of each event's last change, deletes included; a
+        # sync token is the sequence number it was issued at
+        self.changes: Dict[str, int] = {}
+        self.deleted: Dict[str, Dict[str, Any]] = {}
+        self._sequence = 0
+        self._oldest_sync_token = 0
+
+    def fail_next(self, status: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None, times: int = 1) -> None:
+        """Queue error responses for the next writes."""
+        self.failures.extend([(status, body, headers or {})] * times)
+
+    def add(self, event: Dict[str, Any]) -> str:
+        """Create an event as if it was made outside the app; returns its ID."""
+        event = {**event, "id": f"event{next(self._ids)}"}
+        self.events[event["id"]] = event
+        self._changed(event["id"])
+        return event["id"]
+
+    def edit(self, event_id: str, **fields: Any) -> None:
+        """Change an event as if the user edited it in Google Calendar."""
+        self.events[event_id].update(fields)
+        self._changed(event_id)
+
+    def delete(self, event_id: str) -> None:
+        """Delete an event as if the user removed it in Google Calendar."""
+        self.deleted[event_id] = self.events.pop(event_id)
+        self._changed(event_id)
+
+    def expire_sync_tokens(self) -> None:
+        """Make every sync token issued so far answer 410 Gone."""
+        self._sequence += 1
+        self._oldest_sync_token = self._sequence
+
+    def _changed(self, event_id: str) -> None:
+        self._sequence += 1
+        self.changes[event_id] = self._sequence
+
+    def _handle(self, method: str, uri: str, body: str) -> Tuple[int, Optional[Dict[str, Any]], Dict[str, str]]:
+        event_id = uri.split("/events/")[1].split("?")[0] if "/events/" in uri else None
+        self.calls.append((method, event_id))
+        if method in ("POST", "PUT") and self.failures:
+            return self.failures.pop(0)
+        if method == "POST" and re.search(r"/events(\?|$)", uri):
+            event = json.loads(body)
+            event["id"] = f"event{next(self._ids)}"
+            self.events[event["id"]] = event
+            self._changed(event["id"])
+            return 200, event, {}
+        if method == "PUT" and event_id:
+            if event_id not in self.events:
+                return 404, {"error": {"message": "Not Found"}}, {}
+            event = json.loads(body)
+            event["id"] = event_id
+            self.events[event_id] = event
+            self._changed(event_id)
+            return 200, event, {}
+        if method == "DELETE" and event_id:
+            if event_id in self.events:
+                self.delete(event_id)
+            return 204, None, {}
+        if method == "GET" and "/events" in uri:
+            sync_token = parse_qs(urlparse(uri).query).get("syncToken", [None])[0]
+            if sync_token and int(sync_token.split("-")[1]) < self._oldest_sync_token:
+                return 410, {"error": {"message": "Sync token is no longer valid", "errors": [
+                    {"reason": "fullSyncRequired"}
+                ]}}, {}
+            return 200, {"items": self._list(uri), "nextSyncToken": f"token-{self._sequence}"}, {}
+        return 404, {"error": {"message": "Not Found"}}, {}
+
+    def _list(self, uri: str) -> List[Dict[str, Any]]:
+        items = list(self.events.values())
+        query = parse_qs(urlparse(uri).query)
+        if "syncToken" in query:
+            # Events changed since the token; deleted ones come back cancelled
+            since = int(query["syncToken"][0].split("-")[1])
+            items = [
+                self.events.get(event_id) or {**self.deleted[event_id], "status": "cancelled"}
+                for event_id, sequence in self.changes.items() if sequence > since
+            ]
+        for match in query.get("privateExtendedProperty", []):
+            key, value = match.split("=", 1)
+            items = [
+                event for event in items
+                if event.get("extendedProperties", {}).get("private", {}).get(key) == value
+            ]
+        return items
+
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        """Answer one HTTP request, as httplib2.Http.request does."""
+        self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if isinstance(body, bytes):
+            body = body.decode()
+        if uri.endswith("/batch/calendar/v3"):
+            return self._batch(body, headers)
+        status, data, response_headers = self._handle(method, uri, body)
+        return (
+            FakeResponse(status, {"content-type": "application/json", **response_headers}),
+            json.dumps(data).encode() if data is not None else b""
+        )
+
+    def _batch(self, body: str, headers: Dict[str, str]):
+        boundary = headers["content-type"].split("boundary=")[1].strip('"')
+        response_boundary = "batch" + uuid.uuid4().hex
+        parts = []
+        for part in body.split("--" + boundary)[1:-1]:
+            head, inner = re.split(r"\r?\n\r?\n", part, maxsplit=1)
+            content_id = re.search(r"Content-ID: <(.*)>", head, re.I).group(1)
+            request_line, rest = inner.split("\n", 1)
+            method, path, _ = request_line.strip().split(" ")
+            request_body = re.split(r"\r?\n\r?\n", rest, maxsplit=1)[1] if re.search(r"\r?\n\r?\n", rest) else ""
+            status, data, _ = self._handle(method, path, request_body)
+            payload = json.dumps(data) if data is not None else ""
+            parts.append(
+                f"--{response_boundary}\r\nContent-Type: application/http\r\n"
+                f"Content-ID: <response-{content_id}>\r\n\r\n"
+                f"HTTP/1.1 {status} X\r\nContent-Type: application/json\r\n\r\n{payload}\r\n"
+            )
+        content = "".join(parts) + f"--{response_boundary}--"
+        return (
+            FakeResponse(200, {"content-type": f"multipart/mixed; boundary={response_boundary}"}),
+            content.encode()
+        )
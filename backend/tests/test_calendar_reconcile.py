@@ -0,0 +1,121 @@
+import pytest
+from bson import ObjectId
+
+from models.user import UserInDB
+from services import calendar_sync_service
+from services.calendar_reconcile_service import reconcile_calendar
+from tests.conftest import run
+
+DATES = ["2024-01-01", "2024-01-02", "2024-01-03"]
+
+
+@pytest.fixture
+def synced(client, auth_headers, db, fake_calendar, user):
+    """Logs synced to the fake calendar, not yet reconciled."""
+    for date in DATES:
+        response = client.post(
+            "/api/logs/",
+            json={"date": date, "symptoms": [{"name": "Hot flashes", "severity": 3}]},
+            headers=auth_headers,
+            params={"sync": "true"}
+        )
+        assert response.status_code == 200, response.text
+    run(calendar_sync_service.sync_logs(db, _user(db, user), _logs(db)))
+
+
+def _user(db, user):
+    return UserInDB(**run(db.users.find_one({"_id": user["_id"]})))
+
+
+def _logs(db):
+    return run(db.symptom_logs.find({}).sort("date", 1).to_list(None))
+
+
+def _event_id(db, date):
+    return run(db.symptom_logs.find_one({"date": date}))["calendar_event"]["event_id"]
+
+
+def _reconcile(db, user):
+    return run(reconcile_calendar(db, _user(db, user)))
+
+
+def test_first_run_is_full_and_later_runs_are_incremental(db, user, synced, fake_calendar):
+    result = _reconcile(db, user)
+    assert (result["full_resync"], result["changed_events"], result["repaired"]) == (True, 3, 0)
+    assert _user(db, user).calendar_settings.sync_token
+
+    fake_calendar.calls.clear()
+    result = _reconcile(db, user)
+    assert (result["full_resync"], result["changed_events"], result["repaired"]) == (False, 0, 0)
+    assert fake_calendar.calls == [("GET", None)]
+
+
+def test_events_edited_or_deleted_in_google_are_repushed(db, user, synced, fake_calendar):
+    _reconcile(db, user)
+    edited, deleted = _event_id(db, DATES[0]), _event_id(db, DATES[1])
+    original = dict(fake_calendar.events[edited])
+    fake_calendar.edit(edited, summary="Renamed in Google")
+    fake_calendar.delete(deleted)
+
+    result = _reconcile(db, user)
+
+    assert (result["full_resync"], result["changed_events"], result["repaired"]) == (False, 2, 2)
+    assert fake_calendar.events[edited]["summary"] == original["summary"]
+    recreated = _event_id(db, DATES[1])
+    assert recreated != deleted and recreated in fake_calendar.events
+    assert len(fake_calendar.events) == 3
+
+    # The repairs themselves show up as changes once and then settle
+    _reconcile(db, user)
+    assert _reconcile(db, user)["changed_events"] == 0
+
+
+def test_expired_sync_token_forces_full_resync(db, user, synced, fake_calendar):
+    _reconcile(db, user)
+    # Removed without a change record, so only a full listing notices
+    gone = _event_id(db, DATES[2])
+    del fake_calendar.events[gone]
+    fake_calendar.expire_sync_tokens()
+
+    result = _reconcile(db, user)
+
+    assert result["full_resync"] is True
+    assert result["repaired"] == 1
+    assert _event_id(db, DATES[2]) not in (gone, None)
+    # A fresh token was stored, so the next run is incremental again
+    assert _reconcile(db, user)["full_resync"] is False
+
+
+def test_orphans_and_duplicates_are_deleted(db, user, synced, fake_calendar):
+    _reconcile(db, user)
+    kept = _event_id(db, DATES[0])
+    duplicate = fake_calendar.add({**fake_calendar.events[kept]})
+    orphan = fake_calendar.add({
+        "summary": "Symptom Log: Mild",
+        "extendedProperties": {"private": {"altheia_log_id": str(ObjectId()), "source": "altheia_app"}},
+    })
+    foreign = fake_calendar.add({"summary": "Dentist"})
+
+    result = _reconcile(db, user)
+
+    assert result["orphans_deleted"] == 2
+    assert duplicate not in fake_calendar.events and orphan not in fake_calendar.events
+    assert kept in fake_calendar.events
+    # Events the app did not create are left alone
+    assert foreign in fake_calendar.events
+
+
+def test_unlinked_events_are_adopted(db, user, synced, fake_calendar):
+    matching, stale = _event_id(db, DATES[0]), _event_id(db, DATES[1])
+    run(db.symptom_logs.update_many({"date": {"$in": DATES[:2]}}, {"$unset": {"calendar_event": ""}}))
+    fake_calendar.edit(stale, description="Written by an older version")
+
+    result = _reconcile(db, user)
+
+    assert result["adopted"] == 2
+    assert result["repaired"] == 1
+    assert result["orphans_deleted"] == 0
+    # Both events are kept and linked; the stale one is rewritten in place
+    assert (_event_id(db, DATES[0]), _event_id(db, DATES[1])) == (matching, stale)
+    assert fake_calendar.events[stale]["description"] != "Written by an older version"
+    assert len(fake_calendar.events) == 3
@@ -0,0 +1,308 @@
+from datetime import datetime, timedelta
+
+import pytest
+from pymongo.errors import DuplicateKeyError
+
+from models.symptom_log import SymptomLogCreate
+from models.user import UserInDB
+from services import calendar_sync_outbox, calendar_sync_service, symptom_log_service
+from services.calendar_sync_outbox import (
+    DEAD, DONE, OP_DELETE, OP_RECONCILE, OP_SYNC_ALL, OP_UPSERT, PENDING, RUNNING, CalendarSyncWorkerPool,
+    LeaseLostError, enqueue_sync_all, init_outbox_indexes
+)
+from tests.conftest import run
+from utils.security import user_cache
+
+DATES = ["2024-01-01", "2024-01-02", "2024-01-03"]
+
+
+@pytest.fixture
+def outbox(db):
+    run(init_outbox_indexes(db))
+    return db
+
+
+@pytest.fixture
+def logged(client, auth_headers, outbox, fake_calendar, user):
+    for date in DATES:
+        response = client.post(
+            "/api/logs/",
+            json={"date": date, "symptoms": [{"name": "Hot flashes", "severity": 3}]},
+            headers=auth_headers,
+            params={"sync": "true"}
+        )
+        assert response.status_code == 200, response.text
+    # Only the sync-all job is claimed in these tests
+    run(outbox.calendar_sync_jobs.delete_many({}))
+    return UserInDB(**run(outbox.users.find_one({"_id": user["_id"]})))
+
+
+def _job(db, job):
+    return run(db.calendar_sync_jobs.find_one({"_id": job["_id"]}))
+
+
+def test_sync_all_endpoint_needs_workers(client, auth_headers, fake_calendar):
+    response = client.post("/api/google-calendar/sync-all", headers=auth_headers)
+    assert response.status_code == 503
+
+
+def test_sync_all_endpoint_queues_job(client, auth_headers, fake_calendar, monkeypatch):
+    monkeypatch.setattr(calendar_sync_outbox.get_calendar_sync_workers(), "worker_count", 1)
+    first = client.post("/api/google-calendar/sync-all", headers=auth_headers)
+    assert first.status_code == 202
+    assert first.json()["status"] == PENDING
+    # The unfinished job is returned again
+    second = client.post("/api/google-calendar/sync-all", headers=auth_headers)
+    assert second.json()["job_id"] == first.json()["job_id"]
+
+
+def test_one_active_sync_all_job_per_user(outbox, user):
+    job = run(enqueue_sync_all(outbox, user["_id"]))
+    assert run(enqueue_sync_all(outbox, user["_id"]))["_id"] == job["_id"]
+
+    with pytest.raises(DuplicateKeyError):
+        run(outbox.calendar_sync_jobs.insert_one({"user_id": user["_id"], "op": OP_SYNC_ALL, "key": OP_SYNC_ALL, "active": True}))
+
+    # A finished job no longer blocks a new one
+    run(outbox.calendar_sync_jobs.update_one({"_id": job["_id"]}, {"$set": {"status": DONE}, "$unset": {"active": ""}}))
+    assert run(enqueue_sync_all(outbox, user["_id"]))["_id"] != job["_id"]
+
+
+def test_enqueue_sync_all_race_returns_existing_job(outbox, user, monkeypatch):
+    job = run(enqueue_sync_all(outbox, user["_id"]))
+    collection = type(outbox.calendar_sync_jobs)
+
+    async def racing_upsert(self, *args, **kwargs):
+        # The other request's insert won between our read and insert
+        raise DuplicateKeyError("E11000 duplicate key")
+
+    monkeypatch.setattr(collection, "find_one_and_update", racing_upsert)
+    assert run(enqueue_sync_all(outbox, user["_id"]))["_id"] == job["_id"]
+
+
+def test_sync_all_completes(outbox, logged, fake_calendar):
+    job = run(enqueue_sync_all(outbox, logged.id))
+    pool = CalendarSyncWorkerPool()
+    run(pool._process(outbox, run(pool._claim(outbox))))
+
+    done = _job(outbox, job)
+    assert done["status"] == DONE
+    assert (done["total"], done["processed"], done["failed"]) == (3, 3, 0)
+    assert "active" not in done
+    assert len(fake_calendar.events) == 3
+
+
+def test_stale_worker_is_fenced_by_lease_token(outbox, logged, fake_calendar):
+    job = run(enqueue_sync_all(outbox, logged.id))
+    pool = CalendarSyncWorkerPool()
+    # Leases expire at once, so a second claim takes the job over
+    pool.lease_seconds = 0
+    stale = run(pool._claim(outbox))
+    current = run(pool._claim(outbox))
+    assert stale["_id"] == current["_id"] == job["_id"]
+    assert stale["lease_token"] != current["lease_token"]
+
+    # The stale worker syncs its chunk but cannot record it, finish or fail the job
+    with pytest.raises(LeaseLostError):
+        run(pool._sync_all(outbox, {**stale, "total": 3}, logged))
+    assert len(fake_calendar.events) == 3
+    with pytest.raises(LeaseLostError):
+        run(pool._finish(outbox, stale))
+    run(pool._fail(outbox, stale, RuntimeError("boom")))
+    assert pool.stats["lease_lost"] == 1
+    unchanged = _job(outbox, job)
+    assert unchanged["status"] == RUNNING
+    assert unchanged["checkpoint_date"] is None
+    assert "last_error" not in unchanged
+
+    # The current worker redoes the chunk; its events are updated, not
+    # duplicated, and the logs are counted once
+    run(pool._process(outbox, current))
+    done = _job(outbox, job)
+    assert done["status"] == DONE
+    assert (done["processed"], done["failed"]) == (3, 0)
+    assert len(fake_calendar.events) == 3
+
+
+def test_redone_chunk_is_not_counted_twice(outbox, logged, monkeypatch):
+    monkeypatch.setattr(calendar_sync_outbox, "SYNC_ALL_CHUNK_SIZE", 2)
+    job = run(enqueue_sync_all(outbox, logged.id))
+    pool = CalendarSyncWorkerPool()
+    claimed = run(pool._claim(outbox))
+    run(pool._sync_all(outbox, claimed, logged))
+    assert _job(outbox, job)["processed"] == 3
+
+    # Replaying the first chunk from the original checkpoint matches nothing
+    with pytest.raises(LeaseLostError):
+        run(pool._sync_all(outbox, {**claimed, "total": 3, "processed": 0}, logged))
+    assert _job(outbox, job)["processed"] == 3
+
+
+def _sync_user(db, user):
+    return UserInDB(**run(db.users.find_one({"_id": user["_id"]})))
+
+
+def _write(db, user, date, severity):
+    log_in = SymptomLogCreate(date=date, symptoms=[{"name": "Hot flashes", "severity": severity}])
+    return symptom_log_service.upsert_log(db, user, log_in)
+
+
+def _log_job(db):
+    return run(db.calendar_sync_jobs.find_one({"op": {"$in": [OP_UPSERT, OP_DELETE]}}))
+
+
+def test_edit_during_a_run_is_synced_after_it(outbox, fake_calendar, user, monkeypatch):
+    sync_user = _sync_user(outbox, user)
+    run(_write(outbox, sync_user, "2024-01-01", 1))
+    pool = CalendarSyncWorkerPool()
+    running = run(pool._claim(outbox))
+    sync_log = calendar_sync_service.sync_log
+
+    async def edited_while_syncing(db, user, log):
+        event_id = await sync_log(db, user, log)
+        await _write(db, user, "2024-01-01", 5)
+        # The edit joins the running job; no second job can be claimed
+        assert await pool._claim(db) is None
+        assert await db.calendar_sync_jobs.count_documents({"active": True}) == 1
+        return event_id
+
+    monkeypatch.setattr(calendar_sync_service, "sync_log", edited_while_syncing)
+    run(pool._process(outbox, running))
+    monkeypatch.setattr(calendar_sync_service, "sync_log", sync_log)
+
+    requeued = _log_job(outbox)
+    assert (requeued["status"], requeued["requeue"]) == (PENDING, True)
+    assert pool.stats["requeued"] == 1
+    run(pool._process(outbox, run(pool._claim(outbox))))
+
+    done = _log_job(outbox)
+    assert done["status"] == DONE and "active" not in done
+    assert [event["colorId"] for event in fake_calendar.events.values()] == ["11"]
+
+
+def test_delete_during_a_run_removes_the_event(outbox, fake_calendar, user, monkeypatch):
+    sync_user = _sync_user(outbox, user)
+    run(_write(outbox, sync_user, "2024-01-01", 3))
+    pool = CalendarSyncWorkerPool()
+    running = run(pool._claim(outbox))
+    sync_log = calendar_sync_service.sync_log
+
+    async def deleted_while_syncing(db, user, log):
+        # Deleted before the event link is stored, so the delete job
+        # carries no event ID
+        await symptom_log_service.delete_log(db, user, "2024-01-01")
+        return await sync_log(db, user, log)
+
+    monkeypatch.setattr(calendar_sync_service, "sync_log", deleted_while_syncing)
+    run(pool._process(outbox, running))
+    monkeypatch.setattr(calendar_sync_service, "sync_log", sync_log)
+    assert len(fake_calendar.events) == 1
+
+    delete = _log_job(outbox)
+    assert (delete["status"], delete["op"], delete["calendar_event"]) == (PENDING, OP_DELETE, None)
+    run(pool._process(outbox, run(pool._claim(outbox))))
+
+    assert fake_calendar.events == {}
+    assert _log_job(outbox)["status"] == DONE
+
+
+def test_expired_lease_hands_the_job_over(outbox, fake_calendar, user):
+    run(_write(outbox, _sync_user(outbox, user), "2024-01-01", 3))
+    pool = CalendarSyncWorkerPool()
+    pool.lease_seconds = 0
+    stale = run(pool._claim(outbox))
+    current = run(pool._claim(outbox))
+    assert stale["_id"] == current["_id"]
+
+    run(pool._process(outbox, stale))
+    assert pool.stats["lease_lost"] == 1
+    assert _log_job(outbox)["status"] == RUNNING
+    run(pool._process(outbox, current))
+
+    assert _log_job(outbox)["status"] == DONE
+    assert len(fake_calendar.events) == 1
+
+
+def test_failures_back_off_then_dead_letter(outbox, fake_calendar, user):
+    sync_user = _sync_user(outbox, user)
+    run(_write(outbox, sync_user, "2024-01-01", 3))
+    fake_calendar.fail_next(400, {"error": {"message": "Bad Request"}}, times=2)
+    pool = CalendarSyncWorkerPool()
+    pool.max_attempts = 2
+
+    started = datetime.utcnow()
+    run(pool._process(outbox, run(pool._claim(outbox))))
+    job = _log_job(outbox)
+    assert (job["status"], job["attempts"]) == (PENDING, 1)
+    assert "Bad Request" in job["last_error"]
+    delay = (job["next_attempt_at"] - started).total_seconds()
+    assert pool.backoff_seconds <= delay <= pool.backoff_seconds * 1.5 + 1
+    assert run(pool._claim(outbox)) is None
+
+    run(outbox.calendar_sync_jobs.update_one({"_id": job["_id"]}, {"$set": {"next_attempt_at": started}}))
+    run(pool._process(outbox, run(pool._claim(outbox))))
+    dead = _log_job(outbox)
+    assert dead["status"] == DEAD and "active" not in dead
+    assert pool.stats["dead_lettered"] == 1
+
+    # A later edit queues a new job
+    run(_write(outbox, sync_user, "2024-01-01", 4))
+    assert run(outbox.calendar_sync_jobs.count_documents({"active": True})) == 1
+
+
+def test_sync_all_retries_failed_logs_before_finishing(client, auth_headers, outbox, logged, fake_calendar):
+    job = run(enqueue_sync_all(outbox, logged.id))
+    first_log = run(outbox.symptom_logs.find_one({"date": DATES[0]}))
+    # The first insert of the chunk is rejected; the others go through
+    fake_calendar.fail_next(400, {"error": {"message": "Bad Request"}})
+    pool = CalendarSyncWorkerPool()
+
+    started = datetime.utcnow()
+    run(pool._process(outbox, run(pool._claim(outbox))))
+    partial = _job(outbox, job)
+    assert (partial["status"], partial["checkpoint_date"]) == (PENDING, DATES[-1])
+    assert (partial["processed"], partial["failed"]) == (2, 1)
+    assert partial["failed_log_ids"] == [str(first_log["_id"])]
+    assert "1 logs failed" in partial["last_error"]
+    assert partial["next_attempt_at"] > started
+    status = client.get(f"/api/google-calendar/sync-all/{job['_id']}", headers=auth_headers).json()
+    assert status["failed_log_ids"] == [str(first_log["_id"])]
+
+    # The next attempt only retries the failed log
+    run(outbox.calendar_sync_jobs.update_one({"_id": job["_id"]}, {"$set": {"next_attempt_at": started}}))
+    fake_calendar.calls.clear()
+    run(pool._process(outbox, run(pool._claim(outbox))))
+    done = _job(outbox, job)
+    assert done["status"] == DONE
+    assert (done["processed"], done["failed"], done["failed_log_ids"]) == (3, 0, [])
+    assert [call[0] for call in fake_calendar.calls] == ["POST"]
+    assert len(fake_calendar.events) == 3
+
+
+def test_sync_all_drops_failed_logs_deleted_before_retry(outbox, logged, fake_calendar):
+    job = run(enqueue_sync_all(outbox, logged.id))
+    fake_calendar.fail_next(400, {"error": {"message": "Bad Request"}})
+    pool = CalendarSyncWorkerPool()
+    claimed = run(pool._claim(outbox))
+    with pytest.raises(calendar_sync_outbox.SyncAllIncompleteError):
+        run(pool._sync_all(outbox, claimed, logged))
+
+    run(outbox.symptom_logs.delete_one({"date": DATES[0]}))
+    run(pool._sync_all(outbox, _job(outbox, job), logged))
+    assert (_job(outbox, job)["processed"], _job(outbox, job)["failed_log_ids"]) == (2, [])
+
+
+def test_scheduling_reconciles_drops_cached_users(outbox, fake_calendar, user):
+    sync_user = _sync_user(outbox, user)
+    user_cache.set(str(user["_id"]), sync_user)
+    pool = CalendarSyncWorkerPool()
+
+    run(pool._enqueue_due_reconciles(outbox))
+
+    assert user_cache.get(str(user["_id"])) is None
+    stored = run(outbox.users.find_one({"_id": user["_id"]}))
+    assert stored["calendar_settings"]["reconcile_scheduled_at"] is not None
+    assert run(outbox.calendar_sync_jobs.count_documents({"op": OP_RECONCILE, "active": True})) == 1
+    # Not due again until the interval has passed
+    run(pool._enqueue_due_reconciles(outbox))
+    assert pool.stats["reconciles_scheduled"] == 1
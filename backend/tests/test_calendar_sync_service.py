@@ -0,0 +1,150 @@
+from datetime import datetime
+
+import pytest
+from googleapiclient.errors import HttpError
+
+from models.user import UserInDB
+from services import calendar_sync_service
+from services.symptom_severity import severity_fields
+from tests.conftest import run
+from tests.fake_calendar import FakeCalendarHttp
+from utils.security import user_cache
+
+GONE = {"error": {"message": "Resource has been deleted", "errors": [{"reason": "deleted"}]}}
+
+
+@pytest.fixture
+def synced_user(client, auth_headers, db, fake_calendar, user):
+    for date in ("2024-01-01", "2024-01-02"):
+        response = client.post(
+            "/api/logs/",
+            json={"date": date, "symptoms": [{"name": "Hot flashes", "severity": 3}]},
+            headers=auth_headers,
+            params={"sync": "true"}
+        )
+        assert response.status_code == 200, response.text
+    return UserInDB(**run(db.users.find_one({"_id": user["_id"]})))
+
+
+def _log(db, date):
+    return run(db.symptom_logs.find_one({"date": date}))
+
+
+def _set_severity(db, date, severity):
+    run(db.symptom_logs.update_one({"date": date}, {"$set": {
+        "symptoms.0.severity": severity, **severity_fields([{"severity": severity}])
+    }}))
+    return _log(db, date)
+
+
+def _writes(fake: FakeCalendarHttp):
+    return [call for call in fake.calls if call[0] in ("POST", "PUT")]
+
+
+def test_update_reuses_stored_event_id(db, synced_user, fake_calendar):
+    event_id = run(calendar_sync_service.sync_log(db, synced_user, _log(db, "2024-01-01")))
+    assert _log(db, "2024-01-01")["calendar_event"]["event_id"] == event_id
+
+    fake_calendar.calls.clear()
+    updated_id = run(calendar_sync_service.sync_log(db, synced_user, _set_severity(db, "2024-01-01", 5)))
+
+    assert updated_id == event_id
+    # Addressed directly: no search by log ID, one PUT to the stored event
+    assert fake_calendar.calls == [("PUT", event_id)]
+    assert fake_calendar.events[event_id]["colorId"] == "11"
+
+
+@pytest.mark.parametrize("status", [404, 410])
+def test_update_of_missing_event_falls_back_to_insert(db, synced_user, fake_calendar, status):
+    event_id = run(calendar_sync_service.sync_log(db, synced_user, _log(db, "2024-01-01")))
+    if status == 404:
+        del fake_calendar.events[event_id]
+    else:
+        fake_calendar.fail_next(410, GONE)
+
+    fake_calendar.calls.clear()
+    new_id = run(calendar_sync_service.sync_log(db, synced_user, _set_severity(db, "2024-01-01", 5)))
+
+    assert new_id != event_id
+    assert _writes(fake_calendar) == [("PUT", event_id), ("POST", None)]
+    assert _log(db, "2024-01-01")["calendar_event"]["event_id"] == new_id
+
+
+def test_other_update_errors_are_raised(db, synced_user, fake_calendar):
+    event_id = run(calendar_sync_service.sync_log(db, synced_user, _log(db, "2024-01-01")))
+    fake_calendar.fail_next(400, {"error": {"message": "Bad Request"}})
+
+    with pytest.raises(HttpError):
+        run(calendar_sync_service.sync_log(db, synced_user, _set_severity(db, "2024-01-01", 5)))
+    assert _writes(fake_calendar)[-1] == ("PUT", event_id)
+    assert _log(db, "2024-01-01")["calendar_event"]["event_id"] == event_id
+
+
+def test_batch_sync_updates_stored_events_and_reinserts_missing(db, synced_user, fake_calendar):
+    logs = [_log(db, "2024-01-01"), _log(db, "2024-01-02")]
+    first = run(calendar_sync_service.sync_logs(db, synced_user, logs))
+    gone_id = first[str(logs[1]["_id"])]
+    del fake_calendar.events[gone_id]
+
+    fake_calendar.calls.clear()
+    logs = [_set_severity(db, "2024-01-01", 5), _set_severity(db, "2024-01-02", 5)]
+    second = run(calendar_sync_service.sync_logs(db, synced_user, logs))
+
+    kept_id = first[str(logs[0]["_id"])]
+    assert second[str(logs[0]["_id"])] == kept_id
+    assert second[str(logs[1]["_id"])] not in (gone_id, kept_id)
+    assert set(_writes(fake_calendar)) == {("POST", None), ("PUT", gone_id), ("PUT", kept_id)}
+    assert _log(db, "2024-01-02")["calendar_event"]["event_id"] == second[str(logs[1]["_id"])]
+
+
+def test_mark_synced_records_time_and_drops_cached_user(db, synced_user):
+    user_cache.set(str(synced_user.id), synced_user)
+    before = datetime.utcnow()
+
+    run(calendar_sync_service.mark_synced(db, synced_user))
+
+    stored = run(db.users.find_one({"email": synced_user.email}))
+    assert stored["calendar_settings"]["last_sync"] >= before.replace(microsecond=0)
+    assert user_cache.get(str(synced_user.id)) is None
+
+
+def test_unchanged_logs_make_no_api_calls(db, synced_user, fake_calendar):
+    event_id = run(calendar_sync_service.sync_log(db, synced_user, _log(db, "2024-01-01")))
+    run(calendar_sync_service.sync_logs(db, synced_user, [_log(db, "2024-01-02")]))
+    fake_calendar.calls.clear()
+    requests = fake_calendar.requests
+
+    # Fields that are not part of the event do not count as changes
+    run(db.symptom_logs.update_many({}, {"$set": {
+        "updated_at": datetime.utcnow(), "symptoms.0.notes": "private"
+    }}))
+    assert run(calendar_sync_service.sync_log(db, synced_user, _log(db, "2024-01-01"))) == event_id
+    result = run(calendar_sync_service.sync_logs(db, synced_user, [_log(db, "2024-01-01"), _log(db, "2024-01-02")]))
+
+    assert result[str(_log(db, "2024-01-01")["_id"])] == event_id
+    assert fake_calendar.calls == []
+    assert fake_calendar.requests == requests
+
+
+@pytest.mark.parametrize("change", [
+    {"symptoms.0.severity": 4},
+    {"symptoms.0.name": "Night Sweats"},
+    {"overall_notes": "Slept badly"},
+    {"severity_level": "severe"},
+])
+def test_change_to_any_event_field_is_sent(db, synced_user, fake_calendar, change):
+    event_id = run(calendar_sync_service.sync_log(db, synced_user, _log(db, "2024-01-01")))
+    stored_hash = _log(db, "2024-01-01")["calendar_event"]["content_hash"]
+    fake_calendar.calls.clear()
+
+    run(db.symptom_logs.update_one({"date": "2024-01-01"}, {"$set": change}))
+    run(calendar_sync_service.sync_log(db, synced_user, _log(db, "2024-01-01")))
+
+    assert fake_calendar.calls == [("PUT", event_id)]
+    assert _log(db, "2024-01-01")["calendar_event"]["content_hash"] != stored_hash
+
+    # The batch path compares the same hash
+    run(db.symptom_logs.update_one({"date": "2024-01-01"}, {"$set": {"overall_notes": "Changed again"}}))
+    fake_calendar.calls.clear()
+    run(calendar_sync_service.sync_logs(db, synced_user, [_log(db, "2024-01-01"), _log(db, "2024-01-02")]))
+    assert ("PUT", event_id) in fake_calendar.calls
@@ -0,0 +1,104 @@
+from datetime import datetime
+
+import pytest
+from starlette.requests import Request
+
+from tests.conftest import run
+from utils.etag import compute_etag, is_not_modified
+
+
+def _request(if_none_match):
+    return Request({"type": "http", "headers": [(b"if-none-match", if_none_match.encode())]})
+
+
+@pytest.mark.parametrize("header, expected", [
+    ('"abc"', True),
+    ('W/"abc"', True),
+    ('"other", "abc"', True),
+    ("*", True),
+    ('"other"', False),
+    ("abc", False),
+])
+def test_if_none_match(header, expected):
+    assert is_not_modified(_request(header), '"abc"') is expected
+
+
+def test_etag_depends_on_every_part():
+    assert compute_etag("logs", 1, {"a": 1}) == compute_etag("logs", 1, {"a": 1})
+    assert compute_etag("logs", 1, {"a": 1}) != compute_etag("logs", 1, {"a": 2})
+
+
+def _get(client, url, headers, etag=None, **params):
+    if etag:
+        headers = {**headers, "If-None-Match": etag}
+    return client.get(url, headers=headers, params=params)
+
+
+def _log(client, headers, date, severity=3):
+    response = client.post(
+        "/api/logs/",
+        json={"date": date, "symptoms": [{"name": "Hot flashes", "severity": severity}]},
+        headers=headers,
+        params={"sync": "true"}
+    )
+    assert response.status_code == 200, response.text
+
+
+def test_log_listing_not_modified_until_a_write(client, auth_headers):
+    _log(client, auth_headers, "2024-01-01")
+    first = _get(client, "/api/logs/", auth_headers)
+    etag = first.headers["etag"]
+    assert first.headers["cache-control"] == "private, no-cache"
+
+    cached = _get(client, "/api/logs/", auth_headers, etag)
+    assert cached.status_code == 304
+    assert cached.content == b""
+    assert cached.headers["etag"] == etag
+
+    # Edits, new logs and deletes each change the listing
+    for change in (
+        lambda: _log(client, auth_headers, "2024-01-01", severity=5),
+        lambda: _log(client, auth_headers, "2024-01-02"),
+        lambda: client.delete("/api/logs/2024-01-01", headers=auth_headers),
+    ):
+        change()
+        response = _get(client, "/api/logs/", auth_headers, etag)
+        assert response.status_code == 200
+        assert response.headers["etag"] != etag
+        etag = response.headers["etag"]
+
+
+def test_log_listing_etag_depends_on_filters(client, auth_headers):
+    _log(client, auth_headers, "2024-01-01")
+    etag = _get(client, "/api/logs/", auth_headers).headers["etag"]
+    ranged = _get(client, "/api/logs/", auth_headers, etag, start_date="2024-01-01", end_date="2024-01-31")
+    assert ranged.status_code == 200
+    assert ranged.headers["etag"] != etag
+
+
+def test_profile_not_modified_until_updated(client, auth_headers):
+    etag = _get(client, "/api/auth/me", auth_headers).headers["etag"]
+    assert _get(client, "/api/auth/me", auth_headers, etag).status_code == 304
+
+    assert client.put("/api/auth/me", json={"name": "Renamed"}, headers=auth_headers).status_code == 200
+    response = _get(client, "/api/auth/me", auth_headers, etag)
+    assert response.status_code == 200
+    assert response.json()["name"] == "Renamed"
+
+
+def test_articles_not_modified_until_updated(client, db):
+    article = {
+        "title": "Sleep and menopause", "summary": "Tips", "url": "https://example.com/sleep",
+        "source": "Example", "category": "sleep", "published_at": datetime(2024, 1, 1),
+        "created_at": datetime(2024, 1, 1), "updated_at": datetime(2024, 1, 1),
+    }
+    run(db.articles.insert_one(article))
+    etag = _get(client, "/api/articles/", {}).headers["etag"]
+    assert _get(client, "/api/articles/", {}, etag).status_code == 304
+    # Another category is another page
+    assert _get(client, "/api/articles/", {}, etag, category="sleep").status_code == 200
+
+    run(db.articles.update_one({"_id": article["_id"]}, {"$set": {"title": "Sleep", "updated_at": datetime.utcnow()}}))
+    response = _get(client, "/api/articles/", {}, etag)
+    assert response.status_code == 200
+    assert response.json()[0]["title"] == "Sleep"
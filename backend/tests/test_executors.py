@@ -0,0 +1,244 @@
+"""
+Regression test for blocking dependencies: while Gemini or the article feed
+hang, other requests keep being served and the hung calls are cut off by
+their executor's timeout or rejected by its admission control.
+"""
+import threading
+import time
+
+import anyio
+import httpx
+import pytest
+
+import main
+from fastapi import HTTPException
+from services import article_service, chat_service
+from utils import security
+from utils.executors import BoundedExecutor, ExecutorOverloadedError, ExecutorTimeoutError
+
+TIMEOUT = 0.5
+
+# Requests unrelated to the hung dependency must answer within this
+RESPONSIVE_SECONDS = 0.25
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def hang():
+    """Event the stubbed dependencies block on until the test ends."""
+    release = threading.Event()
+    yield release
+    release.set()
+
+
+class _HangingChat:
+    def __init__(self, release):
+        self.release = release
+
+    def send_message(self, message):
+        self.release.wait()
+
+
+class _HangingModel:
+    def __init__(self, release):
+        self.release = release
+
+    def start_chat(self, history):
+        return _HangingChat(self.release)
+
+
+@pytest.fixture
+def hanging_gemini(monkeypatch, hang):
+    executor = BoundedExecutor("test_gemini", max_workers=1, max_queue=1, timeout=TIMEOUT)
+    monkeypatch.setattr(chat_service, "gemini_executor", executor)
+    service = chat_service.ChatService.__new__(chat_service.ChatService)
+    service.model = _HangingModel(hang)
+    monkeypatch.setattr(chat_service, "_chat_service", service)
+    yield executor
+    hang.set()
+    executor.shutdown()
+
+
+@pytest.fixture
+def hanging_feed(monkeypatch, hang):
+    executor = BoundedExecutor("test_article_fetch", max_workers=1, max_queue=4, timeout=TIMEOUT)
+    monkeypatch.setattr(article_service, "article_fetch_executor", executor)
+    monkeypatch.setattr(article_service, "fetch_feed", lambda url: hang.wait())
+    yield executor
+    hang.set()
+    executor.shutdown()
+
+
+async def _timed(client, method, url, **kwargs):
+    started = time.perf_counter()
+    response = await client.request(method, url, **kwargs)
+    return response, time.perf_counter() - started
+
+
+@pytest.mark.anyio
+async def test_requests_flow_while_gemini_hangs(db, auth_headers, hang, hanging_gemini):
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        results = {}
+
+        async def chat(name):
+            results[name] = await _timed(client, "POST", "/api/chat/", json={"message": "hot flushes?"})
+
+        async with anyio.create_task_group() as group:
+            group.start_soon(chat, "first")
+            await anyio.sleep(0.05)
+            group.start_soon(chat, "queued")
+            await anyio.sleep(0.05)
+
+            # The pool's one worker is hung and its queue is full
+            rejected, rejected_elapsed = await _timed(client, "POST", "/api/chat/", json={"message": "again?"})
+            health, health_elapsed = await _timed(client, "GET", "/health")
+            logs, logs_elapsed = await _timed(client, "GET", "/api/logs/", headers=auth_headers)
+
+            # Once the first call has timed out, Gemini recovers so the
+            # queued call can get the worker
+            await anyio.sleep(TIMEOUT)
+            hang.set()
+
+    assert health.status_code == 200 and health_elapsed < RESPONSIVE_SECONDS
+    assert logs.status_code == 200 and logs_elapsed < RESPONSIVE_SECONDS
+    assert rejected.status_code == 200 and rejected_elapsed < RESPONSIVE_SECONDS
+    assert hanging_gemini.rejected == 1
+
+    # The hung call is cut off by the timeout and answered with the fallback
+    first, first_elapsed = results["first"]
+    assert first.status_code == 200
+    assert TIMEOUT <= first_elapsed < TIMEOUT + 1
+    assert "trouble" in first.json()["response"]
+    assert hanging_gemini.timed_out == 1
+    # The abandoned thread held the only worker until it returned
+    assert results["queued"][1] >= TIMEOUT
+
+
+@pytest.mark.anyio
+async def test_requests_flow_while_article_feed_hangs(db, hanging_feed):
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        results = {}
+
+        async def refresh():
+            results["refresh"] = await _timed(client, "POST", "/api/articles/refresh")
+
+        async with anyio.create_task_group() as group:
+            group.start_soon(refresh)
+            await anyio.sleep(0.05)
+            articles, articles_elapsed = await _timed(client, "GET", "/api/articles/")
+            health, health_elapsed = await _timed(client, "GET", "/health")
+
+    assert articles.status_code == 200 and articles_elapsed < RESPONSIVE_SECONDS
+    assert health.status_code == 200 and health_elapsed < RESPONSIVE_SECONDS
+
+    refresh_response, refresh_elapsed = results["refresh"]
+    assert refresh_response.status_code == 200
+    assert refresh_response.json()["new_articles_count"] == 0
+    assert TIMEOUT <= refresh_elapsed < TIMEOUT + 1
+    assert hanging_feed.timed_out == 1
+
+
+@pytest.fixture
+def small_executor(hang):
+    executor = BoundedExecutor("test_small", max_workers=1, max_queue=1, timeout=TIMEOUT)
+    yield executor
+    hang.set()
+    executor.shutdown()
+
+
+@pytest.mark.anyio
+async def test_executor_runs_jobs_and_counts_latency(small_executor):
+    assert await small_executor.run(lambda a, b=0: a + b, 1, b=2) == 3
+    with pytest.raises(ZeroDivisionError):
+        await small_executor.run(lambda: 1 / 0)
+
+    stats = small_executor.stats()
+    assert stats["run_latency"]["count"] == 2
+    assert stats["queue_wait"]["count"] == 2
+    assert (stats["rejected"], stats["timed_out"], stats["waiting"]) == (0, 0, 0)
+
+
+@pytest.mark.anyio
+async def test_executor_rejects_when_queue_is_full(small_executor, hang):
+    async with anyio.create_task_group() as group:
+        try:
+            group.start_soon(small_executor.run, hang.wait)
+            await anyio.sleep(0.05)
+            group.start_soon(small_executor.run, lambda: "queued")
+            await anyio.sleep(0.05)
+            waiting = small_executor.stats()["waiting"]
+
+            with pytest.raises(ExecutorOverloadedError):
+                await small_executor.run(lambda: "rejected")
+        finally:
+            hang.set()
+
+    assert waiting == 1
+    assert small_executor.rejected == 1
+    assert small_executor.stats()["waiting"] == 0
+
+
+@pytest.mark.anyio
+async def test_executor_timeout_keeps_slot_until_job_finishes(small_executor, hang):
+    with pytest.raises(ExecutorTimeoutError):
+        await small_executor.run(hang.wait)
+    assert small_executor.timed_out == 1
+
+    # The abandoned thread still holds the only worker
+    results = []
+
+    async def queued():
+        results.append(await small_executor.run(lambda: "ran"))
+
+    async with anyio.create_task_group() as group:
+        try:
+            group.start_soon(queued)
+            await anyio.sleep(0.1)
+            held = (len(results), small_executor.stats()["waiting"])
+        finally:
+            hang.set()
+
+    assert held == (0, 1)
+    assert results == ["ran"]
+    assert small_executor.timed_out == 1
+
+
+@pytest.mark.anyio
+async def test_password_wrappers_shed_load_with_503(db, user, monkeypatch, hang):
+    executor = BoundedExecutor("test_password_hashing", max_workers=1, max_queue=0)
+    monkeypatch.setattr(security, "password_executor", executor)
+    hashed = await security.get_password_hash_async("secret")
+    assert await security.verify_password_async("secret", hashed) is True
+    assert await security.verify_password_async("wrong", hashed) is False
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        async with anyio.create_task_group() as group:
+            try:
+                group.start_soon(executor.run, hang.wait)
+                await anyio.sleep(0.05)
+
+                with pytest.raises(HTTPException) as error:
+                    await security.verify_password_async("secret", hashed)
+                login = await client.post(
+                    "/api/auth/login", data={"username": "test@example.com", "password": "password123"}
+                )
+                signup = await client.post(
+                    "/api/auth/signup", json={"email": "new@example.com", "name": "New", "password": "password123"}
+                )
+            finally:
+                hang.set()
+
+    assert error.value.status_code == 503
+    assert error.value.headers == {"Retry-After": "1"}
+    assert login.status_code == 503
+    assert login.headers["retry-after"] == "1"
+    assert signup.status_code == 503
+    assert executor.rejected == 3
+    executor.shutdown()
@@ -0,0 +1,149 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from routers import google_calendar_auth
+from services import google_calendar_service
+from services.google_calendar_service import (
+    GoogleCalendarService,
+    _credentials_cache,
+    _credentials_key,
+    _credentials_locks,
+    _credentials_stats,
+    invalidate_credentials,
+)
+from tests.conftest import run
+from utils.encryption import encrypt_token
+
+
+@pytest.fixture
+def refreshes(monkeypatch, fake_calendar):
+    """Count token refreshes, recording whether the per-user lock was held."""
+    calls = []
+
+    def refresh(credentials, request):
+        key = next(key for key, lock in _credentials_locks.items() if lock.locked())
+        calls.append(key)
+        time.sleep(0.05)
+        credentials.token = f"access-token-{len(calls)}"
+        credentials.expiry = datetime.utcnow() + timedelta(hours=1)
+
+    monkeypatch.setattr(google_calendar_service.Credentials, "refresh", refresh)
+    return calls
+
+
+def _stored_token(db, user):
+    return run(db.users.find_one({"_id": user["_id"]}))["google_auth"]["encrypted_refresh_token"]
+
+
+def test_credentials_are_cached_by_encrypted_token_hash(db, user, refreshes):
+    token = _stored_token(db, user)
+    service = GoogleCalendarService()
+    started = _credentials_stats["refreshes"]
+
+    credentials = service.get_credentials(token)
+    assert credentials.refresh_token == "refresh-token"
+    assert _credentials_cache.get(_credentials_key(token)) is credentials
+    assert service.get_credentials(token) is credentials
+    assert refreshes == [_credentials_key(token)]
+    assert _credentials_stats["refreshes"] == started + 1
+
+    # Another encryption of the same refresh token is a different entry
+    other = encrypt_token("refresh-token")
+    assert other != token
+    assert service.get_credentials(other) is not credentials
+
+
+def test_concurrent_callers_refresh_once_under_the_user_lock(db, user, refreshes):
+    token = _stored_token(db, user)
+    service = GoogleCalendarService()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(service.get_credentials(token))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(results) == 5 and all(credentials is results[0] for credentials in results)
+    # The refresh ran while this user's lock was held
+    assert refreshes == [_credentials_key(token)]
+
+
+def test_expiring_credentials_are_refreshed(db, user, refreshes):
+    token = _stored_token(db, user)
+    service = GoogleCalendarService()
+    credentials = service.get_credentials(token)
+
+    # Inside the expiry margin the access token is refreshed in place
+    credentials.expiry = datetime.utcnow() + timedelta(minutes=1)
+    assert service.get_credentials(token) is credentials
+    assert credentials.token == "access-token-2"
+    assert len(refreshes) == 2
+
+    # Once the cache entry itself expires the credentials are rebuilt
+    _credentials_cache._entries[_credentials_key(token)] = (credentials, time.monotonic() - 1)
+    rebuilt = service.get_credentials(token)
+    assert rebuilt is not credentials
+    assert len(refreshes) == 3
+
+
+def test_invalidate_credentials_drops_entry_and_lock(db, user, refreshes):
+    token = _stored_token(db, user)
+    key = _credentials_key(token)
+    credentials = GoogleCalendarService().get_credentials(token)
+    assert key in _credentials_locks
+
+    invalidate_credentials(token)
+    assert _credentials_cache.get(key) is None
+    assert key not in _credentials_locks
+    assert GoogleCalendarService().get_credentials(token) is not credentials
+
+
+def test_failed_refresh_drops_entry(db, user, monkeypatch, fake_calendar):
+    token = _stored_token(db, user)
+
+    def refresh(credentials, request):
+        raise RuntimeError("invalid_grant")
+
+    monkeypatch.setattr(google_calendar_service.Credentials, "refresh", refresh)
+    with pytest.raises(ValueError):
+        GoogleCalendarService().get_credentials(token)
+    assert _credentials_cache.get(_credentials_key(token)) is None
+
+
+def test_reconnect_drops_credentials_of_replaced_token(client, auth_headers, db, user, refreshes, monkeypatch):
+    old_token = _stored_token(db, user)
+    GoogleCalendarService().get_credentials(old_token)
+
+    class _Flow:
+        credentials = google_calendar_service.Credentials(token="access-token", refresh_token="new-refresh-token")
+
+        @classmethod
+        def from_client_config(cls, *args, **kwargs):
+            return cls()
+
+        def fetch_token(self, code):
+            pass
+
+    monkeypatch.setattr(google_calendar_auth, "Flow", _Flow)
+    monkeypatch.setattr(GoogleCalendarService, "create_altheia_calendar", lambda self, credentials: "calendar")
+    response = client.get(
+        "/api/google-calendar/callback", params={"code": "code"}, headers=auth_headers, follow_redirects=False
+    )
+    assert response.status_code in (302, 307), response.text
+    assert "calendar_status=connected" in response.headers["location"]
+
+    assert _stored_token(db, user) != old_token
+    assert _credentials_cache.get(_credentials_key(old_token)) is None
+
+
+def test_disconnect_drops_credentials(client, auth_headers, db, user, refreshes, monkeypatch):
+    token = _stored_token(db, user)
+    credentials = GoogleCalendarService().get_credentials(token)
+    monkeypatch.setattr(type(credentials), "revoke", lambda self, request: None, raising=False)
+
+    response = client.post("/api/google-calendar/disconnect", headers=auth_headers)
+    assert response.status_code == 200, response.text
+    assert _credentials_cache.get(_credentials_key(token)) is None
@@ -0,0 +1,119 @@
+import pytest
+from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+
+from utils import rate_limiter
+from utils.rate_limiter import GoogleApiLimiter, TokenBucket
+from tests.fake_calendar import FakeCalendarHttp, rate_limit_error
+
+
+class FakeClock:
+    """Stands in for the time module; sleeping advances the clock."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limiter, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def limiter(clock):
+    limiter = GoogleApiLimiter()
+    limiter.global_qps, limiter.user_qps = 100.0, 2.0
+    limiter._global = TokenBucket(limiter.global_qps, limiter.global_qps)
+    limiter.max_retries = 3
+    limiter.backoff_base = 1.0
+    limiter.backoff_max = 5.0
+    return limiter
+
+
+@pytest.fixture
+def calendar():
+    fake = FakeCalendarHttp()
+    return fake, build("calendar", "v3", http=fake, static_discovery=True)
+
+
+def _insert(service):
+    return service.events().insert(calendarId="calendar", body={"summary": "Symptoms"})
+
+
+def test_user_bucket_paces_calls(limiter, clock, calendar):
+    fake, service = calendar
+    started = clock.now
+    for _ in range(6):
+        limiter.execute(_insert(service).execute, "user")
+
+    # A burst of 2, then one call every half second
+    assert clock.now - started == pytest.approx(2.0)
+    assert len(fake.events) == 6
+    assert limiter.counters["throttled"] == 4
+
+    # Another user has their own budget
+    before = clock.now
+    limiter.execute(_insert(service).execute, "other-user")
+    assert clock.now == before
+
+
+def test_batch_cost_draws_on_the_bucket(limiter, clock):
+    limiter.acquire("user", cost=2)
+    limiter.acquire("user", cost=4)
+    assert clock.sleeps == [pytest.approx(2.0)]
+
+
+def test_retry_after_is_honoured(limiter, clock, calendar):
+    fake, service = calendar
+    fake.fail_next(429, rate_limit_error(), {"retry-after": "3"})
+
+    event = limiter.execute(_insert(service).execute, "user")
+
+    assert event["id"] in fake.events
+    assert clock.sleeps == [3.0]
+    assert limiter.counters["retried"] == 1
+
+
+def test_retry_after_is_capped(limiter, clock, calendar):
+    fake, service = calendar
+    fake.fail_next(429, rate_limit_error(), {"retry-after": "120"})
+    limiter.execute(_insert(service).execute, "user")
+    assert clock.sleeps == [limiter.backoff_max]
+
+
+def test_rate_limit_403_retries_with_capped_jittered_backoff(limiter, clock, calendar):
+    fake, service = calendar
+    fake.fail_next(403, rate_limit_error("userRateLimitExceeded"), times=10)
+
+    with pytest.raises(HttpError) as error:
+        limiter.execute(_insert(service).execute, "user")
+
+    assert error.value.resp.status == 403
+    # Calls are paced by the bucket, so only backoff sleeps are retries
+    backoffs = clock.sleeps[-limiter.max_retries:]
+    for attempt, delay in enumerate(backoffs, start=1):
+        ceiling = min(limiter.backoff_base * 2 ** (attempt - 1), limiter.backoff_max)
+        assert ceiling / 2 <= delay <= ceiling
+    assert limiter.counters["retried"] == limiter.max_retries
+    assert limiter.counters["failed"] == 1
+    assert limiter.counters["calls"] == limiter.max_retries + 1
+
+
+def test_other_errors_are_not_retried(limiter, clock, calendar):
+    fake, service = calendar
+    fake.fail_next(403, {"error": {"message": "Forbidden", "errors": [{"reason": "forbidden"}]}})
+
+    with pytest.raises(HttpError):
+        limiter.execute(_insert(service).execute, "user")
+    assert clock.sleeps == []
+    assert limiter.counters["retried"] == 0
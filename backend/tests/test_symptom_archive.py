@@ -0,0 +1,162 @@
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from models.user import UserInDB
+from services.calendar_reconcile_service import reconcile_calendar
+from services.calendar_sync_outbox import CalendarSyncWorkerPool, enqueue_sync_all
+from services.symptom_archive_service import archive_logs
+from services.symptom_rollup_service import rebuild_all_rollups
+from tests.conftest import run
+
+OLD_DATES = ["2023-01-05", "2023-01-06", "2023-02-10"]
+
+
+def _log(client, headers, date, severity=3):
+    response = client.post(
+        "/api/logs/",
+        json={"date": date, "symptoms": [{"name": "Hot flashes", "severity": severity}]},
+        headers=headers,
+        params={"sync": "true"}
+    )
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def _archive(db):
+    # Logs must not have been written within the archive age
+    run(db.symptom_logs.update_many({"date": {"$in": OLD_DATES}}, {"$set": {
+        "updated_at": datetime.utcnow() - timedelta(days=800)
+    }}))
+    return run(archive_logs(db))
+
+
+def _dates(client, headers):
+    return [log["date"] for log in client.get("/api/logs/", headers=headers).json()]
+
+
+def test_archive_moves_old_months_into_buckets(client, auth_headers, db):
+    recent = datetime.utcnow().date().isoformat()
+    for date in OLD_DATES + [recent]:
+        _log(client, auth_headers, date)
+
+    assert _archive(db) == {"users": 1, "logs": 3}
+    buckets = run(db.symptom_log_archive.find({}, {"month": 1, "days.date": 1}).sort("month", 1).to_list(None))
+    assert [(b["month"], len(b["days"])) for b in buckets] == [("2023-01", 2), ("2023-02", 1)]
+    assert run(db.symptom_logs.count_documents({})) == 1
+
+    # A second run finds nothing left to archive
+    assert run(archive_logs(db))["logs"] == 0
+
+
+def test_reads_merge_archived_logs(client, auth_headers, db):
+    recent = datetime.utcnow().date().isoformat()
+    for date in OLD_DATES + [recent]:
+        _log(client, auth_headers, date)
+    _archive(db)
+
+    assert _dates(client, auth_headers) == [recent] + OLD_DATES[::-1]
+    ranged = client.get(
+        "/api/logs/", params={"start_date": "2023-01-06", "end_date": "2023-12-31"}, headers=auth_headers
+    ).json()
+    assert [log["date"] for log in ranged] == ["2023-02-10", "2023-01-06"]
+
+    page = client.get("/api/logs/page", params={"limit": 2}, headers=auth_headers).json()
+    assert [log["date"] for log in page["items"]] == [recent, "2023-02-10"]
+    rest = client.get(
+        "/api/logs/page", params={"limit": 5, "cursor": page["next_cursor"]}, headers=auth_headers
+    ).json()
+    assert [log["date"] for log in rest["items"]] == ["2023-01-06", "2023-01-05"]
+
+    changes = client.get("/api/logs/changes", headers=auth_headers).json()
+    assert sorted(log["date"] for log in changes["changed"]) == OLD_DATES + [recent]
+
+    export = client.get("/api/logs/export", headers=auth_headers)
+    assert export.text.count("\n") == 4
+
+
+def test_writes_restore_archived_month(client, auth_headers, db):
+    for date in OLD_DATES:
+        _log(client, auth_headers, date)
+    _archive(db)
+
+    _log(client, auth_headers, "2023-01-07", severity=5)
+    hot = sorted(log["date"] for log in run(db.symptom_logs.find({}).to_list(None)))
+    assert hot == ["2023-01-05", "2023-01-06", "2023-01-07"]
+    assert [b["month"] for b in run(db.symptom_log_archive.find({}).to_list(None))] == ["2023-02"]
+
+    assert client.delete("/api/logs/2023-02-10", headers=auth_headers).status_code == 204
+    assert run(db.symptom_log_archive.count_documents({})) == 0
+    assert _dates(client, auth_headers) == ["2023-01-07", "2023-01-06", "2023-01-05"]
+
+
+def test_sync_all_includes_archived_logs(client, auth_headers, db, fake_calendar, user):
+    recent = datetime.utcnow().date().isoformat()
+    for date in OLD_DATES + [recent]:
+        _log(client, auth_headers, date)
+    _archive(db)
+
+    job = run(enqueue_sync_all(db, user["_id"]))
+    user_in_db = UserInDB(**run(db.users.find_one({"_id": user["_id"]})))
+    run(CalendarSyncWorkerPool()._sync_all(db, job, user_in_db))
+
+    job = run(db.calendar_sync_jobs.find_one({"_id": job["_id"]}))
+    assert job["total"] == 4
+    assert job["processed"] == 4
+    assert len(fake_calendar.events) == 4
+    # Event links of archived logs are stored in their buckets
+    bucket = run(db.symptom_log_archive.find_one({"month": "2023-01"}))
+    assert all(entry["calendar_event"]["calendar_id"] == "calendar" for entry in bucket["days"])
+
+
+def test_full_reconcile_keeps_events_of_archived_logs(client, auth_headers, db, fake_calendar, user):
+    for date in OLD_DATES:
+        _log(client, auth_headers, date)
+    user_in_db = UserInDB(**run(db.users.find_one({"_id": user["_id"]})))
+    job = run(enqueue_sync_all(db, user["_id"]))
+    run(CalendarSyncWorkerPool()._sync_all(db, job, user_in_db))
+    _archive(db)
+
+    # A stray event whose log is gone is still removed
+    fake_calendar.events["stray"] = {
+        "id": "stray",
+        "extendedProperties": {"private": {"altheia_log_id": str(ObjectId())}},
+    }
+    result = run(reconcile_calendar(db, user_in_db))
+
+    assert result["full_resync"] is True
+    assert result["orphans_deleted"] == 1
+    assert result["repaired"] == 0
+    assert len(fake_calendar.events) == 3
+
+
+def test_sync_and_unsync_archived_log(client, auth_headers, db, fake_calendar):
+    log_id = _log(client, auth_headers, "2023-01-05")["id"]
+    _archive(db)
+
+    response = client.post("/api/google-calendar/sync", json={"log_id": log_id}, headers=auth_headers)
+    assert response.status_code == 200, response.text
+    event_id = response.json()["event_id"]
+    assert list(fake_calendar.events) == [event_id]
+    bucket = run(db.symptom_log_archive.find_one({"month": "2023-01"}))
+    assert bucket["days"][0]["calendar_event"]["event_id"] == event_id
+
+    response = client.delete(f"/api/google-calendar/sync/{log_id}", headers=auth_headers)
+    assert response.status_code == 200, response.text
+    assert response.json()["event_id"] == event_id
+    assert fake_calendar.events == {}
+    # The link is cleared in the bucket, which is not restored
+    bucket = run(db.symptom_log_archive.find_one({"month": "2023-01"}))
+    assert bucket["days"][0].get("calendar_event") is None
+    assert run(db.symptom_logs.count_documents({})) == 0
+
+
+def test_rebuild_all_rollups_covers_fully_archived_users(client, auth_headers, db):
+    for date in OLD_DATES:
+        _log(client, auth_headers, date)
+    _archive(db)
+    run(db.symptom_rollups.delete_many({}))
+
+    assert run(rebuild_all_rollups(db)) == 1
+    months = run(db.symptom_rollups.find({"granularity": "month"}).sort("period", 1).to_list(None))
+    assert [rollup["period"] for rollup in months] == ["2023-01", "2023-02"]
@@ -0,0 +1,64 @@
+import pytest
+
+from services.symptom_catalog import migrate_symptom_ids, normalize_names, resolve
+from tests.conftest import run
+
+
+@pytest.mark.parametrize("name", ["Hot Flushes", "hot flashes", "hot_flushes", "HOT-FLASH", "  hot   flush "])
+def test_spellings_resolve_to_one_symptom(name):
+    assert resolve(name) == ("hot_flushes", "Hot Flushes")
+
+
+def test_names_outside_the_catalog():
+    assert resolve("Restless  legs") == ("restless_legs", "Restless legs")
+    symptom_id, name = resolve("!!!")
+    assert symptom_id.startswith("symptom_") and name == "!!!"
+
+
+def test_normalize_names_drops_duplicates():
+    assert normalize_names(["hot flashes", "Anxiety", "Hot Flushes", "mood"]) == [
+        "Hot Flushes", "Anxiety", "Mood Changes"
+    ]
+
+
+def test_logs_are_stored_and_filtered_by_catalog_id(client, auth_headers):
+    for date, name, severity in (("2024-01-01", "hot flashes", 4), ("2024-01-02", "Hot Flush", 2), ("2024-01-03", "anxiety", 5)):
+        response = client.post(
+            "/api/logs/",
+            json={"date": date, "symptoms": [{"name": name, "severity": severity}]},
+            headers=auth_headers,
+            params={"sync": "true"}
+        )
+        assert response.json()["symptoms"][0]["name"] in ("Hot Flushes", "Anxiety")
+
+    logs = client.get(
+        "/api/logs/", params={"symptom": "HOT_FLASHES", "min_severity": 3}, headers=auth_headers
+    ).json()
+    assert [(log["date"], log["symptoms"][0]["id"]) for log in logs] == [("2024-01-01", "hot_flushes")]
+
+
+def test_migration_rewrites_stored_names(db, user):
+    run(db.symptom_logs.insert_one({
+        "user_id": user["_id"], "date": "2024-01-01",
+        "symptoms": [{"name": "hot flashes", "severity": 3}],
+    }))
+    run(db.users.update_one({"_id": user["_id"]}, {"$set": {"primary_symptoms": ["brainfog", "Brain Fog"]}}))
+
+    result = run(migrate_symptom_ids(db))
+    assert (result["logs_updated"], result["users_updated"]) == (1, 1)
+    assert result["renamed_users"] == [user["_id"]]
+    log = run(db.symptom_logs.find_one({"date": "2024-01-01"}))
+    assert log["symptoms"] == [{"name": "Hot Flushes", "severity": 3, "id": "hot_flushes"}]
+    assert "updated_at" in log
+    assert run(db.users.find_one({"_id": user["_id"]}))["primary_symptoms"] == ["Brain Fog"]
+
+    # Nothing left to migrate
+    assert run(migrate_symptom_ids(db))["logs_updated"] == 0
+
+
+def test_profile_primary_symptoms_are_normalized(client, auth_headers):
+    response = client.put(
+        "/api/auth/me", json={"primary_symptoms": ["night sweat", "Night Sweats", "energy"]}, headers=auth_headers
+    )
+    assert response.status_code == 200, response.text
+    assert response.json()["primary_symptoms"] == ["Night Sweats", "Energy Levels"]
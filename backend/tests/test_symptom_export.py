@@ -0,0 +1,92 @@
+import csv
+import io
+import json
+from datetime import date, datetime, timedelta
+
+from models.user import UserInDB
+from services.symptom_log_service import CSV_COLUMNS, EXPORT_BATCH_SIZE, export_logs
+from tests.conftest import run
+from tests.test_symptom_archive import OLD_DATES, _archive, _log
+
+
+def _export(client, headers, export_format, **params):
+    response = client.get("/api/logs/export", params={"format": export_format, **params}, headers=headers)
+    assert response.status_code == 200, response.text
+    return response
+
+
+def test_ndjson_export(client, auth_headers):
+    _log(client, auth_headers, "2024-01-02", severity=4)
+    _log(client, auth_headers, "2024-01-01")
+
+    response = _export(client, auth_headers, "ndjson")
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert response.headers["content-disposition"].endswith('.ndjson"')
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["date"] for line in lines] == ["2024-01-01", "2024-01-02"]
+    assert lines[1]["symptoms"][0]["severity"] == 4
+    assert set(lines[0]) == {"date", "symptoms", "overall_notes", "created_at", "updated_at"}
+
+    ranged = _export(client, auth_headers, "ndjson", start_date="2024-01-02")
+    assert [json.loads(line)["date"] for line in ranged.text.splitlines()] == ["2024-01-02"]
+
+
+def test_csv_export_has_header_and_escapes_formulas(client, auth_headers):
+    response = client.post("/api/logs/", params={"sync": "true"}, headers=auth_headers, json={
+        "date": "2024-01-01",
+        "symptoms": [
+            {"name": "Hot flashes", "severity": 3, "notes": "=HYPERLINK(\"x\")"},
+            {"name": "Headache", "severity": 2, "notes": "+1"},
+            {"name": "Fatigue", "severity": 1, "notes": "@SUM(A1)"},
+        ],
+        "overall_notes": "-2",
+    })
+    assert response.status_code == 200, response.text
+    _log(client, auth_headers, "2024-01-02")
+
+    response = _export(client, auth_headers, "csv")
+    assert response.headers["content-type"].startswith("text/csv")
+    rows = list(csv.reader(io.StringIO(response.text)))
+    assert rows[0] == CSV_COLUMNS
+    assert [row[0] for row in rows[1:]] == ["2024-01-01"] * 3 + ["2024-01-02"]
+    assert [row[3] for row in rows[1:4]] == ["'=HYPERLINK(\"x\")", "'+1", "'@SUM(A1)"]
+    assert {row[4] for row in rows[1:4]} == {"'-2"}
+    # Severities and dates are not escaped
+    assert rows[1][2] == "3"
+
+
+def test_export_streams_across_batches(db, user):
+    start = date(2020, 1, 1)
+    now = datetime.utcnow()
+    run(db.symptom_logs.insert_many([{
+        "user_id": user["_id"],
+        "date": (start + timedelta(days=offset)).isoformat(),
+        "symptoms": [{"name": "Hot Flushes", "severity": 1 + offset % 5}],
+        "created_at": now,
+        "updated_at": now,
+    } for offset in range(EXPORT_BATCH_SIZE + 1)]))
+    user_in_db = UserInDB(**user)
+
+    async def collect(export_format):
+        return [chunk async for chunk in export_logs(db, user_in_db, export_format)]
+
+    chunks = run(collect("ndjson"))
+    assert [chunk.count("\n") for chunk in chunks] == [EXPORT_BATCH_SIZE, 1]
+    dates = [json.loads(line)["date"] for line in "".join(chunks).splitlines()]
+    assert dates == sorted(dates) and len(set(dates)) == EXPORT_BATCH_SIZE + 1
+
+    # The CSV header is its own chunk, ahead of the batches
+    chunks = run(collect("csv"))
+    assert [chunk.count("\n") for chunk in chunks] == [1, EXPORT_BATCH_SIZE, 1]
+
+
+def test_export_includes_archived_months(client, auth_headers, db):
+    recent = datetime.utcnow().date().isoformat()
+    for date_ in OLD_DATES + [recent]:
+        _log(client, auth_headers, date_)
+    _archive(db)
+
+    lines = _export(client, auth_headers, "ndjson").text.splitlines()
+    assert [json.loads(line)["date"] for line in lines] == OLD_DATES + [recent]
+    rows = list(csv.reader(io.StringIO(_export(client, auth_headers, "csv", end_date="2023-01-31").text)))
+    assert [row[0] for row in rows[1:]] == OLD_DATES[:2]
@@ -0,0 +1,80 @@
+import base64
+
+from services import symptom_heatmap_service
+from services.symptom_heatmap_service import LOGGED_FLAG, encode_day, get_heatmap, heatmap_cache, invalidate_heatmaps
+from tests.conftest import run
+
+
+def _log(client, headers, date, *severities):
+    response = client.post(
+        "/api/logs/",
+        json={"date": date, "symptoms": [
+            {"name": name, "severity": severity}
+            for name, severity in zip(("Hot flashes", "Insomnia", "Fatigue"), severities)
+        ]},
+        headers=headers,
+        params={"sync": "true"}
+    )
+    assert response.status_code == 200, response.text
+
+
+def _heatmap(client, headers, year):
+    response = client.get("/api/logs/heatmap", params={"year": year}, headers=headers)
+    assert response.status_code == 200, response.text
+    body = response.json()
+    data = base64.b64decode(body["data"])
+    assert len(data) == body["days"]
+    return data
+
+
+def test_encode_day():
+    assert encode_day(0, 0) == LOGGED_FLAG
+    assert encode_day(2.5, 4) == LOGGED_FLAG | 3 << 3 | 4
+    assert encode_day(5, 5) == 0xAD
+
+
+def test_heatmap_has_a_byte_per_day(client, auth_headers):
+    _log(client, auth_headers, "2024-01-01", 2, 4)
+    _log(client, auth_headers, "2024-12-31")
+    data = _heatmap(client, auth_headers, 2024)
+
+    assert len(data) == 366
+    assert data[0] == encode_day(3, 4)
+    assert data[365] == LOGGED_FLAG
+    assert not any(data[1:365])
+    assert len(_heatmap(client, auth_headers, 2023)) == 365
+
+
+def test_writes_invalidate_their_year(client, auth_headers, user):
+    _log(client, auth_headers, "2024-03-01", 1)
+    _heatmap(client, auth_headers, 2024)
+    _heatmap(client, auth_headers, 2023)
+    user_id = str(user["_id"])
+    assert heatmap_cache.get((user_id, 2024)) is not None
+
+    _log(client, auth_headers, "2024-03-01", 5)
+    assert heatmap_cache.get((user_id, 2024)) is None
+    assert heatmap_cache.get((user_id, 2023)) is not None
+    assert _heatmap(client, auth_headers, 2024)[60] == encode_day(5, 5)
+
+    assert client.delete("/api/logs/2024-03-01", headers=auth_headers).status_code == 204
+    assert _heatmap(client, auth_headers, 2024)[60] == 0
+
+
+def test_heatmap_read_across_a_write_is_not_cached(client, auth_headers, db, user, monkeypatch):
+    _log(client, auth_headers, "2024-03-01", 1)
+    iter_logs = symptom_heatmap_service.iter_logs
+
+    async def write_during_read(*args, **kwargs):
+        async for log in iter_logs(*args, **kwargs):
+            yield log
+        # A write lands after the logs were read
+        await db.symptom_logs.update_one({"date": "2024-03-01"}, {"$set": {"severity_mean": 5, "severity_max": 5}})
+        invalidate_heatmaps(user["_id"], ["2024-03-01"])
+
+    monkeypatch.setattr(symptom_heatmap_service, "iter_logs", write_during_read)
+    assert run(get_heatmap(db, user["_id"], 2024))[60] == encode_day(1, 1)
+    assert heatmap_cache.get((str(user["_id"]), 2024)) is None
+
+    monkeypatch.setattr(symptom_heatmap_service, "iter_logs", iter_logs)
+    assert run(get_heatmap(db, user["_id"], 2024))[60] == encode_day(5, 5)
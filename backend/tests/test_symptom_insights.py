@@ -0,0 +1,52 @@
+from bson import ObjectId
+
+from services import symptom_insights_service
+from services.symptom_insights_service import get_insights, insights_cache, invalidate_insights
+from tests.conftest import run
+
+
+def _log(client, headers, date, severity):
+    response = client.post(
+        "/api/logs/",
+        json={"date": date, "symptoms": [{"name": "Hot flashes", "severity": severity}]},
+        headers=headers,
+        params={"sync": "true"}
+    )
+    assert response.status_code == 200, response.text
+
+
+def test_insights_are_cached_until_a_write(client, auth_headers, db, user):
+    _log(client, auth_headers, "2024-01-01", 2)
+    first = run(get_insights(db, user["_id"], 1, 7))
+    assert first["logged_days"] == 1
+    assert run(get_insights(db, user["_id"], 1, 7)) is first
+
+    _log(client, auth_headers, "2024-01-02", 4)
+    assert run(get_insights(db, user["_id"], 1, 7))["logged_days"] == 2
+
+
+def test_result_loaded_across_a_write_is_not_cached(client, auth_headers, db, user, monkeypatch):
+    _log(client, auth_headers, "2024-01-01", 2)
+    load_matrix = symptom_insights_service._load_matrix
+
+    async def load_then_write(db, user_id):
+        data = await load_matrix(db, user_id)
+        # A write lands after the logs were read
+        await db.symptom_logs.insert_one({
+            "user_id": user_id, "date": "2024-01-02",
+            "symptoms": [{"name": "Hot flashes", "severity": 4, "id": "hot_flashes"}],
+        })
+        invalidate_insights(user_id)
+        return data
+
+    monkeypatch.setattr(symptom_insights_service, "_load_matrix", load_then_write)
+    stale = run(get_insights(db, user["_id"], 1, 7))
+    assert stale["logged_days"] == 1
+    assert insights_cache.get(str(user["_id"])) is None
+
+    monkeypatch.setattr(symptom_insights_service, "_load_matrix", load_matrix)
+    assert run(get_insights(db, user["_id"], 1, 7))["logged_days"] == 2
+
+
+def test_user_without_logs(db):
+    assert run(get_insights(db, ObjectId(), 1, 7)) is None
@@ -0,0 +1,87 @@
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+from tests.conftest import run
+
+
+def _upsert(date, severity=3):
+    return {"date": date, "symptoms": [{"name": "Hot flashes", "severity": severity}]}
+
+
+def _bulk(client, headers, upserts=(), deletes=()):
+    return client.post("/api/logs/bulk", json={"upserts": list(upserts), "deletes": list(deletes)}, headers=headers)
+
+
+def test_bulk_creates_updates_and_deletes(client, auth_headers, db):
+    assert _bulk(client, auth_headers, [_upsert("2024-01-01"), _upsert("2024-01-02")]).json()["created"] == 2
+
+    response = _bulk(
+        client, auth_headers,
+        upserts=[_upsert("2024-01-02", 5), _upsert("2024-01-03")],
+        deletes=["2024-01-01", "2024-02-01"]
+    )
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert {key: body[key] for key in ("created", "updated", "deleted", "not_found", "failed")} == {
+        "created": 1, "updated": 1, "deleted": 1, "not_found": 1, "failed": 0
+    }
+    # Upserts first, in request order
+    assert [(item["op"], item["date"], item["status"]) for item in body["results"]] == [
+        ("upsert", "2024-01-02", "updated"),
+        ("upsert", "2024-01-03", "created"),
+        ("delete", "2024-01-01", "deleted"),
+        ("delete", "2024-02-01", "not_found"),
+    ]
+    assert all(item["id"] for item in body["results"][:3])
+
+    logs = client.get("/api/logs/", headers=auth_headers).json()
+    assert [(log["date"], log["severity_max"]) for log in logs] == [("2024-01-03", 3), ("2024-01-02", 5)]
+    tombstones = run(db.symptom_log_tombstones.find({}, {"_id": 0, "date": 1, "log_id": 1}).to_list(None))
+    assert tombstones == [{"date": "2024-01-01", "log_id": ObjectId(body["results"][2]["id"])}]
+
+
+def test_bulk_rejects_repeated_dates(client, auth_headers):
+    assert _bulk(client, auth_headers, [_upsert("2024-01-01"), _upsert("2024-01-01")]).status_code == 400
+    assert _bulk(client, auth_headers, deletes=["2024-01-01", "2024-01-01"]).status_code == 400
+    assert _bulk(client, auth_headers, [_upsert("2024-01-01")], ["2024-01-01"]).status_code == 400
+
+
+def test_impossible_dates_are_rejected(client, auth_headers, db):
+    assert client.post("/api/logs/", json=_upsert("2024-02-30"), headers=auth_headers).status_code == 422
+    assert _bulk(client, auth_headers, [_upsert("2023-02-29")]).status_code == 422
+    assert _bulk(client, auth_headers, deletes=["2024-13-01"]).status_code == 422
+    assert client.post("/api/logs/", json=_upsert("2024-02-29"), headers=auth_headers).status_code == 200
+    assert run(db.symptom_logs.count_documents({})) == 1
+
+
+def test_failed_items_do_not_fail_the_request(client, auth_headers, db, monkeypatch):
+    _bulk(client, auth_headers, [_upsert("2024-01-01")])
+    collection = type(db.symptom_logs)
+    bulk_write = collection.bulk_write
+
+    async def partly_failing(self, operations, **kwargs):
+        if self.name != "symptom_logs":
+            return await bulk_write(self, operations, **kwargs)
+        # The second upsert fails, the first is applied
+        await bulk_write(self, operations[:1], **kwargs)
+        raise BulkWriteError({
+            "writeErrors": [{"index": 1, "errmsg": "document failed validation"}],
+            "upserted": [],
+        })
+
+    monkeypatch.setattr(collection, "bulk_write", partly_failing)
+    response = _bulk(client, auth_headers, [_upsert("2024-01-01", 5), _upsert("2024-01-02")])
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert (body["updated"], body["failed"]) == (1, 1)
+    assert body["results"][1]["error"] == "document failed validation"
+    assert body["results"][1]["id"] is None
+
+
+def test_bulk_queues_calendar_jobs(client, auth_headers, db, fake_calendar):
+    _bulk(client, auth_headers, [_upsert("2024-01-01")])
+    run(db.calendar_sync_jobs.delete_many({}))
+
+    _bulk(client, auth_headers, [_upsert("2024-01-02")], ["2024-01-01"])
+    jobs = run(db.calendar_sync_jobs.find({}, {"_id": 0, "op": 1, "date": 1}).sort("date", 1).to_list(None))
+    assert jobs == [{"op": "delete", "date": "2024-01-01"}, {"op": "upsert", "date": "2024-01-02"}]
@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta, timezone
+
+from tests.conftest import run
+
+
+def _log(client, headers, date, severity=3):
+    response = client.post(
+        "/api/logs/",
+        json={"date": date, "symptoms": [{"name": "Hot flashes", "severity": severity}]},
+        headers=headers,
+        params={"sync": "true"}
+    )
+    assert response.status_code == 200, response.text
+
+
+def _changes(client, headers, since=None):
+    params = {"since": since} if since else {}
+    response = client.get("/api/logs/changes", params=params, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def _synced(client, headers, db, dates):
+    # Logs written well before the first sync, so its watermark is past them
+    for date in dates:
+        _log(client, headers, date)
+    run(db.symptom_logs.update_many({}, {"$set": {"updated_at": datetime.utcnow() - timedelta(hours=1)}}))
+    first = _changes(client, headers)
+    assert sorted(log["date"] for log in first["changed"]) == dates
+    assert first["deleted"] == []
+    return first["watermark"]
+
+
+def test_changes_since_watermark(client, auth_headers, db):
+    watermark = _synced(client, auth_headers, db, ["2024-01-01", "2024-01-02"])
+    unchanged = _changes(client, auth_headers, watermark)
+    assert (unchanged["changed"], unchanged["deleted"]) == ([], [])
+    assert unchanged["watermark"] >= watermark
+
+    _log(client, auth_headers, "2024-01-02", severity=5)
+    _log(client, auth_headers, "2024-01-03")
+    changes = _changes(client, auth_headers, watermark)
+    assert [log["date"] for log in changes["changed"]] == ["2024-01-02", "2024-01-03"]
+    assert changes["changed"][0]["symptoms"][0]["severity"] == 5
+
+
+def test_deletes_are_reported_as_tombstones(client, auth_headers, db):
+    watermark = _synced(client, auth_headers, db, ["2024-01-01", "2024-01-02"])
+    log_id = run(db.symptom_logs.find_one({"date": "2024-01-01"}))["_id"]
+
+    assert client.delete("/api/logs/2024-01-01", headers=auth_headers).status_code == 204
+    changes = _changes(client, auth_headers, watermark)
+    assert changes["changed"] == []
+    assert [(t["date"], t["id"]) for t in changes["deleted"]] == [("2024-01-01", str(log_id))]
+
+    # Logged again after the delete, the date is only reported as changed
+    _log(client, auth_headers, "2024-01-01")
+    changes = _changes(client, auth_headers, watermark)
+    assert [log["date"] for log in changes["changed"]] == ["2024-01-01"]
+    assert changes["deleted"] == []
+
+
+def test_timezone_aware_watermark(client, auth_headers, db):
+    watermark = _synced(client, auth_headers, db, ["2024-01-01"])
+    _log(client, auth_headers, "2024-01-02")
+    aware = (datetime.fromisoformat(watermark) + timedelta(hours=2)).replace(
+        tzinfo=timezone(timedelta(hours=2))
+    ).isoformat()
+    assert [log["date"] for log in _changes(client, auth_headers, aware)["changed"]] == ["2024-01-02"]
+
+
+def test_watermark_older_than_tombstones_is_gone(client, auth_headers):
+    since = (datetime.utcnow() - timedelta(days=365)).isoformat()
+    response = client.get("/api/logs/changes", params={"since": since}, headers=auth_headers)
+    assert response.status_code == 410
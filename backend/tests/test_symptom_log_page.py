@@ -0,0 +1,50 @@
+import pytest
+
+from utils.pagination import decode_cursor, encode_cursor
+
+
+def _page(client, headers, **params):
+    response = client.get("/api/logs/page", params=params, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_pages_walk_all_logs(client, auth_headers):
+    dates = [f"2024-01-{day:02d}" for day in range(1, 6)]
+    for date in dates:
+        client.post("/api/logs/", json={"date": date, "symptoms": []}, headers=auth_headers, params={"sync": "true"})
+
+    seen = []
+    page = _page(client, auth_headers, limit=2)
+    while True:
+        seen += [log["date"] for log in page["items"]]
+        if not page["next_cursor"]:
+            break
+        page = _page(client, auth_headers, limit=2, cursor=page["next_cursor"])
+    assert seen == dates[::-1]
+
+    ascending = _page(client, auth_headers, limit=3, order="asc")
+    assert [log["date"] for log in ascending["items"]] == dates[:3]
+    rest = _page(client, auth_headers, limit=3, order="asc", cursor=ascending["next_cursor"])
+    assert [log["date"] for log in rest["items"]] == dates[3:]
+    assert rest["next_cursor"] is None
+
+
+@pytest.mark.parametrize("cursor", [
+    "not-base64!",
+    encode_cursor({"date": "zzz"}),
+    encode_cursor({"date": "2024-13-01"}),
+    encode_cursor({"date": "20240101"}),
+    encode_cursor({"date": "2024-01-01\n"}),
+    encode_cursor({"date": 20240101}),
+    encode_cursor({"other": "2024-01-01"}),
+])
+def test_invalid_cursor_is_rejected(client, auth_headers, cursor):
+    response = client.get("/api/logs/page", params={"cursor": cursor}, headers=auth_headers)
+    assert response.status_code == 400
+
+
+def test_decode_cursor_round_trip():
+    assert decode_cursor(encode_cursor({"date": "2024-02-29"})) == {"date": "2024-02-29"}
+    with pytest.raises(ValueError):
+        decode_cursor(encode_cursor({"date": "2023-02-29"}))
@@ -0,0 +1,119 @@
+from datetime import datetime
+
+from bson import ObjectId
+
+from services.symptom_rollup_service import _rollup_updates, _settle, rebuild_rollups, symptom_key
+from tests.conftest import run
+
+# Catalog names, which is what log writes store
+HOT = symptom_key("Hot Flushes")
+SLEEP = symptom_key("Sleep Quality")
+
+
+def _log(date, **severities):
+    names = {"hot": "Hot Flushes", "sleep": "Sleep Quality"}
+    return {"date": date, "symptoms": [{"name": names[key], "severity": value} for key, value in severities.items()]}
+
+
+def _month_update(updates):
+    return next(update._doc for update in updates if update._filter["granularity"] == "month")
+
+
+def _rollups(db, user_id):
+    cursor = db.symptom_rollups.find({"user_id": user_id}, {"_id": 0, "updated_at": 0})
+    return sorted(run(cursor.to_list(None)), key=lambda rollup: (rollup["granularity"], rollup["period"]))
+
+
+def _write(client, headers, date, **severities):
+    response = client.post("/api/logs/", json=_log(date, **severities), headers=headers, params={"sync": "true"})
+    assert response.status_code == 200, response.text
+
+
+def test_rollup_updates_for_create_update_and_delete():
+    user_id = ObjectId()
+    now = datetime.utcnow()
+
+    updates, shrunk = _rollup_updates(user_id, [(None, _log("2024-01-02", hot=3))], now)
+    assert sorted(update._filter["period"] for update in updates) == ["2024-01", "2024-W01"]
+    assert _month_update(updates) == {
+        "$inc": {f"symptoms.{HOT}.count": 1, f"symptoms.{HOT}.sum": 3},
+        "$set": {f"symptoms.{HOT}.name": "Hot Flushes", f"symptoms.{HOT}.days.2024-01-02": 3, "updated_at": now},
+        "$max": {f"symptoms.{HOT}.max": 3},
+    }
+    assert shrunk == []
+
+    # A lower severity keeps the count and may lower the max
+    updates, shrunk = _rollup_updates(user_id, [(_log("2024-01-02", hot=3), _log("2024-01-02", hot=1))], now)
+    assert _month_update(updates)["$inc"] == {f"symptoms.{HOT}.count": 0, f"symptoms.{HOT}.sum": -2}
+    assert len(shrunk) == 2
+
+    # Unchanged symptoms are left alone; removed ones are unset
+    updates, _ = _rollup_updates(
+        user_id, [(_log("2024-01-02", hot=3, sleep=2), _log("2024-01-02", hot=3))], now
+    )
+    assert _month_update(updates)["$unset"] == {f"symptoms.{SLEEP}.days.2024-01-02": ""}
+    assert _month_update(updates)["$inc"] == {f"symptoms.{SLEEP}.count": -1, f"symptoms.{SLEEP}.sum": -2}
+
+    updates, shrunk = _rollup_updates(user_id, [(_log("2024-01-02", hot=3), None)], now)
+    assert _month_update(updates)["$inc"] == {f"symptoms.{HOT}.count": -1, f"symptoms.{HOT}.sum": -3}
+    assert len(shrunk) == 2
+
+
+def test_settle_recomputes_max_and_drops_empty_rollups(db):
+    user_id = ObjectId()
+    run(db.symptom_rollups.insert_many([
+        {"user_id": user_id, "granularity": "month", "period": "2024-01", "symptoms": {
+            HOT: {"name": "Hot Flushes", "count": 1, "sum": 2, "max": 5, "days": {"2024-01-02": 2}},
+            SLEEP: {"name": "Sleep Quality", "count": 0, "sum": 0, "max": 4, "days": {}},
+        }},
+        {"user_id": user_id, "granularity": "month", "period": "2024-02", "symptoms": {
+            HOT: {"name": "Hot Flushes", "count": 0, "sum": 0, "max": 3, "days": {}},
+        }},
+    ]))
+    run(_settle(db, [
+        {"user_id": user_id, "granularity": "month", "period": period} for period in ("2024-01", "2024-02")
+    ]))
+
+    assert _rollups(db, user_id) == [{"user_id": user_id, "granularity": "month", "period": "2024-01", "symptoms": {
+        HOT: {"name": "Hot Flushes", "count": 1, "sum": 2, "max": 2, "days": {"2024-01-02": 2}},
+    }}]
+
+
+def test_incremental_rollups_match_rebuild(client, auth_headers, db, user):
+    _write(client, auth_headers, "2024-01-01", hot=4, sleep=2)
+    _write(client, auth_headers, "2024-01-02", hot=5)
+    _write(client, auth_headers, "2024-02-05", sleep=3)
+    _write(client, auth_headers, "2024-01-02", hot=1, sleep=4)
+    _write(client, auth_headers, "2024-01-01", sleep=2)
+    assert client.delete("/api/logs/2024-02-05", headers=auth_headers).status_code == 204
+
+    incremental = _rollups(db, user["_id"])
+    assert [(rollup["granularity"], rollup["period"]) for rollup in incremental] == [
+        ("month", "2024-01"), ("week", "2024-W01")
+    ]
+    assert incremental[0]["symptoms"][HOT]["max"] == 1
+
+    run(rebuild_rollups(db, user["_id"]))
+    assert _rollups(db, user["_id"]) == incremental
+
+
+def test_rebuild_replaces_in_place_and_deletes_stale_periods(client, auth_headers, db, user):
+    _write(client, auth_headers, "2024-01-01", hot=4)
+    month = run(db.symptom_rollups.find_one({"granularity": "month", "period": "2024-01"}))
+    # Drifted counts, and a period whose logs are gone
+    run(db.symptom_rollups.update_one({"_id": month["_id"]}, {"$inc": {f"symptoms.{HOT}.count": 5}}))
+    run(db.symptom_rollups.insert_one({
+        "user_id": user["_id"], "granularity": "month", "period": "2023-12", "symptoms": {}
+    }))
+    other_user = ObjectId()
+    run(db.symptom_rollups.insert_one({"user_id": other_user, "granularity": "month", "period": "2023-12"}))
+
+    assert run(rebuild_rollups(db, user["_id"])) == 2
+
+    rebuilt = run(db.symptom_rollups.find_one({"granularity": "month", "period": "2024-01"}))
+    assert rebuilt["_id"] == month["_id"]
+    assert rebuilt["symptoms"][HOT]["count"] == 1
+    assert [(r["granularity"], r["period"]) for r in _rollups(db, user["_id"])] == [
+        ("month", "2024-01"), ("week", "2024-W01")
+    ]
+    assert run(db.symptom_rollups.count_documents({"user_id": other_user})) == 1
@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta
+
+from services.symptom_severity import backfill_severity_fields, severity_fields
+from tests.conftest import run
+
+SEVERITY_FIELDS = ("severity_mean", "severity_max", "symptom_count", "severity_level")
+
+
+def test_severity_fields():
+    assert severity_fields([{"severity": 5}, {"severity": 4}]) == {
+        "severity_mean": 4.5, "severity_max": 5, "symptom_count": 2, "severity_level": "severe"
+    }
+    assert severity_fields([])["severity_level"] == "mild"
+
+
+def test_backfill_changes_etag_and_delta_sync(client, auth_headers, db):
+    for date in ("2024-01-01", "2024-01-02"):
+        response = client.post(
+            "/api/logs/",
+            json={"date": date, "symptoms": [{"name": "Hot flashes", "severity": 3}]},
+            headers=auth_headers,
+            params={"sync": "true"}
+        )
+        assert response.status_code == 200, response.text
+    # Logs written before the fields existed
+    written_at = datetime.utcnow() - timedelta(days=1)
+    run(db.symptom_logs.update_many({"date": "2024-01-01"}, {
+        "$unset": {field: "" for field in SEVERITY_FIELDS},
+        "$set": {"updated_at": written_at},
+    }))
+    run(db.symptom_logs.update_many({"date": "2024-01-02"}, {"$set": {"updated_at": written_at}}))
+
+    listing = client.get("/api/logs/", headers=auth_headers)
+    assert listing.json()[1]["severity_level"] is None
+    since = client.get("/api/logs/changes", headers=auth_headers).json()["watermark"]
+
+    assert run(backfill_severity_fields(db)) == 1
+
+    refreshed = client.get("/api/logs/", headers={**auth_headers, "If-None-Match": listing.headers["etag"]})
+    assert refreshed.status_code == 200
+    assert refreshed.json()[1]["severity_level"] == "moderate"
+    changes = client.get("/api/logs/changes", params={"since": since}, headers=auth_headers).json()
+    assert [log["date"] for log in changes["changed"]] == ["2024-01-01"]
+    assert changes["changed"][0]["severity_mean"] == 3
+
+    # Nothing left to backfill
+    assert run(backfill_severity_fields(db)) == 0
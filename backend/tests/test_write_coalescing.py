@@ -0,0 +1,172 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from models.symptom_log import SymptomLogCreate
+from models.user import UserInDB
+from services import symptom_log_service
+from utils.write_buffer import CoalescingWriteBuffer
+from tests.conftest import run
+
+WINDOW = 0.1
+DATE = "2024-03-01"
+
+
+@pytest.fixture
+def buffer(monkeypatch):
+    buffer = CoalescingWriteBuffer(WINDOW)
+    monkeypatch.setattr(symptom_log_service, "log_write_buffer", buffer)
+    return buffer
+
+
+@pytest.fixture
+def user_in_db(db, user):
+    return UserInDB(**user)
+
+
+def _log_in(severity):
+    return SymptomLogCreate(date=DATE, symptoms=[{"name": "Anxiety", "severity": severity}])
+
+
+def _stored(db):
+    return run(db.symptom_logs.find_one({"date": DATE}))
+
+
+def test_burst_is_written_once_per_window(db, user_in_db, buffer):
+    async def burst():
+        for severity in (1, 2, 3, 4):
+            await symptom_log_service.upsert_log(db, user_in_db, _log_in(severity), durable=False)
+        held = (await db.symptom_logs.find_one({"date": DATE}))["symptoms"][0]["severity"]
+        await asyncio.sleep(WINDOW * 3)
+        return held
+
+    assert run(burst()) == 1
+    assert _stored(db)["symptoms"][0]["severity"] == 4
+    assert buffer.stats()["writes"] == 2
+    assert buffer.stats()["coalesced"] == 2
+    assert buffer.stats()["open"] == 0
+
+
+def test_held_write_is_stamped_when_applied(db, user_in_db, buffer):
+    async def held_write():
+        await symptom_log_service.upsert_log(db, user_in_db, _log_in(1), durable=False)
+        preview = await symptom_log_service.upsert_log(db, user_in_db, _log_in(2), durable=False)
+        await asyncio.sleep(WINDOW * 3)
+        return preview
+
+    preview = run(held_write())
+    assert preview["symptoms"][0]["severity"] == 2
+    # A client that synced while the write was held has a watermark after
+    # its receipt; the write's updated_at must be later still
+    assert _stored(db)["updated_at"] > preview["updated_at"]
+
+
+def test_held_write_skips_newer_writes_only(db, user_in_db):
+    written = run(symptom_log_service._write_log(db, user_in_db, _log_in(1), datetime.utcnow()))
+
+    # Received before the buffer's own last write was stamped: still applied
+    received_at = written["updated_at"] - timedelta(seconds=1)
+    assert run(symptom_log_service._write_log(db, user_in_db, _log_in(2), received_at, written)) is not None
+    assert _stored(db)["symptoms"][0]["severity"] == 2
+
+    # Another worker wrote after it was received: superseded
+    run(db.symptom_logs.update_one({"date": DATE}, {"$set": {"updated_at": datetime.utcnow() + timedelta(seconds=5)}}))
+    assert run(symptom_log_service._write_log(db, user_in_db, _log_in(3), datetime.utcnow(), written)) is None
+    assert _stored(db)["symptoms"][0]["severity"] == 2
+
+
+def test_reads_see_held_writes(client, auth_headers, db, buffer):
+    for severity in (1, 2, 3):
+        response = client.post("/api/logs/", json=_log_in(severity).dict(), headers=auth_headers)
+        assert response.json()["symptoms"][0]["severity"] == severity
+    assert _stored(db)["symptoms"][0]["severity"] == 1
+
+    logs = client.get("/api/logs/", headers=auth_headers).json()
+    assert logs[0]["symptoms"][0]["severity"] == 3
+    assert _stored(db)["symptoms"][0]["severity"] == 3
+
+
+def test_sync_and_delete_drop_held_writes(client, auth_headers, db, buffer):
+    client.post("/api/logs/", json=_log_in(1).dict(), headers=auth_headers)
+    client.post("/api/logs/", json=_log_in(2).dict(), headers=auth_headers)
+    client.post("/api/logs/", json=_log_in(5).dict(), headers=auth_headers, params={"sync": "true"})
+    assert _stored(db)["symptoms"][0]["severity"] == 5
+    assert buffer.stats()["open"] == 0
+
+    client.post("/api/logs/", json=_log_in(1).dict(), headers=auth_headers)
+    client.post("/api/logs/", json=_log_in(2).dict(), headers=auth_headers)
+    assert client.delete(f"/api/logs/{DATE}", headers=auth_headers).status_code == 204
+    run(symptom_log_service.flush_pending())
+    assert _stored(db) is None
+
+
+def _flaky_write(failures, written):
+    calls = {"count": 0}
+
+    async def write(previous):
+        calls["count"] += 1
+        if previous is not None and calls["count"] <= failures + 1:
+            raise ConnectionError("primary stepped down")
+        written.append(calls["count"])
+        return {"version": calls["count"]}
+    return write
+
+
+def test_failed_held_write_is_retried():
+    buffer = CoalescingWriteBuffer(0.01, max_retries=3)
+    written = []
+
+    async def scenario():
+        write = _flaky_write(2, written)
+        await buffer.submit("key", write, lambda result: result)
+        await buffer.submit("key", write, lambda result: result)
+        await asyncio.sleep(0.5)
+
+    run(scenario())
+    # Direct write, two failed attempts of the held write, then success
+    assert written == [1, 4]
+    stats = buffer.stats()
+    assert (stats["failures"], stats["retries"], stats["dropped"], stats["open"]) == (2, 2, 0, 0)
+
+
+def test_held_write_is_dropped_after_max_retries():
+    buffer = CoalescingWriteBuffer(0.01, max_retries=2)
+    written = []
+
+    async def scenario():
+        write = _flaky_write(10, written)
+        await buffer.submit("key", write, lambda result: result)
+        await buffer.submit("key", write, lambda result: result)
+        await asyncio.sleep(0.5)
+
+    run(scenario())
+    assert written == [1]
+    stats = buffer.stats()
+    assert (stats["failures"], stats["retries"], stats["dropped"], stats["open"]) == (3, 2, 1, 0)
+
+
+def test_failed_flush_keeps_value_held():
+    buffer = CoalescingWriteBuffer(10)
+    written = []
+
+    async def scenario():
+        write = _flaky_write(1, written)
+        await buffer.submit("key", write, lambda result: result)
+        await buffer.submit("key", write, lambda result: result)
+        await buffer.flush()
+        held = buffer.stats()["held"]
+        await buffer.flush()
+        return held
+
+    assert run(scenario()) == 1
+    assert written == [1, 3]
+    assert buffer.stats()["open"] == 0
+
+
+def test_coalescing_is_disabled_with_several_workers():
+    settings = symptom_log_service.settings
+    single = settings.model_copy(update={"log_write_coalesce_seconds": 2.0, "web_concurrency": 1})
+    several = settings.model_copy(update={"log_write_coalesce_seconds": 2.0, "web_concurrency": 4})
+    assert symptom_log_service.coalesce_window(single) == 2.0
+    assert symptom_log_service.coalesce_window(several) == 0.0
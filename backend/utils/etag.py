@@ -0,0 +1,74 @@
+"""
+ETag helpers for conditional GET requests.
+Handlers compute an ETag from a cheap summary of what a response would
+contain and answer If-None-Match with 304 before building the response.
+"""
+import hashlib
+import json
+from typing import Any, Dict
+
+from fastapi import Request, Response
+
+# Clients may store responses but must revalidate them on every use
+CACHE_CONTROL = "private, no-cache"
+
+
+def compute_etag(*parts: Any) -> str:
+    """
+    Build a strong ETag from the values a response depends on.
+
+    Args:
+        *parts: JSON-serializable values; datetimes and ObjectIds are stringified
+
+    Returns:
+        Quoted ETag value
+    """
+    raw = json.dumps(parts, default=str, sort_keys=True, separators=(",", ":"))
+    return '"' + hashlib.sha256(raw.encode()).hexdigest()[:32] + '"'
+
+
+def etag_headers(etag: str) -> Dict[str, str]:
+    """
+    Get the caching headers sent with a response.
+
+    Args:
+        etag: ETag of the response
+
+    Returns:
+        Header dictionary
+    """
+    return {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    """
+    Check whether the client's cached copy, per If-None-Match, is current.
+
+    Args:
+        request: Incoming request
+        etag: ETag of the current response
+
+    Returns:
+        True if a 304 should be sent
+    """
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison, so W/ prefixes are ignored
+    candidates = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return etag in candidates
+
+
+def not_modified(etag: str) -> Response:
+    """
+    Build an empty 304 response.
+
+    Args:
+        etag: ETag of the current response
+
+    Returns:
+        304 Not Modified response
+    """
+    return Response(status_code=304, headers=etag_headers(etag))
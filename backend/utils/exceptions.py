@@ -30,4 +30,9 @@ class CalendarNotConnectedError(GoogleCalendarError):
 
 class InvalidCredentialsError(GoogleCalendarError):
     """Raised when Google credentials are invalid or expired."""
+    pass
+
+
+class SyncTokenExpiredError(GoogleCalendarSyncError):
+    """Raised when Google rejects a stored sync token (HTTP 410) and a full resync is needed."""
     pass
\ No newline at end of file
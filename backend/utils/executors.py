@@ -0,0 +1,152 @@
+"""
+Bounded thread pools for blocking work called from async handlers.
+Each pool caps concurrency and the number of callers allowed to wait,
+so overload is rejected quickly instead of stalling the event loop.
+"""
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional
+
+from utils.metrics import LatencyRecorder, register_metrics
+
+logger = logging.getLogger(__name__)
+
+_executors: List["BoundedExecutor"] = []
+
+
+class ExecutorOverloadedError(Exception):
+    """Raised when a bounded executor's wait queue is full."""
+    pass
+
+
+class ExecutorTimeoutError(Exception):
+    """Raised when a job in a bounded executor exceeds its timeout."""
+    pass
+
+
+class BoundedExecutor:
+    """Thread pool with admission control and latency statistics."""
+
+    def __init__(
+        self,
+        name: str,
+        max_workers: int,
+        max_queue: int,
+        timeout: Optional[float] = None
+    ):
+        """
+        Initialize the executor. Threads are started lazily on first use.
+
+        Args:
+            name: Name used for thread names and metrics
+            max_workers: Maximum number of jobs running at once
+            max_queue: Maximum number of callers waiting for a free worker
+            timeout: Seconds a caller waits for a running job, or None for no limit
+        """
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._semaphore = asyncio.Semaphore(max_workers)
+        self._waiting = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.run_latency = LatencyRecorder()
+        self.queue_wait = LatencyRecorder()
+
+        _executors.append(self)
+        register_metrics(f"executor.{name}", self.stats)
+
+    async def run(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """
+        Run a blocking callable in the pool.
+
+        Args:
+            func: Callable to run in a worker thread
+            *args: Positional arguments for the callable
+            **kwargs: Keyword arguments for the callable
+
+        Returns:
+            The callable's return value
+
+        Raises:
+            ExecutorOverloadedError: If all workers are busy and the wait queue is full
+            ExecutorTimeoutError: If the job runs longer than the executor's timeout
+        """
+        if self._semaphore.locked() and self._waiting >= self.max_queue:
+            self.rejected += 1
+            raise ExecutorOverloadedError(f"{self.name} executor is overloaded")
+
+        enqueued_at = time.perf_counter()
+        self._waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._waiting -= 1
+
+        started_at = time.perf_counter()
+        self.queue_wait.observe(started_at - enqueued_at)
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._get_executor(), partial(func, *args, **kwargs))
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            raise ExecutorTimeoutError(
+                f"{self.name} job did not finish within {self.timeout}s"
+            ) from None
+        finally:
+            self.run_latency.observe(time.perf_counter() - started_at)
+            # A thread cannot be interrupted, so an abandoned job keeps its
+            # slot until it really finishes; otherwise hung calls pile up
+            if future.done():
+                self._semaphore.release()
+            else:
+                future.add_done_callback(self._release_abandoned)
+
+    def _release_abandoned(self, future: asyncio.Future) -> None:
+        if not future.cancelled() and future.exception() is not None:
+            logger.warning(f"Abandoned {self.name} job failed: {future.exception()}")
+        self._semaphore.release()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix=self.name
+            )
+        return self._executor
+
+    def shutdown(self) -> None:
+        """Stop the worker threads, waiting for running jobs to finish."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get executor counters.
+
+        Returns:
+            Dictionary with pool limits, queue depth, rejections and latencies
+        """
+        return {
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "waiting": self._waiting,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "run_latency": self.run_latency.percentiles(),
+            "queue_wait": self.queue_wait.percentiles(),
+        }
+
+
+def shutdown_executors() -> None:
+    """Shut down every bounded executor. Called on application shutdown."""
+    for executor in _executors:
+        executor.shutdown()
+    logger.info("Shut down bounded executors")
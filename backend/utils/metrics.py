@@ -0,0 +1,82 @@
+"""
+Lightweight in-process metrics registry.
+Components register a callable returning their counters, and the
+/metrics endpoint collects them into a single snapshot.
+"""
+import logging
+from collections import deque
+from typing import Any, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+_providers: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+
+def register_metrics(name: str, provider: Callable[[], Dict[str, Any]]) -> None:
+    """
+    Register a metrics provider under a name.
+
+    Args:
+        name: Section name in the metrics snapshot
+        provider: Callable returning a dictionary of counters
+    """
+    _providers[name] = provider
+
+
+def collect_metrics() -> Dict[str, Any]:
+    """
+    Collect a snapshot from every registered provider.
+
+    Returns:
+        Dictionary mapping provider names to their counters
+    """
+    snapshot = {}
+    for name, provider in _providers.items():
+        try:
+            snapshot[name] = provider()
+        except Exception as e:
+            logger.warning(f"Failed to collect metrics for {name}: {e}")
+            snapshot[name] = {"error": str(e)}
+    return snapshot
+
+
+class LatencyRecorder:
+    """Keeps a rolling window of latency samples and reports percentiles."""
+
+    def __init__(self, window: int = 1024):
+        """
+        Initialize the recorder.
+
+        Args:
+            window: Number of most recent samples kept for percentile estimates
+        """
+        self._samples = deque(maxlen=window)
+        self.count = 0
+
+    def observe(self, seconds: float) -> None:
+        """
+        Record a latency sample.
+
+        Args:
+            seconds: Observed duration in seconds
+        """
+        self._samples.append(seconds)
+        self.count += 1
+
+    def percentiles(self) -> Dict[str, Any]:
+        """
+        Summarize the current window.
+
+        Returns:
+            Dictionary with sample count and p50/p99 in milliseconds
+        """
+        if not self._samples:
+            return {"count": self.count, "p50_ms": None, "p99_ms": None}
+
+        ordered = sorted(self._samples)
+        last = len(ordered) - 1
+        return {
+            "count": self.count,
+            "p50_ms": round(ordered[int(last * 0.50)] * 1000, 3),
+            "p99_ms": round(ordered[int(last * 0.99)] * 1000, 3),
+        }
@@ -0,0 +1,64 @@
+"""
+Opaque cursors for keyset pagination.
+A cursor is the sort key of the last item of a page, encoded so clients
+treat it as a token rather than building their own.
+"""
+import base64
+import binascii
+import json
+import re
+from datetime import date
+from typing import Any, Dict
+
+DATE_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+
+def _is_date(value: Any) -> bool:
+    if not isinstance(value, str) or not DATE_PATTERN.fullmatch(value):
+        return False
+    try:
+        date.fromisoformat(value)
+    except ValueError:
+        return False
+    return True
+
+
+def encode_cursor(position: Dict[str, Any]) -> str:
+    """
+    Encode a page position as an opaque cursor.
+
+    Args:
+        position: JSON-serializable sort key of the last item returned
+
+    Returns:
+        URL-safe cursor string
+    """
+    raw = json.dumps(position, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    """
+    Decode a cursor produced by encode_cursor.
+
+    Args:
+        cursor: Cursor string from a previous page
+
+    Returns:
+        The encoded page position
+
+    Raises:
+        ValueError: If the cursor is malformed, or its date is not a
+            YYYY-MM-DD date
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        position = json.loads(raw)
+    except (binascii.Error, ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(position, dict):
+        raise ValueError("Invalid cursor")
+    # Positions are compared with stored log dates
+    if "date" in position and not _is_date(position["date"]):
+        raise ValueError("Invalid cursor")
+    return position
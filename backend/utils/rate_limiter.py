@@ -0,0 +1,237 @@
+"""
+Quota-aware rate limiting for Google API calls.
+
+A global token bucket caps the process-wide request rate and a bucket per
+user keeps one user's bulk sync from starving everyone else. Requests that
+fail with rate-limit or transient server errors are retried with
+exponential jittered backoff, honoring Retry-After when Google sends it.
+
+Calls are made from worker threads, so waiting uses time.sleep.
+"""
+import logging
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from googleapiclient.errors import HttpError
+
+from config import get_settings
+from utils.cache import TTLCache
+from utils.metrics import register_metrics
+
+logger = logging.getLogger(__name__)
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """
+    Check whether a Google API error is worth retrying.
+
+    Args:
+        error: Exception raised for a request
+
+    Returns:
+        True for rate limit and transient server errors
+    """
+    if not isinstance(error, HttpError):
+        return False
+
+    status = error.resp.status
+    if status == 429 or status >= 500:
+        return True
+    if status == 403:
+        content = error.content.decode('utf-8', errors='ignore')
+        return 'rateLimitExceeded' in content or 'userRateLimitExceeded' in content
+    return False
+
+
+def _retry_after_seconds(error: Exception) -> Optional[float]:
+    if not isinstance(error, HttpError):
+        return None
+    value = error.resp.get('retry-after')
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Thread-safe token bucket that hands out waiting times instead of blocking."""
+
+    def __init__(self, rate: float, capacity: float):
+        """
+        Initialize a full bucket.
+
+        Args:
+            rate: Tokens added per second
+            capacity: Maximum number of tokens (burst size)
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: float = 1) -> float:
+        """
+        Take tokens, going into debt if needed.
+
+        Args:
+            tokens: Number of tokens to take
+
+        Returns:
+            Seconds the caller must wait before using the tokens
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            self._tokens -= tokens
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+
+class GoogleApiLimiter:
+    """Shared limiter and retry policy for Google API requests."""
+
+    def __init__(self):
+        """Initialize the limiter from application settings."""
+        settings = get_settings()
+        self.global_qps = settings.google_api_global_qps
+        self.user_qps = settings.google_api_user_qps
+        self.max_retries = settings.google_api_max_retries
+        self.backoff_base = settings.google_api_backoff_base_seconds
+        self.backoff_max = settings.google_api_backoff_max_seconds
+
+        self._global = TokenBucket(self.global_qps, max(self.global_qps, 1))
+        self._users = TTLCache(max_size=10000, ttl_seconds=3600)
+        self._users_lock = threading.Lock()
+        self._counters_lock = threading.Lock()
+        self.counters = {"calls": 0, "throttled": 0, "retried": 0, "failed": 0}
+
+    def _user_bucket(self, user_key: str) -> TokenBucket:
+        with self._users_lock:
+            bucket = self._users.get(user_key)
+            if bucket is None:
+                bucket = TokenBucket(self.user_qps, max(self.user_qps, 1))
+                self._users.set(user_key, bucket)
+            return bucket
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._counters_lock:
+            self.counters[name] += amount
+
+    def acquire(self, user_key: Optional[str], cost: int = 1) -> None:
+        """
+        Wait until both the global and the user's budget allow a request.
+
+        Args:
+            user_key: Key identifying the user, or None for unattributed calls
+            cost: Number of API calls the request counts as (batch size)
+        """
+        wait = self._global.reserve(cost)
+        if user_key:
+            wait = max(wait, self._user_bucket(user_key).reserve(cost))
+        if wait > 0:
+            self._count("throttled")
+            time.sleep(wait)
+
+    def backoff_delay(self, attempt: int, error: Optional[Exception] = None) -> float:
+        """
+        Compute how long to wait before a retry.
+
+        Args:
+            attempt: Retry number, starting at 1
+            error: Error that triggered the retry, checked for Retry-After
+
+        Returns:
+            Delay in seconds
+        """
+        retry_after = _retry_after_seconds(error)
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max)
+        delay = min(self.backoff_base * 2 ** (attempt - 1), self.backoff_max)
+        # Full jitter spreads out retries from many concurrent callers
+        return random.uniform(delay / 2, delay)
+
+    def note_retries(self, count: int) -> None:
+        """
+        Record retries performed outside execute(), e.g. batch items.
+
+        Args:
+            count: Number of retried calls
+        """
+        self._count("retried", count)
+
+    def execute(
+        self,
+        call: Callable[[], Any],
+        user_key: Optional[str],
+        cost: int = 1,
+        max_retries: Optional[int] = None
+    ) -> Any:
+        """
+        Run a Google API call under the rate limits, retrying retryable errors.
+
+        Args:
+            call: Callable performing the request, e.g. request.execute
+            user_key: Key identifying the user, or None for unattributed calls
+            cost: Number of API calls the request counts as (batch size)
+            max_retries: Override of the configured retry count
+
+        Returns:
+            The call's result
+
+        Raises:
+            HttpError: If the call fails with a non-retryable error or retries run out
+        """
+        if max_retries is None:
+            max_retries = self.max_retries
+        attempt = 0
+        while True:
+            self.acquire(user_key, cost)
+            self._count("calls")
+            try:
+                return call()
+            except HttpError as e:
+                attempt += 1
+                if not is_retryable_error(e) or attempt > max_retries:
+                    self._count("failed")
+                    raise
+                delay = self.backoff_delay(attempt, e)
+                self._count("retried")
+                logger.warning(
+                    f"Google API call throttled or failed ({e.resp.status}), "
+                    f"retry {attempt}/{max_retries} in {delay:.1f}s"
+                )
+                time.sleep(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get limiter counters.
+
+        Returns:
+            Dictionary with configured rates and call counters
+        """
+        with self._counters_lock:
+            counters = dict(self.counters)
+        return {"global_qps": self.global_qps, "user_qps": self.user_qps, **counters}
+
+
+# Global instance
+_google_api_limiter: Optional[GoogleApiLimiter] = None
+
+
+def get_google_api_limiter() -> GoogleApiLimiter:
+    """
+    Get or create the global Google API limiter.
+
+    Returns:
+        GoogleApiLimiter instance
+    """
+    global _google_api_limiter
+    if _google_api_limiter is None:
+        _google_api_limiter = GoogleApiLimiter()
+        register_metrics("google_api_limiter", _google_api_limiter.stats)
+    return _google_api_limiter
@@ -1,10 +1,11 @@
 """
 Security utilities for password hashing and JWT authentication.
 """
+import hmac
 from datetime import datetime, timedelta
 from typing import Optional
 from fastapi import Depends, HTTPException, status
-from fastapi.security import OAuth2PasswordBearer
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer, OAuth2PasswordBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from bson import ObjectId
@@ -12,6 +13,9 @@ from bson import ObjectId
 from models.user import UserResponse, UserInDB
 from database import get_database
 from config import get_settings
+from utils.cache import TTLCache
+from utils.executors import BoundedExecutor, ExecutorOverloadedError
+from utils.metrics import register_metrics
 
 settings = get_settings()
 
@@ -21,6 +25,25 @@ pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
 # OAuth2 scheme
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
+# Operator token for internal endpoints such as /metrics
+metrics_scheme = HTTPBearer(auto_error=False)
+
+# Validated principals keyed by user id, so bursts of authenticated requests
+# don't each re-read and re-validate the user document
+user_cache = TTLCache(
+    max_size=settings.user_cache_max_size,
+    ttl_seconds=settings.user_cache_ttl_seconds
+)
+register_metrics("user_cache", user_cache.stats)
+
+# argon2 is CPU-bound but releases the GIL, so a small thread pool keeps it
+# off the event loop; the queue limit sheds login storms with a 503
+password_executor = BoundedExecutor(
+    "password_hashing",
+    max_workers=settings.password_hash_workers,
+    max_queue=settings.password_hash_queue_limit
+)
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against a hash."""
     return pwd_context.verify(plain_password, hashed_password)
@@ -29,6 +52,24 @@ def get_password_hash(password: str) -> str:
     """Generate a password hash."""
     return pwd_context.hash(password)
 
+async def _run_password_job(func, *args):
+    try:
+        return await password_executor.run(func, *args)
+    except ExecutorOverloadedError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Authentication service is busy, please retry shortly",
+            headers={"Retry-After": "1"},
+        )
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password against a hash in the password executor."""
+    return await _run_password_job(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """Generate a password hash in the password executor."""
+    return await _run_password_job(get_password_hash, password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create a JWT access token."""
     to_encode = data.copy()
@@ -41,11 +82,21 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     encoded_jwt = jwt.encode(to_encode, settings.jwt_secret, algorithm="HS256")
     return encoded_jwt
 
+def invalidate_cached_user(user_id) -> None:
+    """
+    Drop a user from the authenticated-user cache.
+    Must be called by every code path that writes to the user document.
+    """
+    user_cache.invalidate(str(user_id))
+
 async def get_current_user(token: str = Depends(oauth2_scheme)) -> UserInDB:
     """
     Dependency to get the current authenticated user from the JWT token.
     Returns the full database model (including sensitive fields like google_auth).
     Endpoints should map this to UserResponse before returning to client.
+
+    Validated users are cached for a short TTL; the returned instance may be
+    shared between requests and must be treated as read-only.
     """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -60,6 +111,10 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> UserInDB:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
+
+    cached_user = user_cache.get(user_id)
+    if cached_user is not None:
+        return cached_user
         
     db = await get_database()
     try:
@@ -69,5 +124,27 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> UserInDB:
     
     if user is None:
         raise credentials_exception
-        
-    return UserInDB(**user)
\ No newline at end of file
+
+    user_in_db = UserInDB(**user)
+    user_cache.set(user_id, user_in_db)
+    return user_in_db
+
+
+def verify_metrics_token(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(metrics_scheme)
+) -> None:
+    """
+    Dependency guarding operational endpoints such as /metrics.
+    They are not found unless METRICS_TOKEN is set, and then require it as
+    a bearer token; user access tokens are not accepted.
+    """
+    if not settings.metrics_token:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if credentials is None or not hmac.compare_digest(
+        credentials.credentials.encode(), settings.metrics_token.encode()
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid metrics token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
@@ -0,0 +1,230 @@
+"""
+In-process write coalescing.
+Provides a per-key buffer that turns a burst of writes to the same record
+into at most one database write per flush window.
+"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Writes a value; called with None for direct writes, or with the last
+# written result for held values, which should not overwrite newer writes
+# and may return None if superseded
+WriteFunc = Callable[[Optional[Any]], Awaitable[Optional[Any]]]
+
+# Builds the result of a buffered write from the last written result
+PreviewFunc = Callable[[Any], Any]
+
+# Failed held writes are retried this many times before being dropped
+HELD_WRITE_MAX_RETRIES = 5
+
+# Longest delay between retries of a failed held write
+MAX_RETRY_DELAY_SECONDS = 30.0
+
+
+class _Entry:
+    """Buffer state of one key."""
+
+    __slots__ = ("lock", "result", "write", "task", "closed", "failures", "delay")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        # Last result written to the database
+        self.result: Optional[Any] = None
+        # Write of the latest buffered value, None if nothing is pending
+        self.write: Optional[WriteFunc] = None
+        self.task: Optional[asyncio.Task] = None
+        self.closed = False
+        # Consecutive failed writes of the held value, and the wait before
+        # the next attempt
+        self.failures = 0
+        self.delay: Optional[float] = None
+
+
+class CoalescingWriteBuffer:
+    """
+    Per-key write buffer with a short flush window.
+
+    The first write to a key goes straight to the database and opens a
+    window. Writes to the key within the window are held, each replacing
+    the previous one, and the latest is written when the window ends,
+    which opens the next window. A burst of N writes to a key therefore
+    costs about one write per window instead of N.
+
+    A held write that fails stays held and is retried with exponential
+    backoff (unless a newer value replaces it); it is dropped, with an
+    error logged and counted, only after max_retries failures.
+
+    The buffer lives in the worker process, so held writes are lost if
+    the process dies before the window ends; callers that need a write to
+    be durable should discard() the key and write directly. A window of
+    0 disables buffering.
+    """
+
+    def __init__(self, window_seconds: float, max_retries: int = HELD_WRITE_MAX_RETRIES):
+        """
+        Initialize the buffer.
+
+        Args:
+            window_seconds: Flush window in seconds, 0 to disable buffering
+            max_retries: Retries of a failed held write before it is dropped
+        """
+        self.window_seconds = window_seconds
+        self.max_retries = max_retries
+        self._entries: Dict[Hashable, _Entry] = {}
+        self.writes = 0
+        self.coalesced = 0
+        self.superseded = 0
+        self.failures = 0
+        self.retries = 0
+        self.dropped = 0
+
+    @property
+    def enabled(self) -> bool:
+        """Whether writes are buffered."""
+        return self.window_seconds > 0
+
+    async def submit(self, key: Hashable, write: WriteFunc, preview: PreviewFunc) -> Any:
+        """
+        Write a value now, or hold it until the key's window ends.
+
+        Args:
+            key: Record the value is written to
+            write: Writes the value
+            preview: Builds the result of a held write from the last
+                written result
+
+        Returns:
+            Result of the write, or its preview if the write is held
+        """
+        while True:
+            entry = self._entries.setdefault(key, _Entry())
+            async with entry.lock:
+                if entry.closed:
+                    # Flushed or discarded while waiting for the lock
+                    continue
+                if entry.task is None:
+                    try:
+                        entry.result = await write(None)
+                    except Exception:
+                        self._close(key, entry)
+                        raise
+                    self.writes += 1
+                    entry.task = asyncio.create_task(self._run(key, entry))
+                    return entry.result
+                if entry.write is not None:
+                    self.coalesced += 1
+                entry.write = write
+                return preview(entry.result)
+
+    async def _run(self, key: Hashable, entry: _Entry) -> None:
+        # Write the held value at the end of each window until a window
+        # passes without writes; failed writes are retried after a backoff
+        while True:
+            await asyncio.sleep(entry.delay or self.window_seconds)
+            async with entry.lock:
+                if entry.closed:
+                    return
+                if entry.write is None or not await self._write_held(key, entry):
+                    self._close(key, entry)
+                    return
+
+    async def _write_held(self, key: Hashable, entry: _Entry) -> bool:
+        # Returns whether the key's window stays open
+        write, entry.write = entry.write, None
+        try:
+            result = await write(entry.result)
+        except Exception as e:
+            self.failures += 1
+            entry.failures += 1
+            if entry.failures > self.max_retries:
+                self.dropped += 1
+                logger.error(f"Dropping buffered value for {key} after {entry.failures} failed writes: {e}")
+                return False
+            entry.write = write
+            entry.delay = min(self.window_seconds * 2 ** entry.failures, MAX_RETRY_DELAY_SECONDS)
+            self.retries += 1
+            logger.warning(f"Failed to write buffered value for {key}, retrying in {entry.delay:.1f}s: {e}")
+            return True
+        entry.failures = 0
+        entry.delay = None
+        if result is None:
+            self.superseded += 1
+            return False
+        self.writes += 1
+        entry.result = result
+        return True
+
+    def _close(self, key: Hashable, entry: _Entry) -> None:
+        entry.closed = True
+        if self._entries.get(key) is entry:
+            del self._entries[key]
+
+    def keys(self) -> List[Hashable]:
+        """Keys with an open window."""
+        return list(self._entries)
+
+    async def flush(self, keys: Optional[Iterable[Hashable]] = None) -> None:
+        """
+        Write held values now and close their windows.
+
+        Args:
+            keys: Keys to flush, defaults to every key
+        """
+        for key in list(self._entries if keys is None else keys):
+            entry = self._entries.get(key)
+            if entry is None:
+                continue
+            async with entry.lock:
+                if entry.closed:
+                    continue
+                if entry.write is not None:
+                    await self._write_held(key, entry)
+                    if entry.write is not None:
+                        # Failed; the window's task retries it
+                        continue
+                self._close(key, entry)
+            if entry.task is not None:
+                entry.task.cancel()
+
+    async def discard(self, keys: Iterable[Hashable]) -> None:
+        """
+        Drop held values and close their windows, e.g. before a newer
+        direct write or a delete. Waits for a write in progress.
+
+        Args:
+            keys: Keys to discard
+        """
+        for key in keys:
+            entry = self._entries.get(key)
+            if entry is None:
+                continue
+            async with entry.lock:
+                entry.write = None
+                self._close(key, entry)
+            if entry.task is not None:
+                entry.task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get buffer counters.
+
+        Returns:
+            Dictionary with open windows, held values, writes made, held
+            values replaced by a later one, held values superseded by a
+            newer write elsewhere, failed held writes, retries scheduled
+            and held values dropped after exhausting their retries
+        """
+        return {
+            "window_seconds": self.window_seconds,
+            "open": len(self._entries),
+            "held": sum(1 for entry in self._entries.values() if entry.write is not None),
+            "writes": self.writes,
+            "coalesced": self.coalesced,
+            "superseded": self.superseded,
+            "failures": self.failures,
+            "retries": self.retries,
+            "dropped": self.dropped,
+        }
@@ -26,11 +26,18 @@ export interface SyncResponse {
   error?: string;
 }
 
-export interface BatchSyncResponse {
-  success: boolean;
-  synced_count: number;
-  failed_count: number;
-  errors?: string[];
+export interface SyncJob {
+  job_id: string;
+  status: 'pending' | 'running' | 'done' | 'dead';
+  total: number | null;
+  processed: number;
+  failed: number;
+  remaining: number | null;
+  checkpoint_date: string | null;
+  last_error: string | null;
+  created_at: string;
+  updated_at: string | null;
+  completed_at: string | null;
 }
 
 /**
@@ -159,7 +166,8 @@ export async function syncSymptomLog(
 }
 
 /**
- * Sync all symptom logs to Google Calendar
+ * Start a background sync of all symptom logs to Google Calendar.
+ * Poll getSyncAllJob with the returned job_id for progress.
  */
 export async function syncAllLogs(
   userId: string,
@@ -169,7 +177,7 @@ export async function syncAllLogs(
     symptoms: Array<{ name: string; severity: number }>;
     notes?: string;
   }>
-): Promise<BatchSyncResponse> {
+): Promise<SyncJob> {
   try {
     const response = await fetch(`${API_BASE_URL}/sync-all`, { // Endpoint changed to match backend router '/sync-all'
       method: 'POST',
@@ -190,6 +198,27 @@ export async function syncAllLogs(
   }
 }
 
+/**
+ * Get the progress of a sync-all job
+ */
+export async function getSyncAllJob(jobId: string): Promise<SyncJob> {
+  try {
+    const response = await fetch(`${API_BASE_URL}/sync-all/${jobId}`, {
+      headers: getAuthHeaders(),
+    });
+    
+    if (!response.ok) {
+      const error = await response.json();
+      throw new Error(error.detail || 'Failed to fetch sync job');
+    }
+    
+    return await response.json();
+  } catch (error) {
+    console.error('Error fetching sync job:', error);
+    throw error;
+  }
+}
+
 /**
  * Delete a synced symptom log from Google Calendar
  */